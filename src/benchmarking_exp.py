@@ -1,82 +1,227 @@
 
+import json
 import math
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
 from main import *
 import pandas as pd
 
+prepared = {}
+worker_prep = None
+
+
+def get_prepared(midi, builder="direct"):
+    """Returns the prepared problem of the midi file for the global num_measures and M, building it only once
+
+    :param midi: Name of the midi file
+    :type midi: string
+    :param builder: QUBO builder
+    :type builder: string
+    :return: Prepared problem, as returned by prepare_experiment
+    :rtype: dict
+    """
+    key = (midi, num_measures, M, builder)
+    if key not in prepared:
+        prepared[key] = prepare_experiment(midi, folder_dict, num_measures, M, builder)
+    return prepared[key]
+
+
+def get_grid(mode, chains_str, annealing_times, num_reads, num_sweeps):
+    """Returns the points of the benchmark grid, each with its row and column in the result DataFrames
+
+    :return: List of (row, column, annealing parameters)
+    :rtype: list
+    """
+    if mode == "quantum":
+        return [
+            (
+                annealing_times[i],
+                rcs,
+                {"nr": num_reads[i], "t": annealing_times[i], "rcs": rcs},
+            )
+            for rcs in chains_str
+            for i in range(len(annealing_times))
+        ]
+    elif mode == "sim":
+        return [(i, sweep, {"nr": i, "ns": sweep}) for sweep in num_sweeps for i in num_reads]
+    return [(1, 1, {})]
+
+
+def get_progress_path(prep, mode, solver):
+    """Returns the path of the progress file of a grid, which records the finished points. Like the results, it ends
+    with the suffix of the variant of the prepared problem, see get_variant_suffix
+
+    :param prep: Prepared problem
+    :type prep: dict
+    :param mode: Simulation mode
+    :type mode: string
+    :param solver: D-Wave solver
+    :type solver: string
+    :return: Path to the progress file
+    :rtype: string
+    """
+    name = f"{prep['out_file_name']}_{mode}"
+    if mode == "quantum":
+        name = f"{name}_{solver}"
+    suffix = get_variant_suffix(
+        prep["multipliers"], prep.get("collapse", False), prep.get("builder", "direct")
+    )
+    return get_file_path(
+        get_file_path(prep["folder_dict"]["results_folder"], "progress"),
+        f"{name}{suffix}.jsonl",
+    )
+
+
+def point_key(a_dict):
+    return json.dumps(a_dict, sort_keys=True)
+
+
+def load_progress(progress_p):
+    """Loads the summaries of the finished points of a grid
+
+    :param progress_p: Path to the progress file
+    :type progress_p: string
+    :return: Summary of each finished point, keyed by point_key
+    :rtype: dict
+    """
+    done = {}
+    if os.path.isfile(progress_p):
+        with open(progress_p) as handle:
+            for line in handle:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # line cut by an interruption
+                    continue
+                done[point_key(entry.pop("a_dict"))] = entry
+    return done
+
+
+def init_worker(prep):
+    global worker_prep
+    worker_prep = prep
+
+
+def run_point(mode, a_dict, solver, load, log):
+    """Evaluates a single grid point on the prepared problem of the worker
+
+    :return: Summary of the best results
+    :rtype: dict
+    """
+    result, result_min = evaluate_experiment(worker_prep, mode, a_dict, solver, load, log)
+    if result is not None:
+        return {
+            "found": True,
+            "entropy": float(result["entropy"]),
+            "energy": float(result["energy"]),
+            "num_occurrences": result["num_occurrences"],
+            "M_violate": result["M_violate"],
+            "M_violate_hard": 0,
+        }
+    return {
+        "found": False,
+        "num_occurrences": result_min["num_occurrences"],
+        "M_violate": result_min["M_violate"],
+        "M_violate_hard": result_min["M_violate_hard"],
+    }
+
+
+def run_grid(prep, mode, points, solver, load, log, workers=None, resume=True):
+    """Evaluates the grid points with a process pool, sharing the prepared problem among the workers. Each finished
+    point is appended to the progress file, so an interrupted grid resumes from the remaining points
+
+    :param prep: Prepared problem
+    :type prep: dict
+    :param mode: Simulation mode
+    :type mode: string
+    :param points: Grid points, as returned by get_grid
+    :type points: list
+    :param solver: D-Wave solver
+    :type solver: string
+    :param load: Whether to load the stored samples instead of sampling
+    :type load: bool
+    :param log: Whether to log the experiments
+    :type log: bool
+    :param workers: Number of processes, all available cores if None
+    :type workers: int
+    :param resume: Whether to skip the points recorded in the progress file
+    :type resume: bool
+    :return: Summary of each point, keyed by its row and column
+    :rtype: dict
+    """
+    progress_p = get_progress_path(prep, mode, solver)
+    os.makedirs(os.path.dirname(progress_p), exist_ok=True)
+    done = load_progress(progress_p) if resume else {}
+    if resume and os.path.isfile(progress_p):
+        # a line cut by an interruption would swallow the next record, so it is dropped
+        with open(progress_p, "rb+") as handle:
+            content = handle.read()
+            if not content.endswith(b"\n"):
+                handle.truncate(content.rfind(b"\n") + 1)
+    todo = [a_dict for _, _, a_dict in points if point_key(a_dict) not in done]
+    if todo:
+        print(f"Running {len(todo)} of {len(points)} points")
+    with open(progress_p, "a" if resume else "w") as handle:
+
+        def record(a_dict, summary):
+            done[point_key(a_dict)] = summary
+            handle.write(json.dumps({"a_dict": a_dict, **summary}) + "\n")
+            handle.flush()
+            print(f"done for {a_dict}")
+
+        if workers == 1:
+            init_worker(prep)
+            for a_dict in todo:
+                record(a_dict, run_point(mode, a_dict, solver, load, log))
+        elif todo:
+            with ProcessPoolExecutor(
+                max_workers=workers, initializer=init_worker, initargs=(prep,)
+            ) as pool:
+                futures = {
+                    pool.submit(run_point, mode, a_dict, solver, load, log): a_dict
+                    for a_dict in todo
+                }
+                for future in as_completed(futures):
+                    record(futures[future], future.result())
+    return {(row, col): done[point_key(a_dict)] for row, col, a_dict in points}
+
+
 def get_exp_data(midi,mode,chains_str,annealing_times = [100, 500, 1000, 2000], num_reads=[1000],
-                solver='Advantage_system4.1',num_sweeps=[1000],load=True, log = False):
-                
+                solver='Advantage_system4.1',num_sweeps=[1000],load=True, log = False, workers=None, resume=True):
+
+    prep = get_prepared(midi)
+    points = get_grid(mode, chains_str, annealing_times, num_reads, num_sweeps)
+    if mode == "quantum":
+        print(f"Experiment for {mode} with {solver}")
+    else:
+        print(f"Experiment for {mode}")
+    summaries = run_grid(prep, mode, points, solver, load, log, workers, resume)
+
     if mode == "quantum":
         df_entropy = pd.DataFrame(columns=chains_str, index=annealing_times)
         df_softv = pd.DataFrame(columns=chains_str, index=annealing_times)
         df_hardv = pd.DataFrame(columns=chains_str, index=annealing_times)
-        print(f"Experiment for {mode} with {solver}")
-        for rcs in chains_str:
-            for i in range(len(annealing_times)):
-                a_dict = {
-                    "nr": num_reads[i],
-                    "t": annealing_times[i],
-                    "rcs": rcs,
-                }  
-
-                result,result_min = music_experiment(
-                    midi, folder_dict, num_measures, M, mode, a_dict, solver, load, log
-                )
-                print(
-                    f"done for number of reads: {num_reads[i]} and annealing time: {annealing_times[i]}"
-                )
-                if result != None:
-                    print("got result without hard violation")
-                    df_entropy.at[annealing_times[i], rcs] = result["entropy"]
-                    df_softv.at[annealing_times[i], rcs] = result["M_violate"]
-                    df_hardv.at[annealing_times[i], rcs] = 0
-                else:
-                    df_softv.at[annealing_times[i], rcs] = result_min["M_violate"]
-                    df_hardv.at[annealing_times[i], rcs] = result_min["M_violate_hard"]
-
     elif mode == "sim":
         df_entropy = pd.DataFrame(columns=num_sweeps, index=num_reads)
         df_softv = pd.DataFrame(columns=num_sweeps, index=num_reads)
         df_hardv = pd.DataFrame(columns=num_sweeps, index=num_reads)
-        print(f"Experiment for {mode}")
-        for sweep in num_sweeps:
-            for i in num_reads:
-                a_dict = {
-                    "nr": i,
-                    "ns": sweep,
-                }  
-
-                result,result_min  = music_experiment(
-                    midi, folder_dict, num_measures, M, mode, a_dict, solver, load, log
-                )
-                print(f"done for number of reads: {i} and number of sweeps: {sweep}")
-
-                if result != None:
-                    print("got result without hard violation")
-                    df_entropy.at[i, sweep] = result["entropy"]
-                    df_softv.at[i, sweep] = result["M_violate"]
-                    df_hardv.at[i, sweep] = 0
-                else:
-                    df_entropy.at[i, sweep] = None
-                    df_softv.at[i, sweep] = result_min["M_violate"]
-                    df_hardv.at[i, sweep] = result_min["M_violate_hard"]
-    elif mode == "hyb":
+    else:
         df_entropy = pd.DataFrame()
         df_softv = pd.DataFrame()
         df_hardv = pd.DataFrame()
-        print(f"Experiment for {mode}")
-        a_dict = {}
-        result,result_min= music_experiment(midi, folder_dict, num_measures, M, mode, a_dict, solver, load, log)
-        if result!= None:
+
+    for (row, col), summary in summaries.items():
+        if summary["found"]:
             print("got result without hard violation")
-            df_entropy.at[1, 1] = result["energy"]
-            df_softv.at[1, 1] = result["M_violate"]
-            df_hardv.at[1, 1] = 0
+            df_entropy.at[row, col] = summary["energy" if mode == "hyb" else "entropy"]
+            df_softv.at[row, col] = summary["M_violate"]
+            df_hardv.at[row, col] = 0
         else:
-            df_entropy.at[1, 1] = None
-            df_softv.at[1, 1] = result_min["M_violate"]
-            df_hardv.at[1, 1] = result_min["M_violate_hard"]
-    
+            if mode != "quantum":
+                df_entropy.at[row, col] = None
+            df_softv.at[row, col] = summary["M_violate"]
+            df_hardv.at[row, col] = summary["M_violate_hard"]
+
     return df_entropy,df_softv,df_hardv
 
 if __name__ == "__main__":
@@ -91,6 +236,7 @@ if __name__ == "__main__":
         "midi_folder": "midi",
         "phrase_folder": "phrases",
         "results_folder": "results",
+        "cache_folder": "qubo_cache",
     }
 
     load = True
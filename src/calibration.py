@@ -0,0 +1,283 @@
+import json
+import logging
+import math
+import os
+import time
+
+import numpy as np
+
+from exact import exact_schedule
+from experiment import sim_anneal
+from jobs import max_weight_phrase
+from postprocess import (
+    evaluate_samples,
+    get_incidence_matrix,
+    sampleset_to_job_matrix,
+)
+from qubo import get_qubo_direct
+
+DEFAULT_PENALTY_MULTIPLIERS = {"exact": 2, "less": 4}
+
+EXACT_MULTIPLIERS = (1, 2, 4)
+
+LESS_MULTIPLIERS = (1, 2, 4, 8)
+
+CALIBRATION_READS = 100
+
+CALIBRATION_SWEEPS = 400
+
+CALIBRATION_TOLERANCE = 0.05
+
+CALIBRATION_FILE = "penalty_calibration.json"
+
+
+def get_p_dict(p, multipliers):
+    """Returns the penalties of the qubo for the given multipliers of the maximal job weight
+
+    :param p: Maximal job weight
+    :type p: float
+    :param multipliers: Multiplier of each penalty
+    :type multipliers: dict
+    :return: Dictionary of penalties
+    :rtype: dict
+    """
+    return {name: multipliers[name] * p for name in ["exact", "less"]}
+
+
+def reference_costs(samples, M, max_time, job_list, p_dict):
+    """Computes the cost of the samples in the reference formulation: the entropy plus p_dict["exact"] times the
+    squared number of idle tracks at each time point with running jobs. Whatever the penalties of the sampled qubo, the
+    samples are compared by this cost
+
+    :param samples: job variables of the samples, ordered as in the job list
+    :type samples: numpy.ndarray
+    :param M: Number of tracks
+    :type M: int
+    :param max_time: Maximum time
+    :type max_time: int
+    :param job_list: List of jobs
+    :type job_list: list
+    :param p_dict: Dictionary of the reference penalties
+    :type p_dict: dict
+    :return: Cost and feasibility of each sample
+    :rtype: tuple(numpy.ndarray, numpy.ndarray)
+    """
+    entropy, feasible = evaluate_samples(samples, M, max_time, job_list)[:2]
+    incidence = get_incidence_matrix(job_list, max_time)
+    active = incidence.sum(axis=0) > 0
+    load = ((samples == 1).astype(np.float64) @ incidence)[:, active]
+    idle = np.maximum(M - load, 0)
+    return entropy + p_dict["exact"] * (idle**2).sum(axis=1), feasible
+
+
+def time_to_solution(hit_rate, time_per_read, target=0.99):
+    """Returns the expected sampling time to find a hit with the target probability
+
+    :param hit_rate: Probability of a hit in one read
+    :type hit_rate: float
+    :param time_per_read: Sampling time of one read
+    :type time_per_read: float
+    :param target: Target probability
+    :type target: float
+    :return: Time to solution, infinite without hits
+    :rtype: float
+    """
+    if hit_rate <= 0:
+        return math.inf
+    if hit_rate >= target:
+        return time_per_read
+    return time_per_read * math.log(1 - target) / math.log(1 - hit_rate)
+
+
+def probe_penalties(
+    job_list,
+    M,
+    max_time,
+    p,
+    multipliers,
+    optimum,
+    reads=CALIBRATION_READS,
+    sweeps=CALIBRATION_SWEEPS,
+    seed=None,
+    workers=1,
+    collapse=False,
+):
+    """Runs a short simulated annealing probe on the qubo with the given penalty multipliers. A read is a hit if it is
+    feasible and its reference cost is within CALIBRATION_TOLERANCE of the optimum, relative to its absolute value,
+    since short probes seldom reach the optimum itself
+
+    :param job_list: List of jobs
+    :type job_list: list
+    :param M: Number of tracks
+    :type M: int
+    :param max_time: Maximum time
+    :type max_time: int
+    :param p: Maximal job weight
+    :type p: float
+    :param multipliers: Multiplier of each penalty
+    :type multipliers: dict
+    :param optimum: Optimal reference cost of the feasible selections
+    :type optimum: float
+    :param reads: Number of reads
+    :type reads: int
+    :param sweeps: Number of sweeps
+    :type sweeps: int
+    :param seed: Seed of the probe
+    :type seed: int
+    :param workers: Number of worker processes
+    :type workers: int
+    :param collapse: Whether to merge the constraints of consecutive time points with the same running jobs
+    :type collapse: bool
+    :return: Multipliers, hit rate, feasible rate, mean gap of the feasible reads, time per read and time to solution
+    :rtype: dict
+    """
+    p_dict = get_p_dict(p, multipliers)
+    qubo = get_qubo_direct(job_list, M, max_time, p_dict, collapse)[0]
+    start_time = time.perf_counter()
+    sampleset = sim_anneal(qubo, reads, sweeps, workers, seed)
+    time_per_read = (time.perf_counter() - start_time) / reads
+    samples = sampleset_to_job_matrix(sampleset, job_list)
+    cost, feasible = reference_costs(
+        samples, M, max_time, job_list, get_p_dict(p, DEFAULT_PENALTY_MULTIPLIERS)
+    )
+    hits = feasible & (cost <= optimum + CALIBRATION_TOLERANCE * abs(optimum) + 1e-9)
+    hit_rate = float(hits.mean())
+    mean_gap = math.inf
+    if feasible.any():
+        mean_gap = float((cost[feasible] - optimum).mean())
+    return {
+        "exact": multipliers["exact"],
+        "less": multipliers["less"],
+        "hit_rate": hit_rate,
+        "feasible_rate": float(feasible.mean()),
+        "mean_gap": mean_gap,
+        "time_per_read": time_per_read,
+        "tts": time_to_solution(hit_rate, time_per_read),
+    }
+
+
+def calibrate_penalties(
+    job_list,
+    M,
+    max_time,
+    reads=CALIBRATION_READS,
+    sweeps=CALIBRATION_SWEEPS,
+    seed=None,
+    workers=1,
+    collapse=False,
+):
+    """Probes the grid of EXACT_MULTIPLIERS and LESS_MULTIPLIERS and returns the multipliers with the lowest time to
+    solution. The optimum is the best feasible selection of the reference formulation, found by exact_schedule. If no
+    probe gets close to it, the multipliers with the highest feasible rate and then the lowest mean gap are chosen
+
+    :param job_list: List of jobs
+    :type job_list: list
+    :param M: Number of tracks
+    :type M: int
+    :param max_time: Maximum time
+    :type max_time: int
+    :param reads: Number of reads of each probe
+    :type reads: int
+    :param sweeps: Number of sweeps of each probe
+    :type sweeps: int
+    :param seed: Seed of the probes
+    :type seed: int
+    :param workers: Number of worker processes
+    :type workers: int
+    :param collapse: Whether to merge the constraints of consecutive time points with the same running jobs
+    :type collapse: bool
+    :return: Best probe and all probes
+    :rtype: tuple(dict, list)
+    """
+    p = max_weight_phrase(job_list)
+    reference = get_p_dict(p, DEFAULT_PENALTY_MULTIPLIERS)
+    selection = exact_schedule(job_list, M, max_time, reference, feasible=True)
+    optimum = reference_costs(selection[None], M, max_time, job_list, reference)[0][0]
+    probes = []
+    for exact in EXACT_MULTIPLIERS:
+        for less in LESS_MULTIPLIERS:
+            probe = probe_penalties(
+                job_list,
+                M,
+                max_time,
+                p,
+                {"exact": exact, "less": less},
+                optimum,
+                reads,
+                sweeps,
+                seed,
+                workers,
+                collapse,
+            )
+            logging.info(f"Penalty probe {probe}")
+            probes.append(probe)
+    best = min(probes, key=lambda d: (d["tts"], -d["feasible_rate"], d["mean_gap"]))
+    return best, probes
+
+
+def get_calibration_path(folder_dict):
+    """Returns the path of the file of the calibrated multipliers
+
+    :param folder_dict: Dictionary containing folder names
+    :type folder_dict: dictionary
+    :return: Path to the calibration file
+    :rtype: string
+    """
+    return os.path.join(folder_dict["results_folder"], CALIBRATION_FILE)
+
+
+def load_calibration(path):
+    """Loads the calibrated multipliers of all problems. Returns an empty dictionary if the file does not exist or
+    cannot be read
+
+    :param path: Path to the calibration file
+    :type path: string
+    :return: Calibration of each problem
+    :rtype: dict
+    """
+    if not os.path.isfile(path):
+        return {}
+    try:
+        with open(path) as handle:
+            return json.load(handle)
+    except (OSError, ValueError) as error:
+        logging.warning(f"Ignoring unreadable calibration file {path}: {error}")
+        return {}
+
+
+def get_penalty_multipliers(path, key):
+    """Returns the calibrated multipliers of a problem, or the default ones if it is not calibrated
+
+    :param path: Path to the calibration file
+    :type path: string
+    :param key: Name of the problem, the output file name of the score and M
+    :type key: string
+    :return: Multiplier of each penalty
+    :rtype: dict
+    """
+    entry = load_calibration(path).get(key)
+    if entry is None:
+        return dict(DEFAULT_PENALTY_MULTIPLIERS)
+    return {"exact": entry["exact"], "less": entry["less"]}
+
+
+def store_calibration(path, key, best, probes):
+    """Stores the calibrated multipliers of a problem, with the probes
+
+    :param path: Path to the calibration file
+    :type path: string
+    :param key: Name of the problem, the output file name of the score and M
+    :type key: string
+    :param best: Best probe
+    :type best: dict
+    :param probes: All probes
+    :type probes: list
+    """
+    calibration = load_calibration(path)
+    calibration[key] = dict(best, probes=probes)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    temp = f"{path}.{os.getpid()}.tmp"
+    with open(temp, "w") as handle:
+        # infinite times to solution are written as Infinity
+        json.dump(calibration, handle, indent=1)
+    os.replace(temp, path)
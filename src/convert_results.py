@@ -0,0 +1,43 @@
+import argparse
+import os
+
+from utils import convert_result
+
+SKIPPED_EXTENSIONS = (".mid", ".log", ".json", ".jsonl", ".csv", ".npy", ".npz", ".txt")
+
+
+def find_pickled_results(path):
+    """Finds the samples pickled in the previous format under the given path. The midi files and the folders of
+    samples already converted are skipped
+
+    :param path: File or folder
+    :type path: string
+    :return: Paths to the pickled samples
+    :rtype: list
+    """
+    if os.path.isfile(path):
+        return [path]
+    found = []
+    for root, dirs, files in os.walk(path):
+        # folders stored by store_result
+        dirs[:] = [d for d in dirs if not os.path.isfile(os.path.join(root, d, "header.json"))]
+        for name in sorted(files):
+            # result names may contain dots, e.g. the solver name
+            if os.path.splitext(name)[1] not in SKIPPED_EXTENSIONS:
+                found.append(os.path.join(root, name))
+    return found
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("paths", type=str, nargs="+")
+    args = parser.parse_args()
+
+    for path in args.paths:
+        for file_name in find_pickled_results(path):
+            try:
+                convert_result(file_name)
+                print(f"Converted {file_name}")
+            except Exception as error:
+                print(f"Skipped {file_name}: {error}")
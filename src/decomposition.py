@@ -0,0 +1,161 @@
+import logging
+from concurrent.futures import ProcessPoolExecutor
+
+import dimod
+import numpy as np
+
+from experiment import run_sampler
+from jobs import JobCollector
+from qubo import get_qubo_direct
+
+
+def get_cut_points(job_list, max_time):
+    """Finds the time points that no job crosses. A job crosses c if start < c < end, so at a cut point the constraints
+    of num_machine_cons and min_idle_time_cons split into independent blocks
+
+    :param job_list: List of jobs
+    :type job_list: list
+    :param max_time: Maximum time
+    :type max_time: int
+    :return: Cut points, from 0 to max_time
+    :rtype: numpy.ndarray
+    """
+    crossing = np.zeros(max_time + 2, dtype=np.int64)
+    starts = np.clip(job_list.starts + 1, 0, max_time + 1)
+    ends = np.clip(job_list.ends, 0, max_time + 1)
+    np.add.at(crossing, starts, 1)
+    np.add.at(crossing, ends, -1)
+    crossing = np.cumsum(crossing)[: max_time + 1]
+    return np.flatnonzero(crossing == 0)
+
+
+def get_blocks(job_list, max_time, min_measures=1):
+    """Splits the timeline at the cut points into blocks of at least min_measures measures, each with the jobs that run
+    inside it. Blocks without jobs are left out
+
+    :param job_list: List of jobs
+    :type job_list: list
+    :param max_time: Maximum time
+    :type max_time: int
+    :param min_measures: Minimum length of a block, shorter blocks are merged with the next ones
+    :type min_measures: int
+    :return: First time point, last time point and job list of each block
+    :rtype: list
+    """
+    cuts = get_cut_points(job_list, max_time)
+    bounds = [int(cuts[0])]
+    for cut in cuts[1:-1]:
+        if cut - bounds[-1] >= min_measures:
+            bounds.append(int(cut))
+    bounds.append(max_time)
+    rows = np.argsort(job_list.starts, kind="stable")
+    # jobs starting before the first cut or ending after the last one go to the first or last block
+    first = np.concatenate(
+        [[0], np.searchsorted(job_list.starts[rows], bounds[1:-1]), [len(rows)]]
+    )
+    blocks = []
+    for k in range(len(bounds) - 1):
+        block = JobCollector()
+        for row in np.sort(rows[first[k] : first[k + 1]]):
+            block += job_list.jobs[row]
+        if len(block):
+            blocks.append((bounds[k], bounds[k + 1], block))
+    return blocks
+
+
+def solve_block(block_qubo, mode, a_dict, solver, problem):
+    """Samples the qubo of a block, in a worker process
+
+    :return: sampleset
+    :rtype: dimod.SampleSet
+    """
+    return run_sampler(block_qubo, mode, a_dict, solver, problem)
+
+
+def stitch_samplesets(samplesets):
+    """Stitches the samples of independent blocks: the i-th sample is made of the i-th best sample of each block, and
+    its energy is the sum of their energies, which is its energy in the qubo of the whole problem
+
+    :param samplesets: Samplesets of the blocks
+    :type samplesets: list
+    :return: Stitched samples
+    :rtype: dimod.SampleSet
+    """
+    num_samples = min(len(sampleset) for sampleset in samplesets)
+    columns, variables = [], []
+    energy = np.zeros(num_samples)
+    for sampleset in samplesets:
+        order = np.argsort(sampleset.record.energy, kind="stable")[:num_samples]
+        columns.append(sampleset.record.sample[order])
+        variables.extend(sampleset.variables)
+        energy += sampleset.record.energy[order]
+    return dimod.SampleSet.from_samples(
+        (np.hstack(columns), variables),
+        dimod.BINARY,
+        energy=energy,
+        info={"blocks": [sampleset.info for sampleset in samplesets]},
+        sort_labels=False,
+    )
+
+
+def decomposed_anneal(
+    job_list,
+    M,
+    max_time,
+    p_dict,
+    mode,
+    a_dict,
+    solver=None,
+    min_measures=1,
+    collapse=False,
+) -> dimod.sampleset.SampleSet:
+    """Splits the problem at the cut points, samples the qubo of each block and stitches the block samples. The blocks
+    are sampled in parallel, with a_dict["workers"] processes, and if a seed is given each block gets its own seed
+    spawned from it
+
+    :param job_list: List of jobs
+    :type job_list: list
+    :param M: Number of tracks
+    :type M: int
+    :param max_time: Maximum time
+    :type max_time: int
+    :param p_dict: Dictionary of penalties
+    :type p_dict: dict
+    :param mode: Simulation mode
+    :type mode: string
+    :param a_dict: Dictionary containing annealing parameters
+    :type a_dict: dictionary
+    :param solver: D-Wave solver
+    :type solver: string
+    :param min_measures: Minimum length of a block
+    :type min_measures: int
+    :param collapse: Whether to merge the constraints of consecutive time points with the same running jobs
+    :type collapse: bool
+    :return: sampleset
+    :rtype: dimod.SampleSet
+    """
+    blocks = get_blocks(job_list, max_time, min_measures)
+    logging.info(
+        f"Decomposed into {len(blocks)} blocks, largest with {max(len(b) for _, _, b in blocks)} jobs"
+    )
+    seeds = [None] * len(blocks)
+    if a_dict.get("seed") is not None:
+        seeds = [
+            int(child.generate_state(1, dtype=np.uint32)[0] >> 1)
+            for child in np.random.SeedSequence(a_dict["seed"]).spawn(len(blocks))
+        ]
+    tasks = []
+    for (first, last, block), seed in zip(blocks, seeds):
+        # the qubo of the block keeps the time points and the labels of the whole problem
+        block_qubo = get_qubo_direct(block, M, last, p_dict, collapse)[0]
+        problem = {"job_list": block, "M": M, "max_time": last, "p_dict": p_dict}
+        block_a_dict = dict(a_dict, workers=1, seed=seed)
+        tasks.append((block_qubo, mode, block_a_dict, solver, problem))
+
+    workers = a_dict.get("workers", 1)
+    if workers == 1 or len(tasks) == 1:
+        samplesets = [solve_block(*task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            samplesets = list(pool.map(solve_block, *zip(*tasks)))
+    return stitch_samplesets(samplesets)
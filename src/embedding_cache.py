@@ -0,0 +1,244 @@
+import argparse
+import hashlib
+import json
+import logging
+import os
+import time
+
+import minorminer
+import networkx as nx
+import numpy as np
+from dwave.embedding import is_valid_embedding
+from dwave.graphs import chimera_graph, pegasus_graph, zephyr_graph
+
+EMBEDDING_CACHE_VERSION = 1
+
+EMBEDDING_CACHE_FOLDER = "embedding_cache"
+
+
+def get_interaction_graph(qubo):
+    """Returns the interaction graph of the qubo, with a node for each variable and an edge for each quadratic term
+
+    :param qubo: QUBO formulation
+    :type qubo: dict
+    :return: Interaction graph
+    :rtype: networkx.Graph
+    """
+    graph = nx.Graph()
+    for u, v in qubo:
+        graph.add_node(u)
+        graph.add_node(v)
+        if u != v:
+            graph.add_edge(u, v)
+    return graph
+
+
+def get_target_graph(topology):
+    """Builds the full graph of a D-Wave topology, so that embeddings can be computed without access to the QPU
+
+    :param topology: Topology, as in the properties of DWaveSampler, e.g. {"type": "pegasus", "shape": [16]}
+    :type topology: dict
+    :return: Target graph
+    :rtype: networkx.Graph
+    """
+    shape = topology["shape"]
+    if topology["type"] == "pegasus":
+        return pegasus_graph(shape[0])
+    if topology["type"] == "zephyr":
+        return zephyr_graph(*shape)
+    if topology["type"] == "chimera":
+        return chimera_graph(*shape)
+    raise ValueError(f"Unknown topology {topology['type']}")
+
+
+def get_embedding_key(graph, topology):
+    """Returns the key of the embedding in the cache, a hash of the interaction graph and of the topology. The nodes
+    and edges are sorted, so the key does not depend on the order of the qubo
+
+    :param graph: Interaction graph
+    :type graph: networkx.Graph
+    :param topology: Topology of the target
+    :type topology: dict
+    :return: Key of the embedding
+    :rtype: string
+    """
+    header = {
+        "version": EMBEDDING_CACHE_VERSION,
+        "type": topology["type"],
+        "shape": list(topology["shape"]),
+    }
+    digest = hashlib.sha256(json.dumps(header, sort_keys=True).encode())
+    for node in sorted(str(v) for v in graph.nodes):
+        digest.update(f"{node}\n".encode())
+    for u, v in sorted(tuple(sorted((str(u), str(v)))) for u, v in graph.edges):
+        digest.update(f"{u} {v}\n".encode())
+    return digest.hexdigest()
+
+
+def get_embedding_cache_path(cache_folder, key):
+    """Returns the path of a cached embedding
+
+    :param cache_folder: Cache folder
+    :type cache_folder: string
+    :param key: Key of the embedding
+    :type key: string
+    :return: Path to the cached embedding
+    :rtype: string
+    """
+    return os.path.join(cache_folder, f"{key}.json")
+
+
+def chain_statistics(embedding):
+    """Computes the statistics of the chain lengths of an embedding
+
+    :param embedding: Chain of qubits of each variable
+    :type embedding: dict
+    :return: Number of chains and qubits, maximal and mean chain length
+    :rtype: dict
+    """
+    lengths = np.array([len(chain) for chain in embedding.values()])
+    return {
+        "num_chains": len(lengths),
+        "num_qubits": int(lengths.sum()),
+        "max_chain_length": int(lengths.max(initial=0)),
+        "mean_chain_length": float(lengths.mean()) if len(lengths) else 0.0,
+    }
+
+
+def store_embedding(path, embedding, topology):
+    """Stores the embedding as json, with the topology and the chain statistics
+
+    :param path: Path to the cached embedding
+    :type path: string
+    :param embedding: Chain of qubits of each variable
+    :type embedding: dict
+    :param topology: Topology of the target
+    :type topology: dict
+    """
+    entry = {
+        "version": EMBEDDING_CACHE_VERSION,
+        "topology": {"type": topology["type"], "shape": list(topology["shape"])},
+        "statistics": chain_statistics(embedding),
+        "embedding": {str(v): [int(q) for q in chain] for v, chain in embedding.items()},
+    }
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    temp = f"{path}.{os.getpid()}.tmp"
+    with open(temp, "w") as handle:
+        json.dump(entry, handle)
+    # concurrent runs never see a partly written file
+    os.replace(temp, path)
+
+
+def load_embedding(path):
+    """Loads a cached embedding. Returns None if it does not exist or cannot be read
+
+    :param path: Path to the cached embedding
+    :type path: string
+    :return: Chain of qubits of each variable
+    :rtype: dict
+    """
+    if not os.path.isfile(path):
+        return None
+    try:
+        with open(path) as handle:
+            entry = json.load(handle)
+        return entry["embedding"]
+    except (OSError, ValueError, KeyError) as error:
+        logging.warning(f"Ignoring unreadable cached embedding {path}: {error}")
+        return None
+
+
+def find_embedding(graph, target, seed=None):
+    """Embeds the interaction graph into the target graph with minorminer
+
+    :param graph: Interaction graph
+    :type graph: networkx.Graph
+    :param target: Target graph
+    :type target: networkx.Graph
+    :param seed: Seed of minorminer
+    :type seed: int
+    :return: Chain of qubits of each variable
+    :rtype: dict
+    """
+    start_time = time.perf_counter()
+    embedding = minorminer.find_embedding(graph, target, random_seed=seed)
+    if len(embedding) < graph.number_of_nodes():
+        raise ValueError("No embedding found")
+    logging.info(
+        f"Embedding found in {time.perf_counter() - start_time:.3f} s: {chain_statistics(embedding)}"
+    )
+    return embedding
+
+
+def get_cached_embedding(qubo, topology, cache_folder, target=None, seed=None):
+    """If the embedding of the interaction graph of the qubo into the topology is in the cache and valid for the
+    target, it loads it. Otherwise, it embeds the graph into the target, or into the full graph of the topology if no
+    target is given, and stores the embedding. The target of a QPU may lack some qubits and couplers of the full graph,
+    so an embedding computed offline is checked against it
+
+    :param qubo: QUBO formulation
+    :type qubo: dict
+    :param topology: Topology of the target, as in the properties of DWaveSampler
+    :type topology: dict
+    :param cache_folder: Cache folder
+    :type cache_folder: string
+    :param target: Working graph of the QPU
+    :type target: networkx.Graph
+    :param seed: Seed of minorminer
+    :type seed: int
+    :return: Chain of qubits of each variable
+    :rtype: dict
+    """
+    graph = get_interaction_graph(qubo)
+    path = get_embedding_cache_path(cache_folder, get_embedding_key(graph, topology))
+    if target is None:
+        target = get_target_graph(topology)
+    embedding = load_embedding(path)
+    if embedding is not None:
+        if is_valid_embedding(embedding, graph, target):
+            logging.info(f"Embedding loaded from {path}")
+            return embedding
+        logging.info(f"Cached embedding {path} does not fit the target, embedding again")
+    embedding = find_embedding(graph, target, seed)
+    store_embedding(path, embedding, topology)
+    return embedding
+
+
+if __name__ == "__main__":
+
+    from main import prepare_experiment
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("midi", type=str)
+    parser.add_argument("--measures", type=int, required=False, default=-1)
+    parser.add_argument("--tracks", type=int, required=False, default=2)
+    parser.add_argument("--collapse", action="store_true")
+    parser.add_argument(
+        "--topology",
+        type=str,
+        required=False,
+        default="pegasus",
+        choices=["pegasus", "zephyr", "chimera"],
+    )
+    parser.add_argument("--shape", type=int, nargs="+", required=False, default=[16])
+    parser.add_argument("--seed", type=int, required=False, default=None)
+    args = parser.parse_args()
+
+    folder_dict = {
+        "midi_folder": "midi",
+        "phrase_folder": "phrases",
+        "results_folder": "results",
+        "cache_folder": "qubo_cache",
+    }
+    prep = prepare_experiment(
+        args.midi,
+        folder_dict,
+        args.measures,
+        args.tracks,
+        collapse=args.collapse,
+    )
+    topology = {"type": args.topology, "shape": args.shape}
+    embedding = get_cached_embedding(
+        prep["qubo"], topology, EMBEDDING_CACHE_FOLDER, seed=args.seed
+    )
+    print(f"{prep['out_file_name']} on {topology}: {chain_statistics(embedding)}")
@@ -0,0 +1,207 @@
+import heapq
+import re
+import time
+
+import dimod
+import numpy as np
+
+from qubo import encode_slack, get_running_jobs
+
+
+def add_edge(graph, u, v, cap, cost):
+    """Adds an edge and its residual edge to the graph
+
+    :param graph: Adjacency lists, each edge is a list [to, capacity, cost, index of the reverse edge]
+    :type graph: list
+    :param u: Tail of the edge
+    :type u: int
+    :param v: Head of the edge
+    :type v: int
+    :param cap: Capacity of the edge
+    :type cap: int
+    :param cost: Cost of the edge
+    :type cost: float
+    :return: Position of the edge in the adjacency list of u
+    :rtype: int
+    """
+    graph[u].append([v, cap, cost, len(graph[v])])
+    graph[v].append([u, 0, -cost, len(graph[u]) - 1])
+    return len(graph[u]) - 1
+
+
+def min_cost_flow(graph, source, sink, flow):
+    """Sends the given flow from source to sink with minimal cost, using successive shortest paths. The nodes of the
+    graph must be in topological order with respect to the edges of positive capacity, which is the case for the
+    timeline, so the initial potentials can be computed in one pass even with negative costs
+
+    :param graph: Adjacency lists, as built by add_edge
+    :type graph: list
+    :param source: Source node
+    :type source: int
+    :param sink: Sink node
+    :type sink: int
+    :param flow: Amount of flow to send
+    :type flow: int
+    :return: Amount of flow sent
+    :rtype: int
+    """
+    n = len(graph)
+    potential = [np.inf] * n
+    potential[source] = 0
+    for u in range(n):
+        if potential[u] == np.inf:
+            continue
+        for v, cap, cost, _ in graph[u]:
+            if cap > 0 and potential[u] + cost < potential[v]:
+                potential[v] = potential[u] + cost
+    potential = [p if p != np.inf else 0 for p in potential]
+
+    sent = 0
+    while sent < flow:
+        dist = [np.inf] * n
+        prev = [None] * n
+        dist[source] = 0
+        heap = [(0, source)]
+        while heap:
+            d, u = heapq.heappop(heap)
+            if d > dist[u]:
+                continue
+            for k, (v, cap, cost, _) in enumerate(graph[u]):
+                # reduced costs are nonnegative up to rounding
+                nd = d + max(cost + potential[u] - potential[v], 0)
+                if cap > 0 and nd < dist[v]:
+                    dist[v] = nd
+                    prev[v] = (u, k)
+                    heapq.heappush(heap, (nd, v))
+        if dist[sink] == np.inf:
+            break
+        for u in range(n):
+            if dist[u] != np.inf:
+                potential[u] += dist[u]
+        push = flow - sent
+        v = sink
+        while v != source:
+            u, k = prev[v]
+            push = min(push, graph[u][k][1])
+            v = u
+        v = sink
+        while v != source:
+            u, k = prev[v]
+            graph[u][k][1] -= push
+            graph[v][graph[u][k][3]][1] += push
+            v = u
+        sent += push
+    return sent
+
+
+def exact_schedule(job_list, M, max_time, p_dict, fixed=(), feasible=False):
+    """Finds the optimal selection of jobs, minimizing the objective and the penalties of num_machine_cons and
+    min_idle_time_cons, with min-cost flow over the timeline. F units of flow go from time 0 to max_time, where F is at
+    least M and at least the number of jobs running at any time point, and each unit either runs a job or stays idle.
+    With n running jobs, the penalty at a time point is p_dict["exact"] * (M - n)^2, plus p_dict["less"] * (n - M)^2 if
+    n > M, since otherwise the slack can bring the penalty of min_idle_time_cons to zero. It is convex in the number of
+    idle units F - n, so it is modelled by F unit edges of increasing cost. If only feasible selections are searched, F
+    is M
+
+    :param job_list: List of jobs
+    :type job_list: list
+    :param M: Number of tracks
+    :type M: int
+    :param max_time: Maximum time
+    :type max_time: int
+    :param p_dict: Dictionary of penalties
+    :type p_dict: dict
+    :param fixed: Ids of the jobs that must be selected
+    :type fixed: collection
+    :param feasible: Whether to search only the selections with at most M jobs running at each time point
+    :type feasible: bool
+    :return: Selection of each job, ordered as in the job list
+    :rtype: numpy.ndarray
+    """
+
+    def penalty(n):
+        return p_dict["exact"] * (M - n) ** 2 + p_dict["less"] * max(n - M, 0) ** 2
+
+    fixed = set(fixed)
+    run_jobs_dict = get_running_jobs(job_list, max_time)
+    first = min(0, int(job_list.starts.min(initial=0)))
+    last = max(max_time, int(job_list.ends.max(initial=0)))
+    # number of jobs running at each time point, a job runs at t if start < t <= end
+    running = np.zeros(last - first + 2, dtype=np.int64)
+    np.add.at(running, job_list.starts - first + 1, 1)
+    np.add.at(running, job_list.ends - first + 1, -1)
+    flow = M if feasible else max(M, int(np.cumsum(running).max(initial=0)))
+    # a bonus larger than any change of the cost forces the fixed jobs into the solution
+    bonus = job_list.weights.sum() + max(penalty(0), penalty(flow)) * (max_time + 1)
+    bonus += 1
+    graph = [[] for _ in range(last - first + 1)]
+    for t in range(first + 1, last + 1):
+        if 1 <= t <= max_time and run_jobs_dict[t]:
+            # the k-th idle unit lowers the number of running jobs from flow - k + 1 to flow - k
+            for k in range(1, flow + 1):
+                add_edge(
+                    graph,
+                    t - 1 - first,
+                    t - first,
+                    1,
+                    penalty(flow - k) - penalty(flow - k + 1),
+                )
+        else:
+            add_edge(graph, t - 1 - first, t - first, flow, 0.0)
+    job_edges = {}
+    selection = np.zeros(len(job_list), dtype=np.int8)
+    for row, job in enumerate(job_list.jobs):
+        if job.end > job.start:
+            job_edges[row] = (
+                job.start - first,
+                add_edge(
+                    graph,
+                    job.start - first,
+                    job.end - first,
+                    1,
+                    -job.weight - (bonus if job.id in fixed else 0),
+                ),
+            )
+        elif job.weight > 0 or job.id in fixed:
+            # a job without running time is not constrained
+            selection[row] = 1
+    min_cost_flow(graph, 0, last - first, flow)
+    for row, (u, k) in job_edges.items():
+        selection[row] = 1 - graph[u][k][1]
+    return selection
+
+
+def exact_solve(qubo, problem) -> dimod.sampleset.SampleSet:
+    """Solves the problem with exact_schedule and returns the solution as a sampleset of the qubo, with the slack
+    variables set consistently
+
+    :param qubo: QUBO formulation for the problem
+    :type qubo: dictionary
+    :param problem: Dictionary containing the job list, M, max_time and p_dict of the problem, and optionally the ids of
+    the fixed jobs
+    :type problem: dict
+    :return: sampleset
+    :rtype: dimod.SampleSet
+    """
+    job_list, M, max_time = problem["job_list"], problem["M"], problem["max_time"]
+    start_time = time.perf_counter()
+    selection = exact_schedule(
+        job_list, M, max_time, problem["p_dict"], problem.get("fixed", ())
+    )
+    solve_time = time.perf_counter() - start_time
+
+    sample = {f"x_{id}": int(x) for id, x in zip(job_list.ids, selection)}
+    run_jobs_dict = get_running_jobs(job_list, max_time)
+    bqm = dimod.BinaryQuadraticModel.from_qubo(qubo)
+    for v in bqm.variables:
+        match = re.fullmatch(r"slack(\d+)\[(\d+)\]", str(v))
+        if match:
+            t, k = int(match.group(1)), int(match.group(2))
+            running = sum(selection[job_list.index[i]] for i in run_jobs_dict[t])
+            sample[v] = int(encode_slack(max(M - int(running), 0), M)[k])
+    for v in sample:
+        if v not in bqm.variables:
+            bqm.add_variable(v)
+    return dimod.SampleSet.from_samples_bqm(
+        sample, bqm, info={"timing": {"solve_time": solve_time}}
+    )
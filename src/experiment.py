@@ -1,32 +1,155 @@
 import logging
+from concurrent.futures import ProcessPoolExecutor
 
 import dimod
+import numpy as np
 import dwave.inspector
 import neal
-from dwave.system import DWaveSampler, EmbeddingComposite, LeapHybridSampler
+from dwave.system import (
+    DWaveSampler,
+    EmbeddingComposite,
+    FixedEmbeddingComposite,
+    LeapHybridSampler,
+)
 
+from embedding_cache import (
+    EMBEDDING_CACHE_FOLDER,
+    chain_statistics,
+    get_cached_embedding,
+)
+from exact import exact_solve
+from postprocess import aggregate_samples
 from utils import *
+from warm_start import (
+    WARM_START_SWEEP_FRACTION,
+    reverse_anneal_schedule,
+    warm_beta_range,
+    warm_start_states,
+)
 
 
-def sim_anneal(qubo, nr, ns) -> dimod.sampleset.SampleSet:
-    """Runs simulated annealing experiment
+worker_qubo = None
+
+
+def init_sim_worker(qubo):
+    """Shares the qubo with a simulated annealing worker, once for all its shards
+
+    :param qubo: QUBO formulation for the problem
+    :type qubo: dictionary
+    """
+    global worker_qubo
+    worker_qubo = qubo
+
+
+def sim_anneal_shard(nr, ns, seed, warm=None) -> dimod.sampleset.SampleSet:
+    """Runs a shard of the simulated annealing experiment on the qubo of the worker
+
+    :param nr: Number of samples of the shard
+    :type nr: int
+    :param ns: Number of steps
+    :type ns: int
+    :param seed: Seed of the shard
+    :type seed: int
+    :param warm: Initial states of the shard and inverse temperatures, for a warm start
+    :type warm: tuple
+    :return: sampleset
+    :rtype: dimod.SampleSet
+    """
+    s = neal.SimulatedAnnealingSampler()
+    if warm is None:
+        return s.sample_qubo(worker_qubo, num_sweeps=ns, num_reads=nr, seed=seed)
+    initial_states, beta_range = warm
+    return s.sample_qubo(
+        worker_qubo,
+        num_sweeps=ns,
+        num_reads=nr,
+        seed=seed,
+        initial_states=initial_states,
+        beta_range=beta_range,
+    )
+
+
+def sim_anneal(
+    qubo, nr, ns, workers=1, seed=None, initial_states=None
+) -> dimod.sampleset.SampleSet:
+    """Runs simulated annealing experiment. With more than one worker or with a seed, the reads are split into one
+    shard per worker, each with its own seed spawned from the given one, and the shards run in parallel processes.
+    With initial states, each read starts from one of them at the temperatures of warm_beta_range
+
     :param qubo: QUBO formulation for the problem
     :type qubo: dictionary
     :param num_reads: Number of samples
     :type num_reads: int
     :param num_sweeps: Number of steps
     :type num_sweeps: int
+    :param workers: Number of worker processes, at least 1
+    :type workers: int
+    :param seed: Seed, the results are reproducible for a given seed and number of workers
+    :type seed: int
+    :param initial_states: One initial state per read and their variables
+    :type initial_states: tuple(numpy.ndarray, list)
     :return: sampleset
     :rtype: dimod.SampleSet
     """
-    s = neal.SimulatedAnnealingSampler()
-    return s.sample_qubo(qubo, num_sweeps=ns, num_reads=nr)
+    assert workers >= 1, "sim_anneal needs at least one worker"
+    if workers == 1 and seed is None and initial_states is None:
+        s = neal.SimulatedAnnealingSampler()
+        return s.sample_qubo(qubo, num_sweeps=ns, num_reads=nr)
+
+    shards = [nr // workers + (i < nr % workers) for i in range(workers)]
+    # neal accepts seeds below 2**31
+    seeds = [
+        int(child.generate_state(1, dtype=np.uint32)[0] >> 1)
+        for child in np.random.SeedSequence(seed).spawn(workers)
+    ]
+    warm = [None] * workers
+    if initial_states is not None:
+        states, variables = initial_states
+        beta_range = warm_beta_range(qubo)
+        bounds = np.cumsum([0] + shards)
+        warm = [
+            ((states[bounds[i] : bounds[i + 1]], variables), beta_range)
+            for i in range(workers)
+        ]
+    shards = [
+        (size, shard_seed, shard_warm)
+        for size, shard_seed, shard_warm in zip(shards, seeds, warm)
+        if size > 0
+    ]
+    if len(shards) == 1:
+        init_sim_worker(qubo)
+        samplesets = [sim_anneal_shard(shards[0][0], ns, *shards[0][1:])]
+    else:
+        with ProcessPoolExecutor(
+            max_workers=len(shards), initializer=init_sim_worker, initargs=(qubo,)
+        ) as pool:
+            samplesets = list(
+                pool.map(
+                    sim_anneal_shard,
+                    [size for size, _, _ in shards],
+                    [ns] * len(shards),
+                    [shard_seed for _, shard_seed, _ in shards],
+                    [shard_warm for _, _, shard_warm in shards],
+                )
+            )
+    sampleset = dimod.concatenate(samplesets)
+    sampleset.info.update(samplesets[0].info)
+    sampleset.info["seeds"] = [shard_seed for _, shard_seed, _ in shards]
+    return sampleset
 
 
 def real_anneal(
-    qubo, num_reads, annealing_time, chain_strength, solver
+    qubo,
+    num_reads,
+    annealing_time,
+    chain_strength,
+    solver,
+    initial_state=None,
+    embedding_folder=None,
 ) -> dimod.sampleset.SampleSet:
-    """Runs quantum annealing experiment on D-Wave
+    """Runs quantum annealing experiment on D-Wave. With an initial state, the anneal is a reverse anneal from it, with
+    the schedule of reverse_anneal_schedule. With an embedding folder, the embedding is taken from the cache of
+    get_cached_embedding and the chain statistics are added to the info of the sampleset
     :param qubo: QUBO formulation for the problem
     :type qubo: dictionary
     :param num_reads: Number of samples
@@ -37,19 +160,38 @@ def real_anneal(
     :type chain_strength: float
     :param solver = DWave Solver name
     :type = string
+    :param initial_state: Initial state of the reverse anneal
+    :type initial_state: dict
+    :param embedding_folder: Embedding cache folder, if None the embedding is found by EmbeddingComposite
+    :type embedding_folder: string
     :return: sampleset
     :rtype: dimod.SampleSet
     """
 
-    sampler = EmbeddingComposite(DWaveSampler(solver=solver))
-    # annealing time in micro second, 20 is default.
-    return sampler.sample_qubo(
-        qubo,
-        num_reads=num_reads,
-        auto_scale="true",
-        annealing_time=annealing_time,
-        chain_strength=chain_strength,
+    child = DWaveSampler(solver=solver)
+    params = {
+        "num_reads": num_reads,
+        "auto_scale": "true",
+        "chain_strength": chain_strength,
+    }
+    if initial_state is not None:
+        # every read starts again from the initial state
+        params["anneal_schedule"] = reverse_anneal_schedule(annealing_time)
+        params["initial_state"] = initial_state
+        params["reinitialize_state"] = True
+    else:
+        # annealing time in micro second, 20 is default.
+        params["annealing_time"] = annealing_time
+    if embedding_folder is None:
+        return EmbeddingComposite(child).sample_qubo(qubo, **params)
+
+    embedding = get_cached_embedding(
+        qubo, child.properties["topology"], embedding_folder, child.to_networkx_graph()
     )
+    sampler = FixedEmbeddingComposite(child, embedding)
+    sampleset = sampler.sample_qubo(qubo, return_embedding=True, **params)
+    sampleset.info["chain_statistics"] = chain_statistics(embedding)
+    return sampleset
 
 
 def hybrid_anneal(qubo) -> dimod.sampleset.SampleSet:
@@ -63,8 +205,38 @@ def hybrid_anneal(qubo) -> dimod.sampleset.SampleSet:
     return sampler.sample_qubo(qubo)
 
 
-def anneal(qubo, mode, a_dict, sample_p, solver=None):
-    """Runs the annealing experiment
+def get_initial_states(qubo, a_dict, problem):
+    """Builds one warm start state per read with warm_start_states, the jobs fixed by the problem are selected in all
+    of them
+
+    :param qubo: QUBO formulation for the problem
+    :type qubo: dictionary
+    :param a_dict: Dictionary containing annealing parameters
+    :type a_dict: dictionary
+    :param problem: Dictionary containing the job list, M, max_time and p_dict, and optionally the ids of the fixed jobs
+    :type problem: dict
+    :return: States and their variables
+    :rtype: tuple(numpy.ndarray, list)
+    """
+    job_list = problem["job_list"]
+    fixed = None
+    if problem.get("fixed"):
+        fixed = np.isin(job_list.ids, list(problem["fixed"]))
+    # variables in the order of the qubo, as in the samplesets of the samplers
+    variables = list(dict.fromkeys(v for key in qubo for v in key))
+    return warm_start_states(
+        variables,
+        job_list,
+        problem["M"],
+        problem["max_time"],
+        a_dict["nr"],
+        a_dict.get("seed"),
+        fixed,
+    )
+
+
+def run_sampler(qubo, mode, a_dict, solver=None, problem=None) -> dimod.sampleset.SampleSet:
+    """Samples the qubo with the sampler of the given mode
 
     :param qubo: QUBO formulation for the problem
     :type qubo: dictionary
@@ -72,22 +244,61 @@ def anneal(qubo, mode, a_dict, sample_p, solver=None):
     :type mode: string
     :param a_dict: Dictionary containing annealing parameters
     :type a_dict: dictionary
+    :param problem: Dictionary containing the job list, M, max_time and p_dict, needed by the exact mode and the warm
+    start
+    :type problem: dict
     :return: sampleset
     :rtype: dimod.SampleSet
     """
+    initial_states = None
+    if a_dict.get("warm") and mode in ["sim", "quantum"]:
+        initial_states = get_initial_states(qubo, a_dict, problem)
     if mode == "sim":
         ns, nr = a_dict["ns"], a_dict["nr"]
-        sampleset = sim_anneal(qubo, nr, ns)
-        store_result(sample_p, sampleset)
+        workers, seed = a_dict.get("workers", 1), a_dict.get("seed")
+        if initial_states is not None:
+            ns = max(1, round(ns * WARM_START_SWEEP_FRACTION))
+        sampleset = sim_anneal(qubo, nr, ns, workers, seed, initial_states)
     elif mode == "quantum":
         nr, t, rcs = a_dict["nr"], a_dict["t"], a_dict["rcs"]
         ch = max_chain_strength(qubo) * rcs
         print(max_chain_strength(qubo))
-        sampleset = real_anneal(qubo, nr, t, ch, solver=solver)
-        store_result(sample_p, sampleset)
+        initial_state = None
+        if initial_states is not None:
+            states, variables = initial_states
+            initial_state = dict(zip(variables, states[0].tolist()))
+        embedding_folder = a_dict.get("embedding_folder", EMBEDDING_CACHE_FOLDER)
+        sampleset = real_anneal(
+            qubo, nr, t, ch, solver, initial_state, embedding_folder
+        )
     elif mode == "hyb":
         sampleset = hybrid_anneal(qubo)
-        store_result(sample_p, sampleset)
+    elif mode == "exact":
+        sampleset = exact_solve(qubo, problem)
+    return sampleset
+
+
+def anneal(qubo, mode, a_dict, sample_p, solver=None, problem=None):
+    """Runs the annealing experiment and stores the samples
+
+    :param qubo: QUBO formulation for the problem
+    :type qubo: dictionary
+    :param mode: Simulation mode
+    :type mode: string
+    :param a_dict: Dictionary containing annealing parameters
+    :type a_dict: dictionary
+    :param problem: Dictionary containing the job list, M, max_time and p_dict, needed by the exact mode. If given, the
+    samples selecting the same jobs are stored once, with their number of occurrences
+    :type problem: dict
+    :return: sampleset
+    :rtype: dimod.SampleSet
+    """
+    sampleset = run_sampler(qubo, mode, a_dict, solver, problem)
+    job_list = None
+    if problem is not None:
+        job_list = problem["job_list"]
+        sampleset = aggregate_samples(sampleset, job_list)
+    store_result(sample_p, sampleset, job_list)
     return sampleset
 
 
@@ -111,8 +322,13 @@ def annealing_statistics(sampleset):
     :param sampleset: Sampleset to process
     :type sampleset: dimod.SampleSet
     """
+    if "embedding_context" not in sampleset.info:
+        # stitched from the blocks of a decomposed problem
+        return
     l = list(sampleset.info["embedding_context"]["embedding"].values())
     logging.info(f"Physical variables: {len(set.union(*[set(x) for x in l]))}")
+    if "chain_statistics" in sampleset.info:
+        logging.info(f"Chain statistics: {sampleset.info['chain_statistics']}")
     logging.info(f"Chain break: {list(sampleset.record.chain_break_fraction)}")
 
 
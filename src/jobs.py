@@ -2,10 +2,12 @@ import logging
 
 import numpy as np
 
-from toolbox import get_entropy
+from toolbox import get_table_entropies
 
 
 class Job:
+    __slots__ = ("start", "end", "weight", "id", "track")
+
     def __init__(self, start, end, weight, id, track=None):
         """Constructor  for the job class
 
@@ -37,10 +39,45 @@ class Job:
 
 class JobCollector:
     def __init__(self) -> None:
-        """Constructor for the JobCollector class"""
+        """Constructor for the JobCollector class. Besides the list of jobs, the start, end, weight, track and id of the
+        jobs are stored as columns, so that they can be read as arrays, and the row of each id is kept for lookups. A
+        track of -1 in the track column stands for a job without track"""
 
         self.jobs = []
         self.counter = 0
+        self.index = {}
+        self._columns = {
+            "start": np.zeros(16, dtype=np.int64),
+            "end": np.zeros(16, dtype=np.int64),
+            "weight": np.zeros(16, dtype=np.float64),
+            "track": np.zeros(16, dtype=np.int64),
+            "id": np.zeros(16, dtype=np.int64),
+        }
+
+    @property
+    def starts(self) -> np.ndarray:
+        """Start times of the jobs"""
+        return self._columns["start"][: len(self.jobs)]
+
+    @property
+    def ends(self) -> np.ndarray:
+        """End times of the jobs"""
+        return self._columns["end"][: len(self.jobs)]
+
+    @property
+    def weights(self) -> np.ndarray:
+        """Weights of the jobs"""
+        return self._columns["weight"][: len(self.jobs)]
+
+    @property
+    def tracks(self) -> np.ndarray:
+        """Tracks of the jobs, -1 if the job has no track"""
+        return self._columns["track"][: len(self.jobs)]
+
+    @property
+    def ids(self) -> np.ndarray:
+        """Ids of the jobs"""
+        return self._columns["id"][: len(self.jobs)]
 
     def new_job(self, start, end, weight, track=None) -> Job:
         """Creates a new job
@@ -69,7 +106,17 @@ class JobCollector:
         :return: JobCollector object
         :rtype: JobCollector
         """
-        if self[job.id] == None:
+        if job.id not in self.index:
+            row = len(self.jobs)
+            if row == len(self._columns["id"]):
+                for name, column in self._columns.items():
+                    self._columns[name] = np.resize(column, 2 * len(column))
+            self._columns["start"][row] = job.start
+            self._columns["end"][row] = job.end
+            self._columns["weight"][row] = job.weight
+            self._columns["track"][row] = -1 if job.track is None else job.track
+            self._columns["id"][row] = job.id
+            self.index[job.id] = row
             self.jobs.append(job)
         else:
             print("Job id already exists")
@@ -83,7 +130,16 @@ class JobCollector:
         :return: job with the given id
         :rtype:Job
         """
-        return next((job for job in self.jobs if job.id == id), None)
+        row = self.index.get(id)
+        return None if row is None else self.jobs[row]
+
+    def __len__(self):
+        """Returns the number of jobs
+
+        :return: Number of jobs
+        :rtype: int
+        """
+        return len(self.jobs)
 
     def __repr__(self):
         """Used for printing
@@ -116,25 +172,25 @@ def random_jobs(num_jobs, max_time, max_weight):
     return rdm_jobs_list
 
 
-def phrase_to_jobs(phrase_list, file):
-    """Given the phrase list and the music file, create a list of jobs
+def phrase_to_jobs(phrase_list, notes):
+    """Given the phrase list and the note table of the music file, create a list of jobs
 
     :param phrase_list: Dictionary containing the phrases
     :type phrase_list: dictionary
-    :param file: Music file
-    :type file: Music21 Stream
+    :param notes: Note table of the music file
+    :type notes: NoteTable
     :return: List of jobs
     :rtype: list
     """
+    phrases = [
+        (track, phrase[0], phrase[1])
+        for track, value in phrase_list.items()
+        for phrase in value
+    ]
+    weights = get_table_entropies(notes, phrases)
     job_list = JobCollector()
-    for track, value in phrase_list.items():
-        for phrase in value:
-            job_list.new_job(
-                phrase[0] - 1,
-                phrase[1],
-                get_entropy(file, track, phrase[0], phrase[1]),
-                track,
-            )
+    for (track, start, end), weight in zip(phrases, weights):
+        job_list.new_job(start - 1, end, weight, track)
     return job_list
 
 
@@ -144,8 +200,8 @@ def job_statistics(job_list):
     :param job_list: list of jobs
     :type job_list: list
     """
-    weights = [job.weight for job in job_list.jobs]
-    lengths = [job.end - job.start for job in job_list.jobs]
+    weights = job_list.weights
+    lengths = job_list.ends - job_list.starts
     logging.info(
         f"Phrases min. weight: {-1 * min(weights)} max. weight: {-1 * max(weights)} avg. weight: {-1 * np.mean(weights)}"
     )
@@ -162,4 +218,4 @@ def max_weight_phrase(job_list):
     :return: max weight
     :rtype: float
     """
-    return max([job.weight for job in job_list.jobs])
+    return job_list.weights.max()
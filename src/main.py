@@ -2,20 +2,83 @@ import argparse
 import os
 import pickle
 
-from music21 import converter
-
+from calibration import (
+    DEFAULT_PENALTY_MULTIPLIERS,
+    calibrate_penalties,
+    get_calibration_path,
+    get_p_dict,
+    get_penalty_multipliers,
+    store_calibration,
+)
+from decomposition import decomposed_anneal
+from embedding_cache import EMBEDDING_CACHE_FOLDER
 from experiment import anneal, annealing_statistics
 from jobs import job_statistics, max_weight_phrase, phrase_to_jobs
-from phrase_identification import generate_phrase_list
+from phrase_identification import PHRASE_VERSION, generate_phrase_list
+from profiling import PROFILE_FILE, StageProfiler, count_sizes, profile_stage
 from postprocess import *
-from qubo import get_qubo
-from toolbox import max_num_measures
-from utils import get_file_path, load_result
+from rolling import rolling_arrangement
+from note_table import get_note_table
+from qubo import get_qubo, get_qubo_direct
+from qubo_cache import get_cached_qubo
+from utils import get_file_path, load_result, store_result
 import datetime
 
 
-def get_out_paths(folder_dict, out_file_name, mode, a_dict, solver=None):
-    """Given the folder dictionary, it returns necessary path for storing out files
+def get_phrase_path(folder_dict, out_file_name):
+    """Returns the path to the phrases of the out file, which does not depend on the number of tracks. It ends with the
+    version of the phrase identification, so phrases cached by an earlier version are not loaded
+
+    :param folder_dict: Dictionary containing names of the folders
+    :type folder_dict: dictionary
+    :param out_file_name: Name of the out file
+    :type out_file_name: string
+    :return: Path to the phrases
+    :rtype: string
+    """
+    temp = get_file_path(folder_dict["phrase_folder"], out_file_name)
+    index = temp.rindex("_")
+    return f"{temp[:index]}_v{PHRASE_VERSION}"
+
+
+def get_variant_suffix(
+    multipliers=DEFAULT_PENALTY_MULTIPLIERS, collapse=False, builder="direct"
+):
+    """Returns the suffix of the out files of a variant of the problem: the penalty multipliers other than the default
+    ones, _col for collapsed qubos and the builder other than direct. The default variant has no suffix
+
+    :param multipliers: Multiplier of each penalty
+    :type multipliers: dict
+    :param collapse: Whether the constraints of consecutive measures with the same running jobs are merged
+    :type collapse: bool
+    :param builder: QUBO builder
+    :type builder: string
+    :return: Suffix
+    :rtype: string
+    """
+    suffix = ""
+    if multipliers != DEFAULT_PENALTY_MULTIPLIERS:
+        suffix = f"{suffix}_p{multipliers['exact']}_{multipliers['less']}"
+    if collapse:
+        suffix = f"{suffix}_col"
+    if builder != "direct":
+        suffix = f"{suffix}_{builder}"
+    return suffix
+
+
+def get_out_paths(
+    folder_dict,
+    out_file_name,
+    mode,
+    a_dict,
+    solver=None,
+    multipliers=DEFAULT_PENALTY_MULTIPLIERS,
+    collapse=False,
+):
+    """Given the folder dictionary, it returns necessary path for storing out files. The results of penalty multipliers
+    other than the default ones end with the multipliers, so that samples of different penalties are never mixed, and
+    those of collapsed qubos, which have fewer slack variables, with _col. Both builders give the same qubo, so they
+    share the results
 
     :param folder_dict: Dictionary containing names of the folders
     :type folder_dict: dictionary
@@ -25,13 +88,15 @@ def get_out_paths(folder_dict, out_file_name, mode, a_dict, solver=None):
     :type string
     :param a_dict: Dictionary of annealing parameters
     :type a_dict: dict
+    :param multipliers: Multiplier of each penalty
+    :type multipliers: dict
+    :param collapse: Whether the constraints of consecutive measures with the same running jobs are merged
+    :type collapse: bool
     :return: Names of the paths to the files
     :rtype: tuple(string, string, string)
     """
     midi_p = get_file_path(folder_dict["midi_folder"], out_file_name)
-    temp = get_file_path(folder_dict["phrase_folder"], out_file_name)
-    index = temp.rindex("_")
-    phrase_p = temp[:index]
+    phrase_p = get_phrase_path(folder_dict, out_file_name)
     results_p = get_file_path(
         get_file_path(folder_dict["results_folder"], mode), out_file_name
     )
@@ -43,14 +108,19 @@ def get_out_paths(folder_dict, out_file_name, mode, a_dict, solver=None):
         results_p = f"{results_p}_{nr}_{t}_{rcs}_{solver}"
     elif mode == "hyb":
         results_p = f"{results_p}_hyb"
+    elif mode == "exact":
+        results_p = f"{results_p}_exact"
+    if mode in ["sim", "quantum"] and a_dict.get("warm"):
+        results_p = f"{results_p}_warm"
+    results_p = f"{results_p}{get_variant_suffix(multipliers, collapse)}"
     return midi_p, phrase_p, results_p
 
 
-def get_phrases(file, phrase_path):
+def get_phrases(notes, phrase_path):
     """If the phrases already exist, it loads it. Otherwise, it generates and saves.
 
-    :param file: Music file
-    :type file: music21 Stream
+    :param notes: Note table of the music file
+    :type notes: NoteTable
     :param phrase_path: Path to the phrases
     :type phrase_path: string
     :return: List of phrases
@@ -59,7 +129,7 @@ def get_phrases(file, phrase_path):
     if os.path.isfile(phrase_path):
         phrase_list = pickle.load(open(phrase_path, "rb"))
     else:
-        phrase_list = generate_phrase_list(file, phrase_path)
+        phrase_list = generate_phrase_list(notes, phrase_path)
     return phrase_list
 
 
@@ -73,7 +143,7 @@ def log_experiment(
     a_dict,
     phrase_list,
     job_list,
-    model,
+    variables,
     offset,
     result_e,
     result_n,
@@ -96,7 +166,7 @@ def log_experiment(
     logging.info(f"Phrase list: {phrase_list}")
     logging.info(f"Job list: {job_list}")
     job_statistics(job_list)
-    logging.info(f"QUBO num variables: {len(model.variables)}\n offset: {offset}")
+    logging.info(f"QUBO num variables: {len(variables)}\n offset: {offset}")
     logging.info(f"Best entropy result: {result_e}")
     logging.info(f"Best non-violating result: {result_n}")
     logging.info(f"First 10 samples sorted based on entropy:")
@@ -106,92 +176,481 @@ def log_experiment(
         annealing_statistics(sampleset)
 
 
-def music_experiment(
-    midi_file, folder_dict, num_measures, M, mode, a_dict, solver, load, log
+def prepare_experiment(
+    midi_file,
+    folder_dict,
+    num_measures,
+    M,
+    builder="direct",
+    collapse=False,
+    profiler=None,
 ):
-    """Runs the music experiment
+    """Builds the artifacts of the music experiment that do not depend on the annealing parameters: the note table,
+    the phrases, the jobs and the QUBO. The QUBO is taken from the cache folder of folder_dict, if there is one. The
+    penalties are the calibrated ones of the score and M, if there are any, see calibrate_experiment
 
+    :param midi_file: Name of the midi file
+    :type midi_file: string
     :param folder_dict: Dictionary containing folder names
     :type folder_dict: dictionary
     :param num_measures: Number of measures to parse, if -1, then whole song is considered
     :type num_measures: int
     :param M: Number of tracks
     :type M: int
-    :param p_dict: Dictionary for QUBO penalties
-    :type p_dict: dictionary
-    :param mode: Simulation mode
-    :type mode: string
-    :param a_dict: Dictionary containing annealing parameters
-    :type a_dict: dictionary
+    :param builder: QUBO builder, either direct (coefficient arrays) or pyqubo (compiled expression)
+    :type builder: string
+    :param collapse: Whether to merge the constraints of consecutive measures with the same running jobs
+    :type collapse: bool
+    :param profiler: If given, the stages are measured by it
+    :type profiler: profiling.StageProfiler
+    :return: Dictionary of the prepared problem
+    :rtype: dict
     """
-
     input_p = get_file_path(folder_dict["midi_folder"], midi_file)
     if not os.path.isfile(input_p):
         print("Midi file does not exist.")
         exit(1)
 
     file_name = midi_file[:-4]
+    with profile_stage(profiler, "note_table"):
+        notes = get_note_table(input_p)
     if num_measures == -1:
         out_file_name = f"{file_name}_{M}"
-        file = converter.parse(input_p).stripTies()
-        num_measures = max_num_measures(file)
+        num_measures = notes.num_measures
     else:
         out_file_name = f"{file_name}_{num_measures}_{M}"
-        file = converter.parse(input_p).measures(0, num_measures).stripTies()
+        notes = notes.truncate(num_measures)
 
-    midi_p, phrase_p, results_p = get_out_paths(
-        folder_dict, out_file_name, mode, a_dict, solver
+    count_sizes(profiler, parts=notes.num_parts, notes=len(notes.notes))
+
+    with profile_stage(profiler, "phrases"):
+        phrase_list = get_phrases(notes, get_phrase_path(folder_dict, out_file_name))
+
+    with profile_stage(profiler, "jobs"):
+        job_list = phrase_to_jobs(phrase_list, notes)
+    count_sizes(
+        profiler,
+        phrases=sum(len(phrases) for phrases in phrase_list.values()),
+        jobs=len(job_list),
+    )
+
+    multipliers = get_penalty_multipliers(
+        get_calibration_path(folder_dict), out_file_name
     )
-    phrase_list = get_phrases(file, phrase_p)
+    prep = {
+        "midi_file": midi_file,
+        "input_p": input_p,
+        "folder_dict": folder_dict,
+        "out_file_name": out_file_name,
+        "notes": notes,
+        "num_measures": num_measures,
+        "M": M,
+        "phrase_list": phrase_list,
+        "job_list": job_list,
+        "builder": builder,
+        "collapse": collapse,
+    }
+    return build_experiment_qubo(prep, multipliers, profiler)
+
 
-    job_list = phrase_to_jobs(phrase_list, file)
-    p = max_weight_phrase(job_list)
-    p_dict = {"exact": 2 * p, "less": 2 * 2 * p}
+def build_experiment_qubo(prep, multipliers, profiler=None):
+    """Builds the QUBO of the prepared problem for the given penalty multipliers, with the builder of the prepared
+    problem. The QUBO is taken from the cache folder of folder_dict, if there is one
 
-    qubo, offset, model = get_qubo(job_list, M, num_measures, p_dict)
+    :param prep: Prepared problem, as returned by prepare_experiment
+    :type prep: dict
+    :param multipliers: Multiplier of each penalty
+    :type multipliers: dict
+    :param profiler: If given, the stage is measured by it
+    :type profiler: profiling.StageProfiler
+    :return: Prepared problem with the multipliers, the penalties and the QUBO
+    :rtype: dict
+    """
+    job_list, M, num_measures = prep["job_list"], prep["M"], prep["num_measures"]
+    builder, collapse = prep["builder"], prep["collapse"]
+    cache_folder = prep["folder_dict"].get("cache_folder")
+    p_dict = get_p_dict(max_weight_phrase(job_list), multipliers)
 
-    if load:
-        print(results_p)
-        if os.path.exists(results_p):
-            sampleset = load_result(results_p)
+    with profile_stage(profiler, "qubo"):
+        if cache_folder:
+            qubo, offset, variables = get_cached_qubo(
+                job_list,
+                M,
+                num_measures,
+                p_dict,
+                builder,
+                cache_folder,
+                collapse=collapse,
+            )
+        elif builder == "pyqubo":
+            qubo, offset, model = get_qubo(
+                job_list, M, num_measures, p_dict, collapse
+            )
+            variables = model.variables
         else:
-            print("Solution does not exist")
-            exit(1)
-    else:
-        if os.path.exists(results_p):
-            print("Overwriting old results")
-
-        sampleset = anneal(qubo, mode, a_dict, results_p, solver=solver)
-    
-    results = sampleset_to_result(sampleset, M, num_measures, job_list)
-    result_e = get_best_entropy_result(results)
-    result_n = get_best_nonviolating_result(results)
-    results_min = sorted(results, key=lambda d: d["M_violate"])[0]
-    if result_e:
-        sample_to_midi(file, result_e["sample"], M, job_list, results_p, "e")
-    if result_n:
-        sample_to_midi(file, result_n["sample"], M, job_list, results_p, "n")
+            qubo, offset, variables = get_qubo_direct(
+                job_list, M, num_measures, p_dict, collapse
+            )
+    if profiler is not None:
+        quadratic_terms = sum(u != v for u, v in qubo)
+        profiler.count(variables=len(variables), quadratic_terms=quadratic_terms)
+
+    return dict(
+        prep,
+        multipliers=dict(multipliers),
+        p_dict=p_dict,
+        qubo=qubo,
+        offset=offset,
+        variables=variables,
+    )
+
+
+def evaluate_experiment(
+    prep,
+    mode,
+    a_dict,
+    solver,
+    load,
+    log,
+    repair=False,
+    decompose=None,
+    profiler=None,
+):
+    """Samples the prepared problem with the given annealing parameters, or loads the stored samples, and evaluates
+    them
+
+    :param prep: Prepared problem, as returned by prepare_experiment
+    :type prep: dict
+    :param mode: Simulation mode
+    :type mode: string
+    :param a_dict: Dictionary containing annealing parameters
+    :type a_dict: dictionary
+    :param solver: D-Wave solver
+    :type solver: string
+    :param load: Whether to load the stored samples instead of sampling
+    :type load: bool
+    :param log: Whether to log the experiment
+    :type log: bool
+    :param repair: Whether to repair the infeasible samples before choosing the results
+    :type repair: bool
+    :param decompose: If given, the problem is split at the time points that no job crosses and the blocks, of at least
+    this many measures, are sampled separately
+    :type decompose: int
+    :param profiler: If given, the stages are measured by it
+    :type profiler: profiling.StageProfiler
+    :return: Best non-violating result and the result with the fewest violations
+    :rtype: tuple(dict, dict)
+    """
+    M, num_measures = prep["M"], prep["num_measures"]
+    job_list, qubo = prep["job_list"], prep["qubo"]
+    midi_p, phrase_p, results_p = get_out_paths(
+        prep["folder_dict"],
+        prep["out_file_name"],
+        mode,
+        a_dict,
+        solver,
+        prep["multipliers"],
+        prep.get("collapse", False),
+    )
+    if decompose is not None:
+        results_p = f"{results_p}_dec"
+
+    with profile_stage(profiler, "load" if load else "anneal"):
+        if load:
+            print(results_p)
+            if os.path.exists(results_p):
+                # results stored before the aggregation may hold duplicates
+                sampleset = aggregate_samples(
+                    load_result(results_p, job_list), job_list
+                )
+            else:
+                print("Solution does not exist")
+                exit(1)
+        else:
+            if os.path.exists(results_p):
+                print("Overwriting old results")
+            problem = {
+                "job_list": job_list,
+                "M": M,
+                "max_time": num_measures,
+                "p_dict": prep["p_dict"],
+            }
+            if decompose is not None:
+                sampleset = decomposed_anneal(
+                    job_list,
+                    M,
+                    num_measures,
+                    prep["p_dict"],
+                    mode,
+                    a_dict,
+                    solver,
+                    decompose,
+                    prep.get("collapse", False),
+                )
+                sampleset = aggregate_samples(sampleset, job_list)
+                store_result(results_p, sampleset, job_list)
+            else:
+                sampleset = anneal(
+                    qubo, mode, a_dict, results_p, solver=solver, problem=problem
+                )
+    count_sizes(profiler, reads=sampleset.record.num_occurrences.sum())
+
+    if repair:
+        with profile_stage(profiler, "repair"):
+            sampleset, rescued = repair_sampleset(
+                sampleset, qubo, M, num_measures, job_list
+            )
+        print(f"Repair rescued {rescued} of {len(sampleset)} samples")
+        sampleset = aggregate_samples(sampleset, job_list)
+
+    with profile_stage(profiler, "results"):
+        results = stream_results(sampleset, M, num_measures, job_list)
+        result_e = next(iter(results["entropy"]), None)
+        result_n = next(iter(results["nonviolating"]), None)
+        results_min = results["violations"][0]
+    with profile_stage(profiler, "midi"):
+        if result_e:
+            sample_to_midi_direct(
+                prep["notes"], result_e["sample"], M, job_list, results_p, "e"
+            )
+        if result_n:
+            sample_to_midi_direct(
+                prep["notes"], result_n["sample"], M, job_list, results_p, "n"
+            )
 
     if log:
         log_experiment(
-            midi_file,
+            prep["midi_file"],
             num_measures,
             M,
-            p_dict,
+            prep["p_dict"],
             mode,
             solver,
             a_dict,
-            phrase_list,
+            prep["phrase_list"],
             job_list,
-            model,
-            offset,
+            prep["variables"],
+            prep["offset"],
             result_e,
             result_n,
-            results,
+            results["all_entropy"],
             sampleset,
         )
+        logging.info(f"Result counters: {results['counters']}")
+
+    return result_n, results_min
+
+
+def music_experiment(
+    midi_file,
+    folder_dict,
+    num_measures,
+    M,
+    mode,
+    a_dict,
+    solver,
+    load,
+    log,
+    builder="direct",
+    repair=False,
+    decompose=None,
+    collapse=False,
+    profile=False,
+    calibrate=False,
+):
+    """Runs the music experiment. With calibrate, the penalties are calibrated on the prepared problem first, see
+    calibrate_experiment
+
+    :param folder_dict: Dictionary containing folder names
+    :type folder_dict: dictionary
+    :param num_measures: Number of measures to parse, if -1, then whole song is considered
+    :type num_measures: int
+    :param M: Number of tracks
+    :type M: int
+    :param mode: Simulation mode
+    :type mode: string
+    :param a_dict: Dictionary containing annealing parameters
+    :type a_dict: dictionary
+    :param builder: QUBO builder, either direct (coefficient arrays) or pyqubo (compiled expression)
+    :type builder: string
+    :param repair: Whether to repair the infeasible samples before choosing the results
+    :type repair: bool
+    :param decompose: If given, minimum length of the blocks the problem is split into
+    :type decompose: int
+    :param collapse: Whether to merge the constraints of consecutive measures with the same running jobs
+    :type collapse: bool
+    :param profile: Whether to record the wall time, CPU time and peak memory of each stage, with size counters, in
+    the profile file of the results folder
+    :type profile: bool
+    :param calibrate: Whether to calibrate the penalty multipliers before sampling
+    :type calibrate: bool
+    """
+    profiler = None
+    if profile:
+        profiler = StageProfiler(
+            get_file_path(folder_dict["results_folder"], PROFILE_FILE),
+            {
+                "file": midi_file,
+                "measures": num_measures,
+                "tracks": M,
+                "mode": mode,
+                "a_dict": a_dict,
+                "builder": builder,
+                "collapse": collapse,
+            },
+        )
+    prep = prepare_experiment(
+        midi_file, folder_dict, num_measures, M, builder, collapse, profiler
+    )
+    if calibrate:
+        prep = calibrate_experiment(prep, a_dict, profiler)
+    results = evaluate_experiment(
+        prep, mode, a_dict, solver, load, log, repair, decompose, profiler
+    )
+    if profiler is not None:
+        profiler.write()
+    return results
+
+
+def calibrate_experiment(prep, a_dict, profiler=None):
+    """Calibrates the penalty multipliers of the prepared problem with calibrate_penalties and stores them, so that
+    later runs of prepare_experiment use them. The QUBO of the prepared problem is rebuilt if the multipliers change
+
+    :param prep: Prepared problem, as returned by prepare_experiment
+    :type prep: dict
+    :param a_dict: Dictionary containing annealing parameters, the seed and workers are used by the probes
+    :type a_dict: dictionary
+    :param profiler: If given, the stages are measured by it
+    :type profiler: profiling.StageProfiler
+    :return: Prepared problem with the calibrated multipliers
+    :rtype: dict
+    """
+    with profile_stage(profiler, "calibration"):
+        best, probes = calibrate_penalties(
+            prep["job_list"],
+            prep["M"],
+            prep["num_measures"],
+            seed=a_dict.get("seed"),
+            workers=a_dict.get("workers", 1),
+            collapse=prep["collapse"],
+        )
+    store_calibration(
+        get_calibration_path(prep["folder_dict"]),
+        prep["out_file_name"],
+        best,
+        probes,
+    )
+    for probe in probes:
+        print(
+            f"exact {probe['exact']} less {probe['less']}: hit rate {probe['hit_rate']:.2f}, feasible {probe['feasible_rate']:.2f}, TTS {probe['tts']:.4f} s"
+        )
+    print(
+        f"Calibrated multipliers for {prep['out_file_name']}: exact {best['exact']}, less {best['less']}"
+    )
+    multipliers = {"exact": best["exact"], "less": best["less"]}
+    if multipliers == prep["multipliers"]:
+        return prep
+    return build_experiment_qubo(prep, multipliers)
+
+
+def rolling_experiment(
+    midi_file,
+    folder_dict,
+    num_measures,
+    M,
+    mode,
+    a_dict,
+    solver,
+    window,
+    commit=None,
+    log=False,
+    builder="direct",
+    collapse=False,
+):
+    """Runs the rolling-horizon arrangement of the music file, see rolling.rolling_arrangement. The penalties are the
+    calibrated ones of the score and M, if there are any, and the qubos of the windows are taken from the cache folder
+    of folder_dict, if there is one
+
+    :param midi_file: Name of the midi file
+    :type midi_file: string
+    :param folder_dict: Dictionary containing folder names
+    :type folder_dict: dictionary
+    :param num_measures: Number of measures to parse, if -1, then whole song is considered
+    :type num_measures: int
+    :param M: Number of tracks
+    :type M: int
+    :param mode: Simulation mode
+    :type mode: string
+    :param a_dict: Dictionary containing annealing parameters
+    :type a_dict: dictionary
+    :param solver: D-Wave solver
+    :type solver: string
+    :param window: Number of measures of a window
+    :type window: int
+    :param commit: Number of measures committed after each window, half of the window if not given
+    :type commit: int
+    :param log: Whether to log the experiment
+    :type log: bool
+    :param builder: QUBO builder, either direct (coefficient arrays) or pyqubo (compiled expression)
+    :type builder: string
+    :param collapse: Whether to merge the constraints of consecutive measures with the same running jobs
+    :type collapse: bool
+    :return: Statistics of the run
+    :rtype: dict
+    """
+    input_p = get_file_path(folder_dict["midi_folder"], midi_file)
+    if not os.path.isfile(input_p):
+        print("Midi file does not exist.")
+        exit(1)
+    if commit is None:
+        commit = max(1, window // 2)
+    commit = min(commit, window)
 
-    return result_n,results_min
+    notes = get_note_table(input_p)
+    if num_measures == -1:
+        out_file_name = f"{midi_file[:-4]}_{M}"
+    else:
+        out_file_name = f"{midi_file[:-4]}_{num_measures}_{M}"
+        notes = notes.truncate(num_measures)
+    multipliers = get_penalty_multipliers(
+        get_calibration_path(folder_dict), out_file_name
+    )
+    results_p = get_out_paths(
+        folder_dict, out_file_name, mode, a_dict, solver, multipliers
+    )[2]
+    out_p = f"{results_p}_roll_{window}_{commit}"
+    os.makedirs(os.path.dirname(out_p), exist_ok=True)
+    _, stats = rolling_arrangement(
+        notes,
+        M,
+        window,
+        commit,
+        mode,
+        a_dict,
+        out_p,
+        solver,
+        collapse=collapse,
+        multipliers=multipliers,
+        builder=builder,
+        cache_folder=folder_dict.get("cache_folder"),
+    )
+    if log:
+        logging.info(
+            "--------------------------------------New Run-----------------------------------"
+        )
+        date = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        logging.info(f"Date: {date}")
+        logging.info(f"File: {midi_file}")
+        logging.info(f"Measures: {notes.num_measures}")
+        logging.info(f"Tracks: {M}")
+        logging.info(f"Penalty multipliers: {multipliers}")
+        logging.info(f"Solver: {mode}")
+        if mode == "quantum":
+            logging.info(f"Machine: {solver}")
+        logging.info(f"Annealing params: {a_dict}")
+        logging.info(f"Rolling arrangement {out_p}.mid: {stats}")
+    print(f"Rolling arrangement written to {out_p}.mid: {stats}")
+    return stats
 
 
 if __name__ == "__main__":
@@ -205,24 +664,47 @@ if __name__ == "__main__":
         type=str,
         required=False,
         default="sim",
-        choices=["sim", "quantum", "hyb"],
+        choices=["sim", "quantum", "hyb", "exact"],
     )
     parser.add_argument("--ns", type=int, required=False, default=4000)
     parser.add_argument("--nr", type=int, required=False, default=100)
+    parser.add_argument("--workers", type=int, required=False, default=1)
+    parser.add_argument("--seed", type=int, required=False, default=None)
     parser.add_argument("--rcs", type=float, required=False, default=0.2)
     parser.add_argument("--t", type=int, required=False, default=20)
     parser.add_argument(
         "--solver", type=str, required=False, default="Advantage_system4.1"
     )
+    parser.add_argument(
+        "--builder",
+        type=str,
+        required=False,
+        default="direct",
+        choices=["direct", "pyqubo"],
+    )
+    parser.add_argument("--repair", action="store_true")
+    parser.add_argument("--warm-start", action="store_true")
+    parser.add_argument("--calibrate", action="store_true")
+    parser.add_argument("--collapse", action="store_true")
+    parser.add_argument("--no-cache", action="store_true")
+    parser.add_argument("--window", type=int, required=False, default=None)
+    parser.add_argument("--commit", type=int, required=False, default=None)
+    parser.add_argument(
+        "--decompose", type=int, required=False, default=None, nargs="?", const=1
+    )
     parser.add_argument("--load", action="store_true")
     parser.add_argument("--log", action="store_true")
+    parser.add_argument("--profile", action="store_true")
 
     args = parser.parse_args()
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
 
     folder_dict = {
         "midi_folder": "midi",
         "phrase_folder": "phrases",
         "results_folder": "results",
+        "cache_folder": None if args.no_cache else "qubo_cache",
     }
     try:
         os.mkdir("phrases")
@@ -238,20 +720,54 @@ if __name__ == "__main__":
         "nr": args.nr,
         "t": args.t,
         "rcs": args.rcs,
-    }  # ns = number of sweaps, nr = number of reads
+        "workers": args.workers,
+        "seed": args.seed,
+        "warm": args.warm_start,
+        "embedding_folder": None if args.no_cache else EMBEDDING_CACHE_FOLDER,
+    }  # ns = number of sweaps, nr = number of reads, workers and seed for sim, warm for sim and quantum
 
     logging.basicConfig(
         filename=get_file_path("results", "results.log"), level=logging.INFO
     )
 
-    music_experiment(
-        args.midi,
-        folder_dict,
-        args.measures,
-        args.tracks,
-        args.mode,
-        a_dict,
-        args.solver,
-        args.load,
-        args.log,
-    )
+    if args.window:
+        # the windows are sampled and repaired one by one, their samples are not stored
+        unsupported = [
+            f"--{name}"
+            for name in ["load", "calibrate", "repair", "decompose", "profile"]
+            if getattr(args, name) not in [False, None]
+        ]
+        if unsupported:
+            parser.error(f"--window cannot be combined with {', '.join(unsupported)}")
+        rolling_experiment(
+            args.midi,
+            folder_dict,
+            args.measures,
+            args.tracks,
+            args.mode,
+            a_dict,
+            args.solver,
+            args.window,
+            args.commit,
+            args.log,
+            args.builder,
+            args.collapse,
+        )
+    else:
+        music_experiment(
+            args.midi,
+            folder_dict,
+            args.measures,
+            args.tracks,
+            args.mode,
+            a_dict,
+            args.solver,
+            args.load,
+            args.log,
+            args.builder,
+            args.repair,
+            args.decompose,
+            args.collapse,
+            args.profile,
+            args.calibrate,
+        )
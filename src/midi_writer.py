@@ -0,0 +1,248 @@
+import heapq
+import struct
+
+DEFAULT_VELOCITY = 90
+
+MIDI_DIVISION = 480
+
+# resolution of the midi files of music21, which also ends each track a quarter after its last event
+MUSIC21_DIVISION = 1024
+
+# channels music21 gives to the instruments, channel 9 is kept for percussion
+MUSIC21_CHANNELS = [*range(9), *range(10, 16)]
+
+
+def midi_channel(machine):
+    """Returns the midi channel of a machine, skipping channel 10 which is reserved for percussion
+
+    :param machine: Machine number
+    :type machine: int
+    :return: Midi channel, from 0 to 15
+    :rtype: int
+    """
+    return machine if machine < 9 else machine + 1
+
+
+def variable_length(value):
+    """Encodes a number as a midi variable-length quantity
+
+    :param value: Nonnegative number
+    :type value: int
+    :return: Encoded number
+    :rtype: bytes
+    """
+    data = [value & 0x7F]
+    value >>= 7
+    while value:
+        data.append(0x80 | (value & 0x7F))
+        value >>= 7
+    return bytes(reversed(data))
+
+
+def meta_message(kind, data):
+    """Encodes a meta event
+
+    :param kind: Type of the meta event
+    :type kind: int
+    :param data: Data of the event
+    :type data: bytes
+    :return: Encoded event
+    :rtype: bytes
+    """
+    return bytes([0xFF, kind]) + variable_length(len(data)) + data
+
+
+def tempo_message(qpm):
+    """Encodes a tempo event
+
+    :param qpm: Quarter notes per minute
+    :type qpm: float
+    :return: Encoded event
+    :rtype: bytes
+    """
+    return meta_message(0x51, round(60_000_000 / qpm).to_bytes(3, "big"))
+
+
+def time_signature_message(numerator, denominator):
+    """Encodes a time signature event, with a click every quarter note as in music21
+
+    :param numerator: Numerator of the time signature
+    :type numerator: int
+    :param denominator: Denominator of the time signature, a power of two
+    :type denominator: int
+    :return: Encoded event
+    :rtype: bytes
+    """
+    return meta_message(0x58, bytes([numerator, denominator.bit_length() - 1, 24, 8]))
+
+
+def key_signature_message(sharps, minor):
+    """Encodes a key signature event
+
+    :param sharps: Number of sharps, negative for flats
+    :type sharps: int
+    :param minor: Whether the key is minor
+    :type minor: bool
+    :return: Encoded event
+    :rtype: bytes
+    """
+    return meta_message(0x59, bytes([sharps & 0xFF, int(minor)]))
+
+
+def track_name_message(name):
+    """Encodes a track name event
+
+    :param name: Name of the track
+    :type name: string
+    :return: Encoded event
+    :rtype: bytes
+    """
+    return meta_message(0x03, name.encode("utf-8"))
+
+
+def assign_channels(instruments, init_programs):
+    """Assigns a channel to each track as music21 does. The instruments with a channel keep it and the other programs
+    take the free channels in order of appearance, one channel being kept free. Every event of a track is on the
+    channel of the program of its first instrument
+
+    :param instruments: For each track, the program and channel of its instruments, -1 if not set
+    :type instruments: list
+    :param init_programs: For each track, the program of its instrument at tick 0, -1 if not set or if there is none
+    :type init_programs: list
+    :return: Channel of each track
+    :rtype: list
+    """
+    free = list(MUSIC21_CHANNELS)
+    channels, programs = {}, []
+    for track in instruments:
+        for program, channel in track:
+            if channel >= 0 and program not in channels:
+                if channel in free:
+                    free.remove(channel)
+                elif channel != 9:
+                    channel = 0
+                channels[program] = channel
+            if program not in programs:
+                programs.append(program)
+        if not track and -1 not in programs:
+            programs.append(-1)
+    needed = [program for program in programs if program not in channels]
+    for i, program in enumerate(needed):
+        channels[program] = free[i] if i < len(free) - 1 else free[0]
+    return [channels.get(program, 0) for program in init_programs]
+
+
+def write_midi_file(path, tracks):
+    """Writes a multi-track (format 1) midi file with the resolution of music21, one track at a time
+
+    :param path: Path to the midi file
+    :type path: string
+    :param tracks: For each track, an iterable of its events as (tick, message) in order
+    :type tracks: list
+    """
+    with open(path, "wb") as handle:
+        handle.write(
+            b"MThd" + struct.pack(">IHHH", 6, 1, len(tracks), MUSIC21_DIVISION)
+        )
+        for events in tracks:
+            data, time = bytearray(), 0
+            for tick, message in events:
+                data += variable_length(tick - time) + message
+                time = tick
+            data += variable_length(MUSIC21_DIVISION) + meta_message(0x2F, b"")
+            handle.write(b"MTrk" + struct.pack(">I", len(data)) + data)
+
+
+class StreamingMidiWriter:
+    def __init__(self, path, ticks_per_quarter, tempos=()):
+        """Constructor for the StreamingMidiWriter class, which writes a single-track (format 0) midi file while the
+        notes are added. Each machine plays on its own channel. Notes are buffered until flush is called with a time
+        that no later note can start before, so only the notes that are still sounding are kept in memory
+
+        :param path: Path to the midi file
+        :type path: string
+        :param ticks_per_quarter: Number of ticks in a quarter length of the added notes
+        :type ticks_per_quarter: int
+        :param tempos: Starting tick and quarter notes per minute of each tempo mark
+        :type tempos: list
+        """
+        self.scale = max(1, MIDI_DIVISION // ticks_per_quarter)
+        self.handle = open(path, "wb")
+        self.handle.write(
+            b"MThd" + struct.pack(">IHHH", 6, 0, 1, ticks_per_quarter * self.scale)
+        )
+        self.handle.write(b"MTrk")
+        self.length_position = self.handle.tell()
+        self.handle.write(struct.pack(">I", 0))
+        self.length = 0
+        self.time = 0
+        self.count = 0
+        # (tick, kind, count, message) where note offs (kind 0) come before tempos and note ons at the same tick
+        self.pending = []
+        for tick, qpm in tempos:
+            self.push(tick, 1, tempo_message(qpm))
+
+    def push(self, tick, kind, message):
+        heapq.heappush(self.pending, (tick, kind, self.count, message))
+        self.count += 1
+
+    def add_note(self, machine, on, off, pitch, velocity):
+        """Adds a note
+
+        :param machine: Machine number
+        :type machine: int
+        :param on: Starting tick
+        :type on: int
+        :param off: Ending tick
+        :type off: int
+        :param pitch: Midi pitch
+        :type pitch: int
+        :param velocity: Velocity, the default one is used if negative
+        :type velocity: int
+        """
+        channel = midi_channel(machine)
+        if velocity < 0:
+            velocity = DEFAULT_VELOCITY
+        self.push(on, 2, bytes([0x90 | channel, pitch, velocity]))
+        self.push(off, 0, bytes([0x80 | channel, pitch, 0]))
+
+    def add_program(self, machine, tick, program):
+        """Sets the instrument of a machine from the given tick on
+
+        :param machine: Machine number
+        :type machine: int
+        :param tick: Tick of the change
+        :type tick: int
+        :param program: Midi program
+        :type program: int
+        """
+        self.push(tick, 1, bytes([0xC0 | midi_channel(machine), program]))
+
+    def write_event(self, tick, message):
+        # an event added after flushing past its tick is written at the current time
+        tick = max(tick, self.time)
+        data = variable_length((tick - self.time) * self.scale) + message
+        self.handle.write(data)
+        self.length += len(data)
+        self.time = tick
+
+    def flush(self, until):
+        """Writes the buffered events up to the given tick
+
+        :param until: Last tick to write
+        :type until: int
+        """
+        while self.pending and self.pending[0][0] <= until:
+            tick, _, _, message = heapq.heappop(self.pending)
+            self.write_event(tick, message)
+        self.handle.flush()
+
+    def close(self):
+        """Writes the remaining events and the end of the track, then closes the file"""
+        while self.pending:
+            tick, _, _, message = heapq.heappop(self.pending)
+            self.write_event(tick, message)
+        self.write_event(self.time, b"\xff\x2f\x00")
+        self.handle.seek(self.length_position)
+        self.handle.write(struct.pack(">I", self.length))
+        self.handle.close()
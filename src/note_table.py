@@ -0,0 +1,618 @@
+import json
+import math
+import os
+from fractions import Fraction
+
+import numpy as np
+from music21 import converter
+
+from toolbox import max_num_measures
+
+NOTE_TABLE_VERSION = 4
+
+NOTE_DTYPE = np.dtype(
+    [
+        ("part", np.int32),
+        ("measure", np.int32),
+        ("offset", np.int64),
+        ("duration", np.int64),
+        ("ps", np.float64),
+        ("chord", np.bool_),
+    ]
+)
+
+EVENT_DTYPE = np.dtype(
+    [
+        ("part", np.int32),
+        ("measure", np.int32),
+        ("on", np.int64),
+        ("off", np.int64),
+        ("pitch", np.int16),
+        ("velocity", np.int16),
+    ]
+)
+
+TEMPO_DTYPE = np.dtype(
+    [
+        ("part", np.int32),
+        ("measure", np.int32),
+        ("tick", np.int64),
+        ("qpm", np.float64),
+    ]
+)
+
+TIME_SIGNATURE_DTYPE = np.dtype(
+    [
+        ("part", np.int32),
+        ("measure", np.int32),
+        ("tick", np.int64),
+        ("numerator", np.int16),
+        ("denominator", np.int16),
+    ]
+)
+
+KEY_SIGNATURE_DTYPE = np.dtype(
+    [
+        ("part", np.int32),
+        ("measure", np.int32),
+        ("tick", np.int64),
+        ("sharps", np.int16),
+        ("minor", np.bool_),
+    ]
+)
+
+INSTRUMENT_DTYPE = np.dtype(
+    [
+        ("part", np.int32),
+        ("measure", np.int32),
+        ("tick", np.int64),
+        ("program", np.int16),
+        ("channel", np.int16),
+        ("name", object),
+    ]
+)
+
+# measure-level elements, each one a structured array of the given dtype
+MEASURE_MARKS = (
+    ("measure_tempos", TEMPO_DTYPE),
+    ("time_signatures", TIME_SIGNATURE_DTYPE),
+    ("key_signatures", KEY_SIGNATURE_DTYPE),
+    ("instruments", INSTRUMENT_DTYPE),
+)
+
+
+class NoteTable:
+    def __init__(
+        self,
+        notes,
+        measures,
+        ticks_per_quarter,
+        num_measures,
+        events=None,
+        tempos=(),
+        measure_tempos=None,
+        programs=(),
+        time_signatures=None,
+        key_signatures=None,
+        instruments=None,
+    ):
+        """Constructor for the NoteTable class, a columnar snapshot of the notes and chords of a music file. Offsets and
+        durations are stored exactly, as integer ticks, and the notes are ordered as in part.flat of each part
+
+        :param notes: Structured array with dtype NOTE_DTYPE, sorted by part
+        :type notes: numpy.ndarray
+        :param measures: For each part, an array of shape (number of measures, 4) holding the measure numbers, their
+        starting ticks, their lengths and their bar lengths. The length of a measure is the end of its last element,
+        which may differ from the bar length once the ties are stripped, and it is the length music21 gives the measure
+        when appending it to a stream
+        :type measures: list
+        :param ticks_per_quarter: Number of ticks in a quarter length
+        :type ticks_per_quarter: int
+        :param num_measures: Number of measures, as given by toolbox.max_num_measures
+        :type num_measures: int
+        :param events: Structured array with dtype EVENT_DTYPE, one row per sounding pitch, sorted by part and measure,
+        used for writing midi files
+        :type events: numpy.ndarray
+        :param tempos: Starting tick and quarter notes per minute of each tempo mark
+        :type tempos: list
+        :param measure_tempos: Structured array with dtype TEMPO_DTYPE, the tempo marks of each measure of each part
+        :type measure_tempos: numpy.ndarray
+        :param programs: Midi program of each part, -1 if the part has no instrument
+        :type programs: list
+        :param time_signatures: Structured array with dtype TIME_SIGNATURE_DTYPE, the time signatures of each measure of
+        each part
+        :type time_signatures: numpy.ndarray
+        :param key_signatures: Structured array with dtype KEY_SIGNATURE_DTYPE, the key signatures of each measure of
+        each part
+        :type key_signatures: numpy.ndarray
+        :param instruments: Structured array with dtype INSTRUMENT_DTYPE, the instruments of each measure of each part,
+        with their midi program and channel, -1 if not set, and their name. The marks and the instruments of a measure
+        are in the order of measure.recurse()
+        :type instruments: numpy.ndarray
+        """
+        self.notes = notes
+        self.measure_starts = measures
+        self.ticks_per_quarter = ticks_per_quarter
+        self.num_measures = num_measures
+        self.num_parts = len(measures)
+        self.events = np.zeros(0, dtype=EVENT_DTYPE) if events is None else events
+        self.tempos = [tuple(tempo) for tempo in tempos]
+        self.programs = list(programs)
+        marks = [measure_tempos, time_signatures, key_signatures, instruments]
+        for (name, dtype), rows in zip(MEASURE_MARKS, marks):
+            setattr(self, name, np.zeros(0, dtype=dtype) if rows is None else rows)
+        self._bounds = np.searchsorted(notes["part"], np.arange(self.num_parts + 1))
+
+    def part(self, track):
+        """Returns the notes of the given part
+
+        :param track: Track number
+        :type track: int
+        :return: Notes of the part
+        :rtype: numpy.ndarray
+        """
+        return self.notes[self._bounds[track] : self._bounds[track + 1]]
+
+    def measures(self, track, meas_start, meas_end):
+        """Returns the notes of the part in the given measures, together with the starting tick of the first measure,
+        which is the origin of the offsets in part.measures(meas_start, meas_end)
+
+        :param track: Track number
+        :type track: int
+        :param meas_start: First measure
+        :type meas_start: int
+        :param meas_end: Last measure
+        :type meas_end: int
+        :return: Notes in the measures and the starting tick
+        :rtype: numpy.ndarray, int
+        """
+        notes = self.part(track)
+        lo, hi = np.searchsorted(notes["measure"], [meas_start, meas_end + 1])
+        starts = self.measure_starts[track]
+        first = np.searchsorted(starts[:, 0], meas_start)
+        base = starts[first, 1] if first < len(starts) else 0
+        return notes[lo:hi], int(base)
+
+    def measure_bounds(self, tracks, meas_starts, meas_ends):
+        """Vectorized version of measures for several excerpts at once, returning row ranges of the whole table
+
+        :param tracks: Track number of each excerpt
+        :type tracks: numpy.ndarray
+        :param meas_starts: First measure of each excerpt
+        :type meas_starts: numpy.ndarray
+        :param meas_ends: Last measure of each excerpt
+        :type meas_ends: numpy.ndarray
+        :return: First row, row after the last one and starting tick of each excerpt
+        :rtype: numpy.ndarray, numpy.ndarray, numpy.ndarray
+        """
+        lo = np.zeros(len(tracks), dtype=np.int64)
+        hi = np.zeros(len(tracks), dtype=np.int64)
+        base = np.zeros(len(tracks), dtype=np.int64)
+        for track in np.unique(tracks):
+            sel = tracks == track
+            measures = self.part(track)["measure"]
+            lo[sel] = self._bounds[track] + np.searchsorted(measures, meas_starts[sel])
+            hi[sel] = self._bounds[track] + np.searchsorted(
+                measures, meas_ends[sel] + 1
+            )
+            starts = self.measure_starts[track]
+            if len(starts):
+                first = np.searchsorted(starts[:, 0], meas_starts[sel])
+                found = first < len(starts)
+                base[sel] = np.where(
+                    found, starts[np.minimum(first, len(starts) - 1), 1], 0
+                )
+        return lo, hi, base
+
+    def is_fraction(self, ticks):
+        """Tells which tick counts are represented as Fraction by quarter_length, i.e. are not exactly representable in
+        binary
+
+        :param ticks: Tick counts
+        :type ticks: numpy.ndarray
+        :return: True for the Fraction values
+        :rtype: numpy.ndarray
+        """
+        odd = self.ticks_per_quarter
+        while odd % 2 == 0:
+            odd //= 2
+        return ticks % odd != 0
+
+    def quarter_length(self, ticks):
+        """Converts ticks to quarter length, in the same representation as music21 uses for offsets and durations:
+        float if the value is exactly representable in binary, Fraction otherwise
+
+        :param ticks: Number of ticks
+        :type ticks: int
+        :return: Quarter length
+        :rtype: float or Fraction
+        """
+        value = Fraction(int(ticks), self.ticks_per_quarter)
+        if value.denominator & (value.denominator - 1) == 0:
+            return float(value)
+        return value
+
+    def measure_events(self, track, meas_start, meas_end):
+        """Returns the events of the part in the given measures
+
+        :param track: Track number
+        :type track: int
+        :param meas_start: First measure
+        :type meas_start: int
+        :param meas_end: Last measure
+        :type meas_end: int
+        :return: Events in the measures
+        :rtype: numpy.ndarray
+        """
+        lo, hi = np.searchsorted(self.events["part"], [track, track + 1])
+        measures = self.events["measure"][lo:hi]
+        first, last = np.searchsorted(measures, [meas_start, meas_end + 1])
+        return self.events[lo + first : lo + last]
+
+    def measure_marks(self, meas_start, meas_end):
+        """Returns the tempo marks, signatures and instruments of the measures from meas_start to meas_end
+
+        :param meas_start: First measure, if None the marks are kept from the start
+        :type meas_start: int
+        :param meas_end: Last measure
+        :type meas_end: int
+        :return: Structured array of each name of MEASURE_MARKS
+        :rtype: dict
+        """
+        marks = {}
+        for name, _ in MEASURE_MARKS:
+            rows = getattr(self, name)
+            keep = rows["measure"] <= meas_end
+            if meas_start is not None:
+                keep &= rows["measure"] >= meas_start
+            marks[name] = rows[keep]
+        return marks
+
+    def window(self, meas_start, meas_end):
+        """Returns the table restricted to the measures from meas_start to meas_end. The measure numbers and the ticks
+        are kept, and meas_end becomes the number of measures
+
+        :param meas_start: First measure to keep
+        :type meas_start: int
+        :param meas_end: Last measure to keep
+        :type meas_end: int
+        :return: Note table of the window
+        :rtype: NoteTable
+        """
+        notes = self.notes[
+            (self.notes["measure"] >= meas_start) & (self.notes["measure"] <= meas_end)
+        ]
+        events = self.events[
+            (self.events["measure"] >= meas_start)
+            & (self.events["measure"] <= meas_end)
+        ]
+        measures = [
+            starts[(starts[:, 0] >= meas_start) & (starts[:, 0] <= meas_end)]
+            for starts in self.measure_starts
+        ]
+        return NoteTable(
+            np.array(notes),
+            measures,
+            self.ticks_per_quarter,
+            meas_end,
+            np.array(events),
+            self.tempos,
+            programs=self.programs,
+            **self.measure_marks(meas_start, meas_end),
+        )
+
+    def truncate(self, num_measures):
+        """Returns the table restricted to the measures up to num_measures. The events are made to match those of
+        the parsed file cut with measures(0, num_measures).stripTies(): music21 does not strip the ties running past
+        the last measure, so the events still sounding at its bar end are split back into one event per measure, ending
+        at the bar ends, and the lengths of these measures grow or shrink accordingly. The notes, used for the
+        entropies, are only restricted
+
+        :param num_measures: Last measure to keep
+        :type num_measures: int
+        :return: Truncated note table
+        :rtype: NoteTable
+        """
+        notes = self.notes[self.notes["measure"] <= num_measures]
+        events = np.array(self.events[self.events["measure"] <= num_measures])
+        measures, pieces, cut = [], [], np.zeros(len(events), dtype=bool)
+        for track, starts in enumerate(self.measure_starts):
+            goes_on = (starts[:, 0] > num_measures).any()
+            starts = starts[starts[:, 0] <= num_measures].copy()
+            measures.append(starts)
+            if not goes_on or not len(starts) or starts[-1, 0] != num_measures:
+                continue
+            bar_ends = starts[:, 1] + starts[:, 3]
+            crossing = (events["part"] == track) & (events["off"] > bar_ends[-1])
+            cut |= crossing
+            for event in events[crossing]:
+                first = np.searchsorted(starts[:, 0], event["measure"])
+                for row in range(first, len(starts)):
+                    piece = event.copy()
+                    piece["measure"] = starts[row, 0]
+                    piece["on"] = max(event["on"], starts[row, 1])
+                    piece["off"] = bar_ends[row]
+                    if piece["off"] <= piece["on"]:
+                        continue
+                    pieces.append(piece)
+                    length = piece["off"] - starts[row, 1]
+                    if row == first:
+                        # the tied notes no longer reach into the next measures
+                        starts[row, 2] = min(starts[row, 2], starts[row, 3])
+                    starts[row, 2] = max(starts[row, 2], length)
+        if pieces:
+            events = np.concatenate([events[~cut], np.array(pieces, dtype=EVENT_DTYPE)])
+            # stable, so the events of a measure keep the order of part.flat
+            events = events[np.lexsort((events["measure"], events["part"]))]
+        return NoteTable(
+            np.array(notes),
+            measures,
+            self.ticks_per_quarter,
+            max(len(starts) for starts in measures),
+            events,
+            self.tempos,
+            programs=self.programs,
+            **self.measure_marks(None, num_measures),
+        )
+
+
+def extract_note_table(file):
+    """Extracts the note table of a music file
+
+    :param file: Music file
+    :type file: Music21 Stream
+    :return: Note table
+    :rtype: NoteTable
+    """
+    rows = []
+    event_rows = []
+    mark_rows = {name: [] for name, _ in MEASURE_MARKS}
+    measures = []
+    programs = []
+    for i, part in enumerate(file.parts):
+        measures.append(
+            [
+                (
+                    m.number,
+                    Fraction(m.offset),
+                    Fraction(m.duration.quarterLength),
+                    Fraction(m.barDuration.quarterLength),
+                )
+                for m in part.getElementsByClass("Measure")
+            ]
+        )
+        for m in part.getElementsByClass("Measure"):
+            for el in m.recurse().getElementsByClass(
+                ["MetronomeMark", "TimeSignature", "KeySignature", "Instrument"]
+            ):
+                offset = Fraction(m.offset) + Fraction(el.getOffsetInHierarchy(m))
+                key = (i, m.number, offset)
+                if "MetronomeMark" in el.classes:
+                    if el.number is not None:
+                        mark_rows["measure_tempos"].append((*key, el.getQuarterBPM()))
+                elif "TimeSignature" in el.classes:
+                    mark_rows["time_signatures"].append(
+                        (*key, el.numerator, el.denominator)
+                    )
+                elif "KeySignature" in el.classes:
+                    minor = "Key" in el.classes and el.mode == "minor"
+                    mark_rows["key_signatures"].append((*key, el.sharps, minor))
+                else:
+                    mark_rows["instruments"].append(
+                        (
+                            *key,
+                            -1 if el.midiProgram is None else el.midiProgram,
+                            -1 if el.midiChannel is None else el.midiChannel,
+                            el.bestName() or "",
+                        )
+                    )
+        instruments = part.recurse().getElementsByClass("Instrument")
+        programs.append(
+            next((x.midiProgram for x in instruments if x.midiProgram is not None), -1)
+        )
+        for n in part.flat.getElementsByClass(["Note", "Chord"]):
+            rows.append(
+                (
+                    i,
+                    n.measureNumber,
+                    Fraction(n.offset),
+                    Fraction(n.duration.quarterLength),
+                    n.pitches[-1].ps,
+                    n.isChord,
+                )
+            )
+            for note in n.notes if n.isChord else [n]:
+                velocity = note.volume.velocity
+                if velocity is None:
+                    velocity = n.volume.velocity
+                event_rows.append(
+                    (
+                        i,
+                        n.measureNumber,
+                        Fraction(n.offset),
+                        Fraction(n.offset) + Fraction(n.duration.quarterLength),
+                        note.pitch.midi,
+                        -1 if velocity is None else velocity,
+                    )
+                )
+    tempos = sorted(
+        {
+            (Fraction(mark.offset), mark.getQuarterBPM())
+            for mark in file.flat.getElementsByClass("MetronomeMark")
+        }
+    )
+    ticks_per_quarter = 1
+    for row in rows:
+        for value in row[2:4]:
+            ticks_per_quarter = math.lcm(ticks_per_quarter, value.denominator)
+    for row in event_rows:
+        for value in row[2:4]:
+            ticks_per_quarter = math.lcm(ticks_per_quarter, value.denominator)
+    for starts in measures:
+        for _, *values in starts:
+            for value in values:
+                ticks_per_quarter = math.lcm(ticks_per_quarter, value.denominator)
+    for offset, _ in tempos:
+        ticks_per_quarter = math.lcm(ticks_per_quarter, offset.denominator)
+    for mark in mark_rows.values():
+        for row in mark:
+            ticks_per_quarter = math.lcm(ticks_per_quarter, row[2].denominator)
+
+    notes = np.array(
+        [
+            (
+                part,
+                measure,
+                int(offset * ticks_per_quarter),
+                int(duration * ticks_per_quarter),
+                ps,
+                chord,
+            )
+            for part, measure, offset, duration, ps, chord in rows
+        ],
+        dtype=NOTE_DTYPE,
+    )
+    events = np.array(
+        [
+            (
+                part,
+                measure,
+                int(on * ticks_per_quarter),
+                int(off * ticks_per_quarter),
+                pitch,
+                velocity,
+            )
+            for part, measure, on, off, pitch, velocity in event_rows
+        ],
+        dtype=EVENT_DTYPE,
+    )
+    # stable, so the events of a measure keep the order of part.flat
+    events = events[np.lexsort((events["measure"], events["part"]))]
+    marks = {
+        name: np.array(
+            [
+                (part, measure, int(offset * ticks_per_quarter), *values)
+                for part, measure, offset, *values in mark_rows[name]
+            ],
+            dtype=dtype,
+        )
+        for name, dtype in MEASURE_MARKS
+    }
+    measures = [
+        np.array(
+            [
+                (number, *(int(value * ticks_per_quarter) for value in values))
+                for number, *values in starts
+            ],
+            dtype=np.int64,
+        ).reshape(-1, 4)
+        for starts in measures
+    ]
+    tempos = [(int(offset * ticks_per_quarter), qpm) for offset, qpm in tempos]
+    return NoteTable(
+        notes,
+        measures,
+        ticks_per_quarter,
+        max_num_measures(file),
+        events,
+        tempos,
+        programs=programs,
+        **marks,
+    )
+
+
+def get_note_table_paths(midi_path):
+    """Returns the paths of the note table snapshot of a midi file, which is stored next to it
+
+    :param midi_path: Path to the midi file
+    :type midi_path: string
+    :return: Paths to the notes array, to the header and to the events array
+    :rtype: tuple(string, string, string)
+    """
+    root = os.path.splitext(midi_path)[0]
+    return f"{root}.notes.npy", f"{root}.notes.json", f"{root}.events.npy"
+
+
+def store_note_table(midi_path, table):
+    """Stores the note table snapshot of a midi file
+
+    :param midi_path: Path to the midi file
+    :type midi_path: string
+    :param table: Note table
+    :type table: NoteTable
+    """
+    notes_p, header_p, events_p = get_note_table_paths(midi_path)
+    np.save(notes_p, table.notes)
+    np.save(events_p, table.events)
+    stat = os.stat(midi_path)
+    header = {
+        "version": NOTE_TABLE_VERSION,
+        "midi_size": stat.st_size,
+        "midi_mtime_ns": stat.st_mtime_ns,
+        "ticks_per_quarter": table.ticks_per_quarter,
+        "num_measures": table.num_measures,
+        "measures": [starts.tolist() for starts in table.measure_starts],
+        "tempos": table.tempos,
+        "programs": table.programs,
+    }
+    for name, _ in MEASURE_MARKS:
+        header[name] = getattr(table, name).tolist()
+    with open(header_p, "w") as handle:
+        json.dump(header, handle)
+
+
+def load_note_table(midi_path):
+    """Loads the note table snapshot of a midi file, with the notes memory-mapped. Returns None if there is no snapshot
+    or if it is outdated
+
+    :param midi_path: Path to the midi file
+    :type midi_path: string
+    :return: Note table
+    :rtype: NoteTable
+    """
+    notes_p, header_p, events_p = get_note_table_paths(midi_path)
+    if not all(os.path.isfile(path) for path in (notes_p, header_p, events_p)):
+        return None
+    with open(header_p) as handle:
+        header = json.load(handle)
+    stat = os.stat(midi_path)
+    if (
+        header.get("version") != NOTE_TABLE_VERSION
+        or header["midi_size"] != stat.st_size
+        or header["midi_mtime_ns"] != stat.st_mtime_ns
+    ):
+        return None
+    measures = [
+        np.array(starts, dtype=np.int64).reshape(-1, 4)
+        for starts in header["measures"]
+    ]
+    marks = {
+        name: np.array([tuple(row) for row in header[name]], dtype=dtype)
+        for name, dtype in MEASURE_MARKS
+    }
+    return NoteTable(
+        np.load(notes_p, mmap_mode="r"),
+        measures,
+        header["ticks_per_quarter"],
+        header["num_measures"],
+        np.load(events_p, mmap_mode="r"),
+        header["tempos"],
+        programs=header["programs"],
+        **marks,
+    )
+
+
+def get_note_table(midi_path):
+    """If the note table snapshot of the midi file exists, it loads it. Otherwise, it parses the file, extracts the
+    table and saves it.
+
+    :param midi_path: Path to the midi file
+    :type midi_path: string
+    :return: Note table
+    :rtype: NoteTable
+    """
+    table = load_note_table(midi_path)
+    if table is None:
+        table = extract_note_table(converter.parse(midi_path).stripTies())
+        store_note_table(midi_path, table)
+    return table
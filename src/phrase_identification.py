@@ -1,121 +1,24 @@
-import math
 import pickle
 from collections import defaultdict
+from fractions import Fraction
 
-from music21 import *
+import numpy as np
 
-from toolbox import max_num_measures
+# version of the phrase identification, part of the name of the cached phrase lists, raised whenever the phrases change
+PHRASE_VERSION = 2
 
 
-def get_pitch_int(file):
-    """Calculates and returns the pitch intervals
-
-    :param file: File to process
-    :type file: music21 Stream
-    :return: A dictionary containing pitch intervals for each part
-    :rtype: defaultdict
-    """
-    pitch_int = {i: [] for i in range(len(file.parts))}
-    for i, part in enumerate(file.parts):
-        pitches = [
-            m.pitches[-1] for m in part.flat.getElementsByClass(["Note", "Chord"])
-        ]
-        for p1, p2 in zip(pitches, pitches[1:]):
-            intvl = interval.Interval(p1, p2)
-            pitch_int[i].append(abs(intvl.chromatic.semitones) + 1)
-    return pitch_int
-
-
-def get_ioi(file):
-    """Calculates and returns the inter offset intervals
-
-    :param file: File to process
-    :type file: music21 Stream
-    :return: A dictionary containing inter offset intervals for each part
-    :rtype: defaultdict
-    """
-    ioi = {i: [] for i in range(len(file.parts))}
-    for i, part in enumerate(file.parts):
-        notes = part.flat.getElementsByClass(["Note", "Chord"])
-        for n1, n2 in zip(notes, notes[1:]):
-            ioi[i].append(n2.offset - n1.offset)
-    return ioi
-
-
-def get_rests(file):
-    """Calculates and returns the rest intervals
-
-    :param file: File to process
-    :type file: music21 Stream
-    :return: A dictionary containing rest intervals for each part
-    :rtype: defaultdict
-    """
-    rests = {i: [] for i in range(len(file.parts))}
-    for i, part in enumerate(file.parts):
-        notes = part.flat.getElementsByClass(["Note", "Chord"])
-        for n1, n2 in zip(notes, notes[1:]):
-            rests[i].append(
-                max(0, n2.offset - n1.offset + n1.duration.quarterLength) + 1
-            )
-    return rests
-
-
-# TODO check the list is initalized with 0
-def get_doc(intervals):
-    """Calculates and returns the degree of change given intervals
-
-    :param intervals: Dictionary containing intervals for each part
-    :type intervals: defaultdict
-    :return: A dictionary containing degree of change information for each part
-    :rtype: defaultdict
-    """
-    no_parts = len(intervals)
-    rdict = defaultdict(lambda: [0])
-    for i in range(no_parts):
-        rdict[i] += [
-            abs(int2 - int1) / (int1 + int2)
-            for int1, int2 in zip(intervals[i], intervals[i][1:])
-        ]
-    return rdict
-
-
-def get_strength(intervals, doc):
-    """Calculates boundary strength given the intervals and degree of change
-
-    :param intervals: Dictionary containing intervals for each part
-    :type intervals: defaultdict
-    :param doc: Degree of change information for each part
-    :type doc: defaultdict
-    :return: Dictionary containing boundary strengths for each part
-    :rtype: defaultdict
-    """
-    no_parts = len(intervals)
-    sdict = defaultdict(list)
-    for i in range(no_parts):
-        slist = [
-            intervals[i][j + 1] * (doc[i][j] + doc[i][j + 1])
-            for j in range(len(intervals[i]) - 1)
-        ]
-        s = sum(slist)
-        if s != 0:
-            slist = [r / s for r in slist]
-        sdict[i] = slist
-    return sdict
-
-
-def get_measures(file):
+def get_measures(notes):
     """Gives information about which pitch belongs to which measure
 
-    :param file: File to process
-    :type file: music21 Stream
+    :param notes: Note table of the file to process
+    :type notes: NoteTable
     :return: A dictionary of lists where each list is the list of measures corresponding to the pitches in each part
     :rtype: defaultdict
     """
-    no_parts = len(file.parts)
     measures = defaultdict(list)
-    for i in range(no_parts):
-        for n in file.parts[i].flat.getElementsByClass(["Note", "Chord"]):
-            measures[i].append(n.measureNumber)
+    for i in range(notes.num_parts):
+        measures[i] = notes.part(i)["measure"].tolist()
     return measures
 
 
@@ -137,46 +40,6 @@ def find_peaks_t(bs, threshold):
     ]
 
 
-def find_peaks(file, bs, measures, longest_phrase):
-    """Finds the peaks in in array, based on the condition that the longest phrase should not exceed a limit. If no solution is found, then the limit in increased. To guide the process, a threshold value is used, which is decreased at each iteration.
-
-    :param file: File to process
-    :type file: music21 Stream
-    :param bs: The list to analyze consisting of boundary strength for each pitch
-    :type bs: list
-    :param measures: The list of measures corresponding to each pitch
-    :type measures: list
-    :param longest_phrase: The upper bound on the longest phrase length
-    :type longest_phrase: int
-    :return: A list of measures indicating phrase beginning and endings
-    :rtype: list
-    """
-    if len(bs) != 0:
-        min_bs = min(x for x in bs if x != 0)
-        threshold = max(bs)
-        flag = True
-        while flag:
-            flag = False
-            plist = find_peaks_t(bs, threshold)
-            if not plist:
-                threshold -= 2 * min_bs
-                flag = True
-                continue
-            phrase_start_end = find_peak_measures(file, measures, plist)
-            for pair in phrase_start_end:
-                if pair[1] - pair[0] + 1 > longest_phrase:
-                    flag = True
-                    threshold -= 2 * min_bs
-                    if threshold < 0:
-                        threshold = max(bs)
-                        longest_phrase += 1
-                        # print("is this happening?")
-                    break
-        return phrase_start_end
-    else:
-        return []
-
-
 def is_longest_satified(phrase_start_end, longest_phrase):
     """Check if longest phrase condition is satisfied
 
@@ -193,11 +56,16 @@ def is_longest_satified(phrase_start_end, longest_phrase):
     return True
 
 
-def find_peaks_v2(file, bs, measures, longest_phrase):
-    """Finds the peaks in in array, based on the condition that the longest phrase should not exceed a limit. If no solution is found, then the limit in increased. To guide the process, a threshold value is used, which is decreased at each iteration.
+def find_peaks_v2(notes, bs, measures, longest_phrase):
+    """Finds the peaks in in array, based on the condition that the longest phrase should not exceed a limit. If no solution is found, then the limit in increased. To guide the process, a threshold value is used, which is chosen as large as possible.
+
+    The peaks above a threshold are the local maxima whose strength is not smaller than it, so only the strengths of the
+    local maxima need to be tried as thresholds. They are computed once and sorted, and the largest one that satisfies
+    the longest phrase condition is found by bisection. If even all local maxima violate the condition, the limit is
+    raised to the longest phrase obtained with all of them
 
-    :param file: File to process
-    :type file: music21 Stream
+    :param notes: Note table of the file to process
+    :type notes: NoteTable
     :param bs: The list to analyze consisting of boundary strength for each pitch
     :type bs: list
     :param measures: The list of measures corresponding to each pitch
@@ -207,63 +75,69 @@ def find_peaks_v2(file, bs, measures, longest_phrase):
     :return: A list of measures indicating phrase beginning and endings
     :rtype: list
     """
-    if len(bs) != 0:
-        min_bs = min(x for x in bs if x != 0)
-        max_bs = max(bs)
-        threshold = (min_bs + max_bs) / 2
-        flag = True
-        found_threshold = None
-        while flag:
-            plist = find_peaks_t(bs, threshold)
-            if not plist:
-                flag = True
-                max_bs = threshold
-                threshold = (min_bs + max_bs) / 2
-                if math.isclose(min_bs, max_bs):
-                    phrase_start_end = find_peak_measures(file, measures, plist)
-                    flag = False
-                continue
-            phrase_start_end = find_peak_measures(file, measures, plist)
-            if not is_longest_satified(
-                phrase_start_end, longest_phrase
-            ):  # if longest phrasee condition is not satisfied
-                flag = True
-                max_bs = threshold
-                threshold = (min_bs + max_bs) / 2  # decrease the threshold
-                if threshold - min_bs < 0.00001:  # stopping condition
-                    if (
-                        found_threshold != None
-                    ):  # if there was a found threshold and we were looking for better
-                        plist = find_peaks_t(bs, found_threshold)
-                        phrase_start_end = find_peak_measures(file, measures, plist)
-                        return phrase_start_end
-                    else:
-                        max_bs = max(
-                            bs
-                        )  # reset to the initial conditions, increase longest allowed phrase
-                        min_bs = min(x for x in bs if x != 0)
-                        threshold = (min_bs + max_bs) / 2
-                        longest_phrase += 1
-            else:  # if longest phrasee condition is satisfied
-                found_threshold = threshold
-                min_bs = threshold
-                threshold = (min_bs + max_bs) / 2  # increase the threshold
-                if max_bs - threshold < 0.00001:  # stopping condition
-                    flag = False
-        return phrase_start_end
-    else:
+    if len(bs) == 0:
         return []
+    next_non_empty = get_next_non_empty(measures, notes.num_measures)
+    strengths = np.asarray(bs)
+    candidates = (
+        np.flatnonzero(
+            (strengths[1:-1] > strengths[2:]) & (strengths[:-2] < strengths[1:-1])
+        )
+        + 1
+    )
+    if len(candidates) == 0:
+        return find_peak_measures(notes, measures, [], next_non_empty)
+    thresholds = np.unique(strengths[candidates])[::-1]
+
+    def phrases_above(k):
+        # phrases obtained with the k+1 largest thresholds
+        plist = candidates[strengths[candidates] >= thresholds[k]].tolist()
+        return find_peak_measures(notes, measures, plist, next_non_empty)
+
+    longest_phrase = max(
+        longest_phrase,
+        max(pair[1] - pair[0] + 1 for pair in phrases_above(len(thresholds) - 1)),
+    )
+    # bisection on the index of the threshold, at most log2(number of thresholds) steps
+    lo, hi = 0, len(thresholds) - 1
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if is_longest_satified(phrases_above(mid), longest_phrase):
+            hi = mid
+        else:
+            lo = mid + 1
+    return phrases_above(lo)
+
 
+def get_next_non_empty(measures, num_measures):
+    """Precomputes find_next_non_empty for every measure number
 
-def find_peak_measures(file, measures, plist):
+    :param measures: The sorted list of measures corresponding to each pitch
+    :type measures: list
+    :param num_measures: Number of measures
+    :type num_measures: int
+    :return: Table whose entry m is the first measure not smaller than m, or -1 if there is none
+    :rtype: numpy.ndarray
+    """
+    measures = np.asarray(measures)
+    numbers = np.arange(max(measures[-1], num_measures) + 2)
+    index = np.searchsorted(measures, numbers)
+    return np.where(
+        index < len(measures), measures[np.minimum(index, len(measures) - 1)], -1
+    )
+
+
+def find_peak_measures(notes, measures, plist, next_non_empty=None):
     """Given a list of pitches that correspond to peaks, it returns the corresponding measures. If same measure is selected more than once, then it is taken only once
 
-    :param file: File to process
-    :type file: music21 Stream
+    :param notes: Note table of the file to process
+    :type notes: NoteTable
     :param measures: The list of measures corresponding to each pitch
     :type measures:list
     :param plist: The list of indices that correspond to the peaks
     :type plist: list
+    :param next_non_empty: Table given by get_next_non_empty, computed if not given
+    :type next_non_empty: numpy.ndarray
     :return: The list of measures corresponding to the peaks
     :rtype: list
     """
@@ -283,60 +157,142 @@ def find_peak_measures(file, measures, plist):
         measure_list = sorted(list(set(meas_list)))
         phrase_start_end = [[measures[0], measure_list[0]]]
 
+        if next_non_empty is None:
+            next_non_empty = get_next_non_empty(measures, notes.num_measures)
         for i in range(len(measure_list) - 1):
-            x = find_next_non_empty(measures, measure_list[i] + 1)
+            x = int(next_non_empty[measure_list[i] + 1])
             phrase_start_end.append([x, measure_list[i + 1]])
-        if measure_list[-1] != max_num_measures(file):
-            x = find_next_non_empty(measures, measure_list[-1] + 1)
+        x = int(next_non_empty[measure_list[-1] + 1])
+        if measure_list[-1] != notes.num_measures and x != -1:
             phrase_start_end.append([x, measures[-1]])
     return phrase_start_end
 
 
-def find_next_non_empty(measures, meas_num):
-    for measure in measures:
-        if measure >= meas_num:
-            return measure
+def get_quarter_lengths(ticks, ticks_per_quarter):
+    """Converts ticks to the quarter lengths of music21 (see NoteTable.quarter_length). Without any tick outside the
+    binary fractions of a quarter they are exact floats; otherwise an object array of floats and Fractions is returned,
+    so that array operations on it follow the Python arithmetic of the list pipeline
+
+    :param ticks: Tick counts
+    :type ticks: numpy.ndarray
+    :param ticks_per_quarter: Number of ticks in a quarter length
+    :type ticks_per_quarter: int
+    :return: Quarter lengths
+    :rtype: numpy.ndarray
+    """
+    odd = ticks_per_quarter
+    while odd % 2 == 0:
+        odd //= 2
+    mask = ticks % odd != 0
+    if not mask.any():
+        return ticks / ticks_per_quarter
+    quarter_lengths = (ticks / ticks_per_quarter).astype(object)
+    quarter_lengths[mask] = [Fraction(int(t), ticks_per_quarter) for t in ticks[mask]]
+    return quarter_lengths
+
+
+def get_doc_array(intervals):
+    """Vectorized version of get_doc for the intervals of a single part
+
+    :param intervals: Intervals of the part, floats or objects
+    :type intervals: numpy.ndarray
+    :return: Degree of change
+    :rtype: numpy.ndarray
+    """
+    doc = np.empty(len(intervals), dtype=intervals.dtype)
+    if len(intervals) == 0:
+        return doc
+    # the exact 0 of the list pipeline, which keeps the sums with Fractions exact
+    doc[0] = 0
+    with np.errstate(divide="raise", invalid="raise"):
+        doc[1:] = np.abs(intervals[1:] - intervals[:-1]) / (
+            intervals[:-1] + intervals[1:]
+        )
+    return doc
 
 
-def calculate_lbsp(file, ldict):
-    """Given a file and a dictionary containing the weights, returns the lbsp
+def get_strength_array(intervals, doc):
+    """Vectorized version of get_strength for the intervals of a single part
 
-    :param file: File to process
-    :type file: music21 Stream
+    :param intervals: Intervals of the part, floats or objects
+    :type intervals: numpy.ndarray
+    :param doc: Degree of change
+    :type doc: numpy.ndarray
+    :return: Boundary strengths
+    :rtype: numpy.ndarray
+    """
+    if len(intervals) < 2:
+        return np.zeros(0)
+    slist = intervals[1:] * (doc[:-1] + doc[1:])
+    # cumulative sum adds up the strengths one by one, like the built-in sum
+    s = np.cumsum(slist)[-1]
+    if s != 0:
+        slist = slist / s
+    return slist
+
+
+def get_lbsp_array(pitches, offsets, durations, ticks_per_quarter, ldict):
+    """Vectorized LBDM engine for a single part. Computes the pitch, inter onset and rest intervals, their degree of
+    change, strengths and the weighted lbsp with array operations. The intervals are taken on the quarter lengths of
+    music21: floats for binary fractions of a quarter, and Fractions otherwise, whose degrees of change and strengths
+    stay exact until they meet a float. The operations are those of the list pipeline, so the lbsp is identical to it
+    bit for bit
+
+    :param pitches: Pitch numbers (ps) of the notes
+    :type pitches: numpy.ndarray
+    :param offsets: Offsets of the notes in ticks
+    :type offsets: numpy.ndarray
+    :param durations: Durations of the notes in ticks
+    :type durations: numpy.ndarray
+    :param ticks_per_quarter: Number of ticks in a quarter length
+    :type ticks_per_quarter: int
     :param ldict: Dictionary containing weights for pitch, ioi and rests
     :type ldict: dict
-    :return: lbsp for each part
-    :rtype: defaultdict
+    :return: lbsp of the part
+    :rtype: numpy.ndarray
     """
-    pitch_int = get_pitch_int(file)
-    rpitch = get_doc(pitch_int)
-    spitch = get_strength(pitch_int, rpitch)
-
-    ioi = get_ioi(file)
-    rioi = get_doc(ioi)
-    sioi = get_strength(ioi, rioi)
+    pitch_int = np.abs(np.diff(np.asarray(pitches, dtype=np.float64))) + 1
+    offsets = get_quarter_lengths(np.asarray(offsets, dtype=np.int64), ticks_per_quarter)
+    durations = get_quarter_lengths(
+        np.asarray(durations, dtype=np.int64), ticks_per_quarter
+    )
+    ioi = offsets[1:] - offsets[:-1]
+    rests = ioi + durations[:-1]
+    # max(0, x) of the list pipeline gives the exact 0 for non-positive x
+    rests[~(rests > 0)] = 0
+    rests = rests + 1
 
-    rests = get_rests(file)
-    rrests = get_doc(rests)
-    srests = get_strength(rests, rrests)
+    spitch = get_strength_array(pitch_int, get_doc_array(pitch_int))
+    sioi = get_strength_array(ioi, get_doc_array(ioi))
+    srests = get_strength_array(rests, get_doc_array(rests))
+    lbsp = ldict["p"] * spitch + ldict["i"] * sioi + ldict["r"] * srests
+    return lbsp.astype(np.float64)
 
-    no_parts = len(file.parts)
-    lbsp = defaultdict(list)
 
-    for i in range(no_parts):
-        lbsp[i] = [
-            ldict["p"] * pitch + ldict["i"] * ioi + ldict["r"] * rest
-            for pitch, ioi, rest in zip(spitch[i], sioi[i], srests[i])
-        ]
+def calculate_lbsp(notes, ldict):
+    """Given a note table and a dictionary containing the weights, returns the lbsp computed with get_lbsp_array
 
+    :param notes: Note table of the file to process
+    :type notes: NoteTable
+    :param ldict: Dictionary containing weights for pitch, ioi and rests
+    :type ldict: dict
+    :return: lbsp for each part
+    :rtype: defaultdict
+    """
+    lbsp = defaultdict(list)
+    for i in range(notes.num_parts):
+        part = notes.part(i)
+        lbsp[i] = get_lbsp_array(
+            part["ps"], part["offset"], part["duration"], notes.ticks_per_quarter, ldict
+        ).tolist()
     return lbsp
 
 
-def get_phrase_list(file, longest_phrase, ldict):
+def get_phrase_list(notes, longest_phrase, ldict):
     """Given the upper bound for the longest phrase and the weights, returns the measures corresponding to the beginning and ending of the phrases
 
-    :param file: File to process
-    :type file: music21 Stream
+    :param notes: Note table of the file to process
+    :type notes: NoteTable
     :param longest_phrase: Upper bound on the longest phrase
     :type longest_phrase: int
     :param ldict: Dictionary containing weights for pitch, ioi and rests
@@ -345,10 +301,10 @@ def get_phrase_list(file, longest_phrase, ldict):
     :rtype: defaultdict
     """
     phrase_measures = defaultdict(list)
-    measures = get_measures(file)
-    lbsp = calculate_lbsp(file, ldict)
-    for i in range(len(file.parts)):
-        phrase_measures[i] = find_peaks_v2(file, lbsp[i], measures[i], longest_phrase)
+    measures = get_measures(notes)
+    lbsp = calculate_lbsp(notes, ldict)
+    for i in range(notes.num_parts):
+        phrase_measures[i] = find_peaks_v2(notes, lbsp[i], measures[i], longest_phrase)
     return phrase_measures
 
 
@@ -394,12 +350,12 @@ def modify_phrase_list(phrase_measures, file):
 
 
 def generate_phrase_list(
-    file, phrase_path, longest_phrase=4, weights={"p": 0.25, "i": 0.5, "r": 0.25}
+    notes, phrase_path, longest_phrase=4, weights={"p": 0.25, "i": 0.5, "r": 0.25}
 ):
-    """Generate the phrase list given the file
+    """Generate the phrase list given the note table of the file
 
-    :param file: Music file
-    :type file: Music21 Stream
+    :param notes: Note table of the music file
+    :type notes: NoteTable
     :param phrase_path: Path to save the phrases
     :type phrase_path: string
     :param longest_phrase: Longest phrase length in terms of measures
@@ -410,7 +366,7 @@ def generate_phrase_list(
     :rtype: dictionary
     """
 
-    phrase_list = get_phrase_list(file, longest_phrase, weights)
+    phrase_list = get_phrase_list(notes, longest_phrase, weights)
     filehandler = open(phrase_path, "wb")
     pickle.dump(phrase_list, filehandler)
 
@@ -1,9 +1,39 @@
+import heapq
 import logging
+import re
+from fractions import Fraction
 
+import dimod
+import numpy as np
 from music21 import stream
 
 from jobs import JobCollector
-from qubo import running_jobs
+from midi_writer import (
+    DEFAULT_VELOCITY,
+    MUSIC21_DIVISION,
+    assign_channels,
+    key_signature_message,
+    tempo_message,
+    time_signature_message,
+    track_name_message,
+    write_midi_file,
+)
+from note_table import MEASURE_MARKS
+from utils import check_job_variables
+from qubo import encode_slack, get_running_jobs
+
+RESULT_CHUNK_SIZE = 4096
+
+# tempo of the midi files of music21 without tempo marks
+DEFAULT_TEMPO = 120.0
+
+# name, whether only feasible samples are ranked, and the statistics compared before the energy and the position
+RESULT_RANKINGS = (
+    ("entropy", True, ("entropy",)),
+    ("nonviolating", True, ("M_violate", "entropy")),
+    ("violations", False, ("M_violate", "entropy")),
+    ("all_entropy", False, ("entropy",)),
+)
 
 
 def sample_to_jobs(sample, job_list):
@@ -90,7 +120,134 @@ def machines_to_stream(machine_dict, file):
     return new_arrange
 
 
-def countM(sample, M, max_time, job_list):
+def machines_to_midi(machine_dict, notes, results_p):
+    """Writes the midi file of the arrangement from the note table, without building a music21 stream. The file is the
+    one music21 writes for the stream of the arrangement, see machines_to_stream, where the measures of the jobs of each machine are placed one
+    after the other in a part of their own, each one taking its length in the note table. As in music21, the first track
+    holds the tempo marks and the signatures, a mark being kept only if it comes after the last one of its kind found
+    going through the machines in order, with DEFAULT_TEMPO and a 4/4 time signature if none is placed. Each machine
+    then has its track, named after its first instrument, with the instruments of its measures and its notes, on the
+    channel music21 gives to the program of its first instrument
+
+    :param machine_dict: Dictionary containing machine job assignment
+    :type machine_dict: dictionary
+    :param notes: Note table of the music file
+    :type notes: NoteTable
+    :param results_p: Path to store the results
+    :type results_p: string
+    """
+    scale = Fraction(MUSIC21_DIVISION, notes.ticks_per_quarter)
+
+    def midi_tick(tick):
+        return int(round(tick * scale))
+
+    marks = {}
+    for name, _ in MEASURE_MARKS:
+        for row in getattr(notes, name):
+            key = (name, int(row["part"]), int(row["measure"]))
+            marks.setdefault(key, []).append(row)
+    # part, number and shift of the ticks of each placed measure of each machine
+    placed = []
+    for jobs in machine_dict.values():
+        position, measures = 0, []
+        for job in jobs:
+            starts = notes.measure_starts[job.track]
+            for number in range(job.start + 1, job.end + 1):
+                row = np.searchsorted(starts[:, 0], number)
+                if row == len(starts) or starts[row, 0] != number:
+                    continue
+                measures.append((job.track, number, position - int(starts[row, 1])))
+                position += int(starts[row, 2])
+        placed.append(measures)
+
+    def placed_marks(name, measures):
+        return [
+            (int(row["tick"]) + shift, row)
+            for track, number, shift in measures
+            for row in marks.get((name, track, number), [])
+        ]
+
+    conductor = []
+    # in the order of the marks at the same offset in music21
+    for order, (name, message, default) in enumerate(
+        [
+            (
+                "measure_tempos",
+                lambda row: tempo_message(float(row["qpm"])),
+                tempo_message(DEFAULT_TEMPO),
+            ),
+            (
+                "key_signatures",
+                lambda row: key_signature_message(int(row["sharps"]), row["minor"]),
+                None,
+            ),
+            (
+                "time_signatures",
+                lambda row: time_signature_message(
+                    int(row["numerator"]), int(row["denominator"])
+                ),
+                time_signature_message(4, 4),
+            ),
+        ]
+    ):
+        last, kept = -1, len(conductor)
+        for measures in placed:
+            for tick, row in placed_marks(name, measures):
+                if tick > last:
+                    conductor.append((midi_tick(tick), order, message(row)))
+                last = tick
+        if default is not None and len(conductor) == kept:
+            conductor.append((0, order, default))
+    conductor.sort(key=lambda event: event[:2])
+
+    instruments = [placed_marks("instruments", measures) for measures in placed]
+    first = [rows[0][1] if rows and rows[0][0] == 0 else None for rows in instruments]
+    channels = assign_channels(
+        [
+            [(int(row["program"]), int(row["channel"])) for _, row in rows]
+            for rows in instruments
+        ],
+        [-1 if row is None else int(row["program"]) for row in first],
+    )
+
+    def machine_track(measures, rows, first, channel):
+        yield 0, track_name_message("" if first is None else first["name"])
+        if first is not None and first["program"] >= 0:
+            yield 0, bytes([0xC0 | channel, int(first["program"])])
+        # music21 sorts the events by midi tick, the note offs first and then the pitch bend, keeping the order of the
+        # flattened part otherwise, where the instruments come before the notes at the same offset. The packets are
+        # (midi tick, rank, offset, instrument or note, position, message)
+        packets = []
+        for tick, row in rows:
+            program = max(int(row["program"]), 0)
+            message = bytes([0xC0 | channel, program])
+            packets.append((midi_tick(tick), 0, tick, 0, len(packets), message))
+        for track, number, shift in measures:
+            for event in notes.measure_events(track, number, number):
+                on = int(event["on"]) + shift
+                start = midi_tick(on)
+                end = start + midi_tick(int(event["off"]) - int(event["on"]))
+                pitch, velocity = int(event["pitch"]), int(event["velocity"])
+                if velocity < 0:
+                    velocity = DEFAULT_VELOCITY
+                position = (on, 1, len(packets))
+                message = bytes([0x90 | channel, pitch, velocity])
+                packets.append((start, 0, *position, message))
+                message = bytes([0x80 | channel, pitch, 0])
+                packets.append((end, -20, *position, message))
+        if packets:
+            packets.append((0, -10, 0, 0, 0, bytes([0xE0 | channel, 0, 64])))
+        packets.sort(key=lambda packet: packet[:5])
+        for packet in packets:
+            yield packet[0], packet[5]
+
+    tracks = [((tick, message) for tick, _, message in conductor)]
+    for measures, rows, row, channel in zip(placed, instruments, first, channels):
+        tracks.append(machine_track(measures, rows, row, channel))
+    write_midi_file(f"{results_p}.mid", tracks)
+
+
+def countM(sample, M, max_time, job_list, run_jobs_dict=None):
     """Counts the number of time points for which there are not M jobs assigned
 
     :param sample: Dictionary of samples
@@ -99,12 +256,16 @@ def countM(sample, M, max_time, job_list):
     :type max_time: int
     :param job_list: list of jobs
     :type job_list: list
+    :param run_jobs_dict: jobs running at each time point, computed with get_running_jobs if not given
+    :type run_jobs_dict: dict
     :return: number of time points that violate the rule
     :rtype: int
     """
+    if run_jobs_dict is None:
+        run_jobs_dict = get_running_jobs(job_list, max_time)
     x = 0
     for j in range(1, max_time + 1):
-        run_jobs = running_jobs(job_list, j)
+        run_jobs = run_jobs_dict[j]
         if len(run_jobs) < 1:
             continue
         if M != sum(sample[f"x_{i}"] for i in run_jobs):
@@ -112,7 +273,7 @@ def countM(sample, M, max_time, job_list):
     return x
 
 
-def countM_hard(sample, M, max_time, job_list):
+def countM_hard(sample, M, max_time, job_list, run_jobs_dict=None):
     """Counts the number of time points for which there are not M jobs assigned
 
     :param sample: Dictionary of samples
@@ -121,19 +282,23 @@ def countM_hard(sample, M, max_time, job_list):
     :type max_time: int
     :param job_list: list of jobs
     :type job_list: list
+    :param run_jobs_dict: jobs running at each time point, computed with get_running_jobs if not given
+    :type run_jobs_dict: dict
     :return: number of time points that violate the rule
     :rtype: int
     """
+    if run_jobs_dict is None:
+        run_jobs_dict = get_running_jobs(job_list, max_time)
     x = 0
     for j in range(1, max_time + 1):
-        run_jobs = running_jobs(job_list, j)
+        run_jobs = run_jobs_dict[j]
         if len(run_jobs) < 1:
             continue
         if M < sum(sample[f"x_{i}"] for i in run_jobs):
             x += 1
     return x
 
-def is_sample_feasible(sample, M, max_time, job_list):
+def is_sample_feasible(sample, M, max_time, job_list, run_jobs_dict=None):
     """Checks whether a given sample satisfies no more than M track at each time point constraint
 
     :param sample: sample to process
@@ -144,12 +309,16 @@ def is_sample_feasible(sample, M, max_time, job_list):
     :type max_time: int
     :param job_list: list of jobs
     :type job_list: list
+    :param run_jobs_dict: jobs running at each time point, computed with get_running_jobs if not given
+    :type run_jobs_dict: dict
     :return: Feasibility of the sample
     :rtype: boolean
     """
 
+    if run_jobs_dict is None:
+        run_jobs_dict = get_running_jobs(job_list, max_time)
     for j in range(1, max_time + 1):
-        run_jobs = running_jobs(job_list, j)
+        run_jobs = run_jobs_dict[j]
         if len(run_jobs) < 1:
             continue
         if sum(sample[f"x_{i}"] for i in run_jobs) > M:
@@ -194,10 +363,196 @@ def get_best_nonviolating_result(results):
     return next((l for l in sresults if l["feasible"]), None)
 
 
+def get_incidence_matrix(job_list, max_time):
+    """Returns the job/time incidence matrix, whose entry (i, t - 1) is 1 if the i-th job of the job list is running at time t
+
+    :param job_list: list of jobs
+    :type job_list: list
+    :param max_time: maximum time
+    :type max_time: int
+    :return: incidence matrix of shape (number of jobs, max_time)
+    :rtype: numpy.ndarray
+    """
+    times = np.arange(1, max_time + 1)
+    return (
+        (job_list.starts[:, None] < times[None, :])
+        & (times[None, :] <= job_list.ends[:, None])
+    ).astype(np.float64)
+
+
+def sampleset_to_job_matrix(sampleset, job_list):
+    """Extracts the job variables of all samples, ordered as in the job list
+
+    :param sampleset: samples to process
+    :type sampleset: dimod.SampleSet
+    :param job_list: list of jobs
+    :type job_list: list
+    :return: matrix of shape (number of samples, number of jobs)
+    :rtype: numpy.ndarray
+    :raises ValueError: if the samples were sampled from another job list
+    """
+    check_job_variables(sampleset.variables, job_list)
+    columns = [sampleset.variables.index(f"x_{id}") for id in job_list.ids]
+    return sampleset.record.sample[:, columns]
+
+
+def aggregate_samples(sampleset, job_list):
+    """Merges the samples that select the same jobs into one row, whose number of occurrences is the sum of theirs.
+    Unlike sampleset.aggregate, the slack variables are ignored, since all statistics of the results depend on the jobs
+    only. The row kept for each selection is its first one with the lowest energy, and the rows stay in the order of
+    the kept ones
+
+    :param sampleset: samples to aggregate
+    :type sampleset: dimod.SampleSet
+    :param job_list: list of jobs
+    :type job_list: list
+    :return: unique samples
+    :rtype: dimod.SampleSet
+    """
+    record = sampleset.record
+    if len(record) < 2 or not len(job_list):
+        return sampleset
+    jobs = np.ascontiguousarray(
+        np.packbits(sampleset_to_job_matrix(sampleset, job_list) > 0, axis=1)
+    )
+    # each packed row is compared as a single value
+    keys = jobs.view(np.dtype((np.void, jobs.shape[1]))).ravel()
+    inverse = np.unique(keys, return_inverse=True)[1].ravel()
+    order = np.lexsort((np.arange(len(record)), record.energy, inverse))
+    first = np.ones(len(order), dtype=bool)
+    first[1:] = inverse[order[1:]] != inverse[order[:-1]]
+    kept = order[first]
+    counts = np.bincount(inverse, weights=record.num_occurrences)[inverse[kept]]
+    rank = np.argsort(kept)
+    aggregated = record[kept[rank]].copy()
+    aggregated.num_occurrences = counts[rank].astype(record.num_occurrences.dtype)
+    return dimod.SampleSet(
+        aggregated, sampleset.variables, sampleset.info, sampleset.vartype
+    )
+
+
+def evaluate_samples(samples, M, max_time, job_list):
+    """Computes the statistics of all samples at once. It gives the same values as get_total_entropy, is_sample_feasible,
+    countM and countM_hard, applied to each sample separately
+
+    :param samples: job variables of the samples, ordered as in the job list
+    :type samples: numpy.ndarray
+    :param M: number of machines
+    :type M: int
+    :param max_time: maximum time
+    :type max_time: int
+    :param job_list: list of jobs
+    :type job_list: list
+    :return: entropy, feasibility, number of soft and hard violations of each sample
+    :rtype: tuple(numpy.ndarray, numpy.ndarray, numpy.ndarray, numpy.ndarray)
+    """
+    incidence = get_incidence_matrix(job_list, max_time)
+    active = incidence.sum(axis=0) > 0
+    weights = -1 * job_list.weights
+    selected = samples == 1
+    # cumulative sum adds up the weights in the job list order, like get_total_entropy
+    entropy = np.cumsum(np.where(selected, weights, 0.0), axis=1)
+    entropy = entropy[:, -1] if len(job_list) else np.zeros(len(samples))
+    load = (selected.astype(np.float64) @ incidence)[:, active]
+    hard = (load > M).sum(axis=1)
+    soft = (load != M).sum(axis=1)
+    return entropy, hard == 0, soft, hard
+
+
+def repair_samples(samples, M, max_time, job_list, fixed=None):
+    """Makes all samples feasible and improves them greedily. First, while a time point has more than M jobs, the
+    selected job with the lowest weight running at an overloaded time point is dropped. Then, the jobs are visited in
+    decreasing order of weight and each one is added if it fits into the idle tracks. All samples are processed at once
+
+    :param samples: job variables of the samples, ordered as in the job list
+    :type samples: numpy.ndarray
+    :param M: number of machines
+    :type M: int
+    :param max_time: maximum time
+    :type max_time: int
+    :param job_list: list of jobs
+    :type job_list: list
+    :param fixed: mask of the jobs that are never dropped, which must not overload any time point themselves,
+    otherwise a ValueError is raised
+    :type fixed: numpy.ndarray
+    :return: repaired job variables and number of jobs running at each time point, for each sample
+    :rtype: tuple(numpy.ndarray, numpy.ndarray)
+    """
+    incidence = get_incidence_matrix(job_list, max_time).astype(np.int64)
+    weights = job_list.weights
+    selected = samples == 1
+    load = selected.astype(np.int64) @ incidence
+    while True:
+        over = load > M
+        rows = np.flatnonzero(over.any(axis=1))
+        if not len(rows):
+            break
+        candidates = ((over[rows].astype(np.int64) @ incidence.T) > 0) & selected[rows]
+        if fixed is not None:
+            candidates &= ~fixed
+        stuck = ~candidates.any(axis=1)
+        if stuck.any():
+            raise ValueError(
+                f"The fixed jobs of sample {rows[stuck][0]} run more than {M} at a time point"
+            )
+        drop = np.where(candidates, weights, np.inf).argmin(axis=1)
+        selected[rows, drop] = False
+        load[rows] -= incidence[drop]
+    for job in np.argsort(-weights, kind="stable"):
+        if weights[job] <= 0:
+            break
+        steps = np.flatnonzero(incidence[job])
+        fits = ~selected[:, job] & (load[:, steps] < M).all(axis=1)
+        selected[fits, job] = True
+        load[np.ix_(fits, steps)] += 1
+    return selected.astype(samples.dtype), load
+
+
+def repair_sampleset(sampleset, qubo, M, max_time, job_list):
+    """Repairs the samples with repair_samples. The slack variables are set to the number of idle tracks and the
+    energies are recomputed with the qubo
+
+    :param sampleset: samples to repair
+    :type sampleset: dimod.SampleSet
+    :param qubo: QUBO formulation for the problem
+    :type qubo: dictionary
+    :param M: number of machines
+    :type M: int
+    :param max_time: maximum time
+    :type max_time: int
+    :param job_list: list of jobs
+    :type job_list: list
+    :return: repaired samples and number of infeasible samples that became feasible
+    :rtype: tuple(dimod.SampleSet, int)
+    """
+    jobs = sampleset_to_job_matrix(sampleset, job_list)
+    feasible = evaluate_samples(jobs, M, max_time, job_list)[1]
+    repaired, load = repair_samples(jobs, M, max_time, job_list)
+    samples = sampleset.record.sample.copy()
+    variables = list(sampleset.variables)
+    samples[:, [variables.index(f"x_{id}") for id in job_list.ids]] = repaired
+    for column, v in enumerate(variables):
+        match = re.fullmatch(r"slack(\d+)\[(\d+)\]", str(v))
+        if match:
+            t, k = int(match.group(1)), int(match.group(2))
+            samples[:, column] = encode_slack(np.maximum(M - load[:, t - 1], 0), M)[k]
+
+    bqm = dimod.BinaryQuadraticModel.from_qubo(qubo)
+    for v in variables:
+        if v not in bqm.variables:
+            bqm.add_variable(v)
+    repaired_set = dimod.SampleSet.from_samples_bqm(
+        (samples, variables),
+        bqm,
+        num_occurrences=sampleset.record.num_occurrences,
+    )
+    return repaired_set, int((~feasible).sum())
+
+
 def sampleset_to_result(sampleset, M, max_time, job_list):
     """Check samples one by one, and computes it statistics.
-    Statistics includes energy (as provided by D'Wave), total entropy of the selected phrases, feasibility analysis, the samples itself. Samples are sorted
-    according to the entropy
+    Statistics includes energy (as provided by D'Wave), number of reads of the sample, total entropy of the selected phrases, feasibility analysis, the samples itself. Samples are sorted
+    according to the entropy. The statistics of all samples are computed at once with evaluate_samples
 
     :param sampleset: analyzed samples
     :type sampleset: analyzed samples
@@ -210,20 +565,114 @@ def sampleset_to_result(sampleset, M, max_time, job_list):
     :return: dictionary containing samples
     :rtype: dict
     """
+    entropy, feasible, soft, hard = evaluate_samples(
+        sampleset_to_job_matrix(sampleset, job_list), M, max_time, job_list
+    )
+    variables = list(sampleset.variables)
+    record = sampleset.record
     dict_list = []
-    for data in sampleset.data():
+    # same order as sampleset.data()
+    for idx in np.argsort(record.energy, kind="stable"):
         rdict = {}
-        sample = data.sample
-        rdict["energy"] = data.energy
-        rdict["entropy"] = get_total_entropy(sample, job_list)
-        rdict["feasible"] = is_sample_feasible(sample, M, max_time, job_list)
-        rdict["M_violate"] = countM(sample, M, max_time, job_list)
-        rdict["M_violate_hard"] = countM_hard(sample, M, max_time, job_list)
-        rdict["sample"] = sample
+        rdict["energy"] = record.energy[idx]
+        rdict["num_occurrences"] = int(record.num_occurrences[idx])
+        rdict["entropy"] = entropy[idx]
+        rdict["feasible"] = bool(feasible[idx])
+        rdict["M_violate"] = int(soft[idx])
+        rdict["M_violate_hard"] = int(hard[idx])
+        rdict["sample"] = dict(zip(variables, record.sample[idx]))
         dict_list.append(rdict)
     return sorted(dict_list, key=lambda d: d["entropy"])
 
 
+def stream_results(
+    sampleset, M, max_time, job_list, k=10, chunk_size=RESULT_CHUNK_SIZE
+):
+    """Streaming version of sampleset_to_result, which walks the samples in chunks and keeps only the k best samples of
+    each ranking of RESULT_RANKINGS in bounded heaps. The record of the sampleset is already in memory and is not
+    copied, only the memory added on top of it is bounded: the job columns and statistics of one chunk, of the order of
+    chunk_size times the number of jobs and time points, and k result dicts per ranking, where sampleset_to_result
+    builds a result dict for every sample. Ties are broken by energy and then by position, as in the energy order of
+    sampleset_to_result, so the first result of the entropy ranking is get_best_entropy_result(results), that of the
+    nonviolating ranking is get_best_nonviolating_result(results) and that of the violations ranking is the result
+    with the fewest violations
+
+    :param sampleset: analyzed samples
+    :type sampleset: dimod.SampleSet
+    :param M: number of machines
+    :type M: int
+    :param max_time: maximum time
+    :type max_time: int
+    :param job_list: list of jobs
+    :type job_list: list
+    :param k: number of results kept for each ranking
+    :type k: int
+    :param chunk_size: number of samples evaluated at once
+    :type chunk_size: int
+    :return: best results of each ranking, as in sampleset_to_result, and counters of the reads, samples, feasible
+    reads, reads without violations and the lowest energy
+    :rtype: dict
+    """
+    variables = list(sampleset.variables)
+    columns = [variables.index(f"x_{id}") for id in job_list.ids]
+    record = sampleset.record
+    heaps = {name: [] for name, _, _ in RESULT_RANKINGS}
+    counters = {
+        "reads": 0,
+        "samples": len(record),
+        "feasible_reads": 0,
+        "nonviolating_reads": 0,
+        "best_energy": None,
+    }
+    for start in range(0, len(record), chunk_size):
+        chunk = record[start : start + chunk_size]
+        entropy, feasible, soft, hard = evaluate_samples(
+            chunk.sample[:, columns], M, max_time, job_list
+        )
+        stats = {"entropy": entropy, "M_violate": soft}
+        energy, occurrences = chunk.energy, chunk.num_occurrences
+        position = np.arange(start, start + len(chunk))
+        counters["reads"] += int(occurrences.sum())
+        counters["feasible_reads"] += int(occurrences[feasible].sum())
+        counters["nonviolating_reads"] += int(occurrences[feasible & (soft == 0)].sum())
+        if len(chunk):
+            best = float(energy.min())
+            if counters["best_energy"] is None or best < counters["best_energy"]:
+                counters["best_energy"] = best
+        for name, feasible_only, keys in RESULT_RANKINGS:
+            heap = heaps[name]
+            rows = np.flatnonzero(feasible) if feasible_only else position - start
+            order = [stats[key][rows] for key in keys] + [energy[rows], position[rows]]
+            # lexsort compares the last key first
+            for row in rows[np.lexsort(order[::-1])[:k]]:
+                # heapq keeps the smallest item first, so the keys are negated to drop the worst result
+                rank = tuple(-stats[key][row] for key in keys)
+                rank += (-energy[row], -position[row])
+                if len(heap) == k and rank <= heap[0][0]:
+                    # the rows are in ranking order, so the later ones do not fit either
+                    break
+                rdict = {
+                    "energy": energy[row],
+                    "num_occurrences": int(occurrences[row]),
+                    "entropy": entropy[row],
+                    "feasible": bool(feasible[row]),
+                    "M_violate": int(soft[row]),
+                    "M_violate_hard": int(hard[row]),
+                }
+                if len(heap) < k:
+                    heapq.heappush(heap, (rank, start + row, rdict))
+                else:
+                    heapq.heappushpop(heap, (rank, start + row, rdict))
+
+    results = {"counters": counters}
+    for name, heap in heaps.items():
+        results[name] = []
+        for _, idx, rdict in sorted(heap, key=lambda item: item[0], reverse=True):
+            rdict["sample"] = dict(zip(variables, record.sample[idx]))
+            results[name].append(rdict)
+    return results
+
+
 def sample_to_midi(file, sample, M, job_list, results_p, sample_type):
     """Given a sample generates the midi file
 
@@ -239,11 +688,36 @@ def sample_to_midi(file, sample, M, job_list, results_p, sample_type):
     :type results_p: string
     :param sample_type: whether it is best entropy or best non-violating solution
     :type sample_type: string
+    :return: selected jobs and their assignment to machines
+    :rtype: tuple(list, dict)
     """
     new_jobs = sample_to_jobs(sample, job_list)
     machine_jobs = greedy_machines(M, new_jobs)
     new_music = machines_to_stream(machine_jobs, file)
     store_midi(new_music, f"{results_p}_{sample_type}")
+    return new_jobs, machine_jobs
+
 
-    return new_jobs,machine_jobs
+def sample_to_midi_direct(notes, sample, M, job_list, results_p, sample_type):
+    """Given a sample generates the midi file from the note table, see machines_to_midi
+
+    :param notes: note table of the music file
+    :type notes: NoteTable
+    :param sample: sample to process
+    :type sample: dict
+    :param M: number of tracks
+    :type M: int
+    :param job_list: list of jobs
+    :type job_list: list
+    :param results_p: path to save midi
+    :type results_p: string
+    :param sample_type: whether it is best entropy or best non-violating solution
+    :type sample_type: string
+    :return: selected jobs and their assignment to machines
+    :rtype: tuple(list, dict)
+    """
+    new_jobs = sample_to_jobs(sample, job_list)
+    machine_jobs = greedy_machines(M, new_jobs)
+    machines_to_midi(machine_jobs, notes, f"{results_p}_{sample_type}")
+    return new_jobs, machine_jobs
 
@@ -0,0 +1,106 @@
+import contextlib
+import datetime
+import json
+import logging
+import os
+import resource
+import time
+import tracemalloc
+
+PROFILE_FILE = "profile.jsonl"
+
+
+class StageProfiler:
+    def __init__(self, path, run=None, memory=True):
+        """Constructor for the StageProfiler class, which records the wall time, CPU time and peak memory of the stages
+        of a run, together with size counters, and appends them to a json lines file as one record per run. The peak
+        memory is that of the Python allocations traced by tracemalloc during the stage, which slows the stages down,
+        so it can be turned off
+
+        :param path: Path to the profile file
+        :type path: string
+        :param run: Description of the run, e.g. the file and the annealing parameters
+        :type run: dict
+        :param memory: Whether to trace the memory allocations
+        :type memory: bool
+        """
+        self.path = path
+        self.run = run or {}
+        self.memory = memory
+        self.stages = []
+        self.counters = {}
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        """Context manager measuring a stage
+
+        :param name: Name of the stage
+        :type name: string
+        """
+        started_tracing = False
+        if self.memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                started_tracing = True
+            tracemalloc.reset_peak()
+            start_memory = tracemalloc.get_traced_memory()[0]
+        start_time, start_cpu = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            record = {
+                "stage": name,
+                "wall_time": time.perf_counter() - start_time,
+                "cpu_time": time.process_time() - start_cpu,
+            }
+            if self.memory:
+                current, peak = tracemalloc.get_traced_memory()
+                record["peak_memory"] = peak - start_memory
+                record["memory_delta"] = current - start_memory
+                if started_tracing:
+                    tracemalloc.stop()
+            self.stages.append(record)
+
+    def count(self, **counters):
+        """Records size counters, e.g. the number of notes or of reads"""
+        self.counters.update({name: int(value) for name, value in counters.items()})
+
+    def write(self):
+        """Appends the record of the run to the profile file and logs it"""
+        record = {
+            "date": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            **self.run,
+            "stages": self.stages,
+            "counters": self.counters,
+            # kilobytes on Linux
+            "max_rss": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        }
+        logging.info(f"Profile: {record}")
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.path, "a") as handle:
+            handle.write(json.dumps(record) + "\n")
+
+
+def profile_stage(profiler, name):
+    """Returns the context manager measuring the stage, or one doing nothing if there is no profiler
+
+    :param profiler: Profiler of the run
+    :type profiler: StageProfiler
+    :param name: Name of the stage
+    :type name: string
+    :return: Context manager
+    :rtype: contextlib.AbstractContextManager
+    """
+    if profiler is None:
+        return contextlib.nullcontext()
+    return profiler.stage(name)
+
+
+def count_sizes(profiler, **counters):
+    """Records the size counters, if there is a profiler
+
+    :param profiler: Profiler of the run
+    :type profiler: StageProfiler
+    """
+    if profiler is not None:
+        profiler.count(**counters)
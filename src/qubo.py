@@ -1,3 +1,7 @@
+import logging
+import time
+
+import numpy as np
 from pyqubo.integer.log_encoded_integer import LogEncInteger
 
 from cpp_pyqubo import Binary, Constraint
@@ -21,24 +25,73 @@ def get_objective(job_list):
     return o
 
 
-def running_jobs(job_list, t):
-    """Returns the list of jobs where t is between the start and end times
+def get_running_jobs(job_list, max_time):
+    """Builds the interval index of the job list, i.e. the jobs running at each time point. A single sweep over the sorted
+    start and end events is used, so the index is computed in O(J log J + total overlap) instead of scanning the whole
+    job list for each time point
 
     :param job_list: List of jobs
     :type job_list: list
-    :param t: Time
-    :type t: int
-    :return: List of jobs active at time t
-    :rtype: list
+    :param max_time: Maximum time
+    :type max_time: int
+    :return: Dictionary mapping each time in 1..max_time to the list of jobs active at that time
+    :rtype: dict
     """
-    run_jobs = []
-    for job in job_list.jobs:
-        if t > job.start and t <= job.end:
-            run_jobs.append(job.id)
+    # job is running at t if start < t <= end, so it enters at start + 1 and leaves at end + 1
+    starts, ends, ids = (
+        job_list.starts.tolist(),
+        job_list.ends.tolist(),
+        job_list.ids.tolist(),
+    )
+    by_start = np.argsort(job_list.starts, kind="stable").tolist()
+    by_end = np.argsort(job_list.ends, kind="stable").tolist()
+    run_jobs = {}
+    active = set()
+    s, e = 0, 0
+    for t in range(1, max_time + 1):
+        while s < len(by_start) and starts[by_start[s]] < t:
+            if ends[by_start[s]] >= t:
+                active.add(by_start[s])
+            s += 1
+        while e < len(by_end) and ends[by_end[e]] < t:
+            active.discard(by_end[e])
+            e += 1
+        # keep the order of the job list
+        run_jobs[t] = [ids[k] for k in sorted(active)]
     return run_jobs
 
 
-def num_machine_cons(M, job_list, max_time, p):
+def get_constraint_groups(run_jobs_dict, max_time, collapse=False):
+    """Groups the consecutive time points that have the same running jobs. The constraints of the time points of a group
+    are equal, so they can be replaced by one constraint scaled by the number of time points. For num_machine_cons this
+    gives the same penalty for every sample. For min_idle_time_cons the time points share one slack, and as all of
+    them are minimized by the same slack value, the minimum over the slacks, and hence the minimizers of the qubo over
+    the job variables, are unchanged
+
+    :param run_jobs_dict: Jobs running at each time point
+    :type run_jobs_dict: dict
+    :param max_time: Maximum time
+    :type max_time: int
+    :param collapse: Whether to group the time points, otherwise each time point with running jobs is its own group
+    :type collapse: bool
+    :return: First time point, number of time points and running jobs of each group
+    :rtype: list
+    """
+    groups = []
+    for j in range(1, max_time + 1):
+        run_jobs = run_jobs_dict[j]
+        if len(run_jobs) < 1:
+            continue
+        if collapse and groups:
+            first, length, group_jobs = groups[-1]
+            if first + length == j and group_jobs == run_jobs:
+                groups[-1] = (first, length + 1, group_jobs)
+                continue
+        groups.append((j, 1, run_jobs))
+    return groups
+
+
+def num_machine_cons(M, job_list, max_time, p, run_jobs_dict=None, collapse=False):
     """Implements the number of tracks constraint, which ensures that there are exactly M tracks after the reduction
 
     :param M: Number of tracks after reduction
@@ -49,22 +102,27 @@ def num_machine_cons(M, job_list, max_time, p):
     :type max_time: int
     :param p: Penalty value
     :type p: float
+    :param run_jobs_dict: Jobs running at each time point, computed with get_running_jobs if not given
+    :type run_jobs_dict: dict
+    :param collapse: Whether to merge the constraints of consecutive time points with the same running jobs, see
+    get_constraint_groups
+    :type collapse: bool
     :return: pyqubo object corresponding to the objective function
     :rtype: cpp_pyqubo.Add
     """
+    if run_jobs_dict is None:
+        run_jobs_dict = get_running_jobs(job_list, max_time)
     c = 0
-    for j in range(1, max_time + 1):
-        run_jobs = running_jobs(job_list, j)
-        if len(run_jobs) < 1:
-            continue
+    groups = get_constraint_groups(run_jobs_dict, max_time, collapse)
+    for j, length, run_jobs in groups:
         c += Constraint(
-            p * (M - sum(Binary(f"x_{i}") for i in run_jobs)) ** 2,
+            p * length * (M - sum(Binary(f"x_{i}") for i in run_jobs)) ** 2,
             f"exactly_M_{j}",
         )
     return c
 
 
-def min_idle_time_cons(M, job_list, max_time, p):
+def min_idle_time_cons(M, job_list, max_time, p, run_jobs_dict=None, collapse=False):
     """Implements the constraint, which ensures that there are less than M tracks after the reduction
 
     :param M: Number of tracks after reduction
@@ -75,24 +133,31 @@ def min_idle_time_cons(M, job_list, max_time, p):
     :type max_time: int
     :param p: Penalty value
     :type p: float
+    :param run_jobs_dict: Jobs running at each time point, computed with get_running_jobs if not given
+    :type run_jobs_dict: dict
+    :param collapse: Whether to merge the constraints of consecutive time points with the same running jobs, see
+    get_constraint_groups
+    :type collapse: bool
     :return: pyqubo object corresponding to the objective function
     :rtype: cpp_pyqubo.Add
     """
 
+    if run_jobs_dict is None:
+        run_jobs_dict = get_running_jobs(job_list, max_time)
     c = 0
-    for j in range(1, max_time + 1):
-        run_jobs = running_jobs(job_list, j)
-        if len(run_jobs) < 1:
-            continue
+    groups = get_constraint_groups(run_jobs_dict, max_time, collapse)
+    for j, length, run_jobs in groups:
         slack_var = LogEncInteger(f"slack{j}", (0, M))
         c += Constraint(
-            p * (M - sum(Binary(f"x_{i}") for i in run_jobs) - slack_var) ** 2,
+            p
+            * length
+            * (M - sum(Binary(f"x_{i}") for i in run_jobs) - slack_var) ** 2,
             f"less_M_{j}",
         )
     return c
 
 
-def get_qubo(job_list, M, max_time, p_dict):
+def get_qubo(job_list, M, max_time, p_dict, collapse=False):
     """Constructs the qubo for the problem
 
     :param file: File to process
@@ -107,13 +172,178 @@ def get_qubo(job_list, M, max_time, p_dict):
     :type conf_list:
     :param p_dict:
     :type p_dict:
+    :param collapse: Whether to merge the constraints of consecutive time points with the same running jobs
+    :type collapse: bool
     :return: QUBO formulation, the offset and the model
     :rtype: dict, float, cpp_pyqubo.Model
     """
+    run_jobs_dict = get_running_jobs(job_list, max_time)
     H = get_objective(job_list)
-    H += num_machine_cons(M, job_list, max_time, p_dict["exact"])
-    H += min_idle_time_cons(M, job_list, max_time, p_dict["less"])
+    H += num_machine_cons(
+        M, job_list, max_time, p_dict["exact"], run_jobs_dict, collapse
+    )
+    H += min_idle_time_cons(
+        M, job_list, max_time, p_dict["less"], run_jobs_dict, collapse
+    )
 
     model = H.compile()
     qubo, offset = model.to_qubo()
     return qubo, offset, model
+
+
+def log_enc_coefficients(M):
+    """Returns the coefficients of the binary variables of the slack, encoded in the same way as pyqubo LogEncInteger
+    with value range (0, M)
+
+    :param M: Upper bound of the slack
+    :type M: int
+    :return: Coefficients of the slack bits
+    :rtype: list
+    """
+    num_variables = int(np.log2(M)) + 1
+    d = num_variables - 1
+    return [2**i for i in range(num_variables - 1)] + [M - (2**d - 1)]
+
+
+def encode_slack(value, M):
+    """Returns the bits of slacks with the given values, in the encoding of log_enc_coefficients
+
+    :param value: Values of the slacks, between 0 and M
+    :type value: numpy.ndarray or int
+    :param M: Upper bound of the slack
+    :type M: int
+    :return: Bits of the slacks, one array per slack variable
+    :rtype: list
+    """
+    coefs = log_enc_coefficients(M)
+    value = np.asarray(value)
+    top = value > sum(coefs[:-1])
+    value = value - top * coefs[-1]
+    return [(value >> k) & 1 for k in range(len(coefs) - 1)] + [top.astype(value.dtype)]
+
+
+def get_qubo_arrays(job_list, M, max_time, p_dict, run_jobs_dict=None, collapse=False):
+    """Constructs the qubo for the problem directly as coefficient arrays, without compiling a pyqubo expression. The
+    squared penalties of num_machine_cons and min_idle_time_cons are expanded term by term, using x^2 = x for the binary
+    variables, and the slack variables are encoded as in LogEncInteger, so the result is the same qubo as get_qubo
+
+    :param job_list: List of jobs
+    :type job_list: list
+    :param M: Number of tracks to reduce
+    :type M: int
+    :param max_time: Maximum time
+    :type max_time: int
+    :param p_dict: Dictionary of penalties
+    :type p_dict: dict
+    :param run_jobs_dict: Jobs running at each time point, computed with get_running_jobs if not given
+    :type run_jobs_dict: dict
+    :param collapse: Whether to merge the constraints of consecutive time points with the same running jobs
+    :type collapse: bool
+    :return: Variable labels, linear coefficients, row and column indices and values of the quadratic coefficients, offset
+    :rtype: list, numpy.ndarray, numpy.ndarray, numpy.ndarray, numpy.ndarray, float
+    """
+    if run_jobs_dict is None:
+        run_jobs_dict = get_running_jobs(job_list, max_time)
+    labels = [f"x_{id}" for id in job_list.ids]
+    coefs = np.array(log_enc_coefficients(M), dtype=float)
+
+    def expand_square(p, var_idx, var_coefs, terms):
+        # p * (M - sum_k c_k v_k) ** 2 = p * M^2 + sum_k p * (c_k^2 - 2 M c_k) v_k + sum_{k<l} 2 p c_k c_l v_k v_l
+        terms["lin_idx"].append(var_idx)
+        terms["lin_val"].append(p * (var_coefs * var_coefs - 2 * M * var_coefs))
+        row, col = np.triu_indices(len(var_idx), 1)
+        terms["quad_row"].append(var_idx[row])
+        terms["quad_col"].append(var_idx[col])
+        terms["quad_val"].append(2 * p * var_coefs[row] * var_coefs[col])
+        terms["offset"] += p * M**2
+
+    # each penalty family is summed up in time order and the families are added to the objective at the end, which
+    # is the order used by pyqubo, so that the coefficients agree to the last bit
+    groups = get_constraint_groups(run_jobs_dict, max_time, collapse)
+    families = []
+    for name in ["exact", "less"]:
+        terms = {
+            "lin_idx": [],
+            "lin_val": [],
+            "quad_row": [],
+            "quad_col": [],
+            "quad_val": [],
+            "offset": 0,
+        }
+        for j, length, run_jobs in groups:
+            var_idx = np.array([job_list.index[i] for i in run_jobs])
+            var_coefs = np.ones(len(var_idx))
+            if name == "less":
+                slack_idx = np.arange(len(labels), len(labels) + len(coefs))
+                labels += [f"slack{j}[{k}]" for k in range(len(coefs))]
+                var_idx = np.concatenate([var_idx, slack_idx])
+                var_coefs = np.concatenate([var_coefs, coefs])
+            expand_square(p_dict[name] * length, var_idx, var_coefs, terms)
+        families.append(terms)
+
+    num_var = len(labels)
+    lin_families = []
+    for terms in families:
+        lin = np.zeros(num_var)
+        if terms["lin_idx"]:
+            np.add.at(
+                lin, np.concatenate(terms["lin_idx"]), np.concatenate(terms["lin_val"])
+            )
+        lin_families.append(lin)
+    linear = np.zeros(num_var)
+    linear[: len(job_list)] = -job_list.weights
+    linear += lin_families[0] + lin_families[1]
+
+    keys = [
+        np.minimum(r, c) * num_var + np.maximum(r, c)
+        for terms in families
+        for r, c in zip(terms["quad_row"], terms["quad_col"])
+    ]
+    keys = np.unique(np.concatenate(keys)) if keys else np.zeros(0, int)
+    quad_families = []
+    for terms in families:
+        quad = np.zeros(len(keys))
+        if terms["quad_row"]:
+            row = np.concatenate(terms["quad_row"])
+            col = np.concatenate(terms["quad_col"])
+            np.add.at(
+                quad,
+                np.searchsorted(keys, np.minimum(row, col) * num_var + np.maximum(row, col)),
+                np.concatenate(terms["quad_val"]),
+            )
+        quad_families.append(quad)
+    quad = quad_families[0] + quad_families[1]
+    row, col = np.divmod(keys, num_var)
+    offset = families[0]["offset"] + families[1]["offset"]
+    return labels, linear, row, col, quad, offset
+
+
+def get_qubo_direct(job_list, M, max_time, p_dict, collapse=False):
+    """Constructs the qubo for the problem from the coefficient arrays given by get_qubo_arrays. This gives the same qubo
+    and offset as get_qubo, but skips the compilation of the pyqubo expression
+
+    :param job_list: List of jobs
+    :type job_list: list
+    :param M: Number of tracks to reduce
+    :type M: int
+    :param max_time: Maximum time
+    :type max_time: int
+    :param p_dict: Dictionary of penalties
+    :type p_dict: dict
+    :param collapse: Whether to merge the constraints of consecutive time points with the same running jobs
+    :type collapse: bool
+    :return: QUBO formulation, the offset and the variable labels
+    :rtype: dict, float, list
+    """
+    start_time = time.perf_counter()
+    labels, linear, row, col, quad, offset = get_qubo_arrays(
+        job_list, M, max_time, p_dict, collapse=collapse
+    )
+    qubo = {(labels[i], labels[i]): v for i, v in enumerate(linear) if v != 0}
+    qubo.update(
+        {(labels[i], labels[j]): v for i, j, v in zip(row, col, quad) if v != 0}
+    )
+    logging.info(
+        f"QUBO built in {time.perf_counter() - start_time:.3f} s, num variables: {len(labels)}, nonzero terms: {len(qubo)}"
+    )
+    return qubo, offset, labels
@@ -0,0 +1,198 @@
+import hashlib
+import json
+import logging
+import os
+
+import numpy as np
+
+from qubo import get_qubo, get_qubo_direct
+
+QUBO_CACHE_VERSION = 1
+
+QUBO_CACHE_MAX_BYTES = 512 * 1024 * 1024
+
+
+def get_qubo_key(job_list, M, max_time, p_dict, builder, collapse=False):
+    """Returns the key of the qubo in the cache, a hash of all inputs of the qubo: the ids, intervals and weights of the
+    jobs, M, max_time, the penalties, the builder and whether the constraints are collapsed
+
+    :param job_list: List of jobs
+    :type job_list: list
+    :param M: Number of tracks to reduce
+    :type M: int
+    :param max_time: Maximum time
+    :type max_time: int
+    :param p_dict: Dictionary of penalties
+    :type p_dict: dict
+    :param builder: QUBO builder, either direct or pyqubo
+    :type builder: string
+    :param collapse: Whether the constraints of consecutive time points with the same running jobs are merged
+    :type collapse: bool
+    :return: Key of the qubo
+    :rtype: string
+    """
+    header = {
+        "version": QUBO_CACHE_VERSION,
+        "builder": builder,
+        "collapse": bool(collapse),
+        "M": int(M),
+        "max_time": int(max_time),
+        # hex keeps the penalties exact
+        "p_dict": {name: float(p).hex() for name, p in p_dict.items()},
+    }
+    digest = hashlib.sha256(json.dumps(header, sort_keys=True).encode())
+    for column in (job_list.ids, job_list.starts, job_list.ends, job_list.weights):
+        digest.update(np.ascontiguousarray(column).tobytes())
+    return digest.hexdigest()
+
+
+def get_qubo_cache_path(cache_folder, key):
+    """Returns the path of a cached qubo
+
+    :param cache_folder: Cache folder
+    :type cache_folder: string
+    :param key: Key of the qubo
+    :type key: string
+    :return: Path to the cached qubo
+    :rtype: string
+    """
+    return os.path.join(cache_folder, f"{key}.npz")
+
+
+def store_cached_qubo(path, qubo, offset, variables):
+    """Stores the qubo as coefficient arrays, with its variable labels and offset. The entries keep the order of the
+    qubo dictionary, so the loaded qubo gives the same samples for a given seed
+
+    :param path: Path to the cached qubo
+    :type path: string
+    :param qubo: QUBO formulation
+    :type qubo: dict
+    :param offset: Offset of the qubo
+    :type offset: float
+    :param variables: Variable labels
+    :type variables: list
+    """
+    labels = list(variables)
+    index = {v: i for i, v in enumerate(labels)}
+    for u, v in qubo:
+        for label in (u, v):
+            if label not in index:
+                index[label] = len(labels)
+                labels.append(label)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    temp = f"{path}.{os.getpid()}.tmp"
+    with open(temp, "wb") as handle:
+        np.savez(
+            handle,
+            labels=np.array(labels, dtype=str),
+            num_variables=len(variables),
+            row=np.array([index[u] for u, _ in qubo], dtype=np.int64),
+            col=np.array([index[v] for _, v in qubo], dtype=np.int64),
+            value=np.array(list(qubo.values()), dtype=np.float64),
+            offset=float(offset),
+        )
+    # concurrent runs never see a partly written file
+    os.replace(temp, path)
+
+
+def load_cached_qubo(path):
+    """Loads a cached qubo. Returns None if it does not exist or cannot be read
+
+    :param path: Path to the cached qubo
+    :type path: string
+    :return: QUBO formulation, the offset and the variable labels
+    :rtype: dict, float, list
+    """
+    if not os.path.isfile(path):
+        return None
+    try:
+        with np.load(path) as data:
+            labels = data["labels"].tolist()
+            row, col, value = data["row"], data["col"], data["value"].tolist()
+            offset = float(data["offset"])
+            variables = labels[: int(data["num_variables"])]
+    except (OSError, ValueError, KeyError) as error:
+        logging.warning(f"Ignoring unreadable cached QUBO {path}: {error}")
+        return None
+    qubo = {
+        (labels[i], labels[j]): v for i, j, v in zip(row.tolist(), col.tolist(), value)
+    }
+    # the modification time orders the entries for evict_qubo_cache
+    os.utime(path)
+    return qubo, offset, variables
+
+
+def evict_qubo_cache(cache_folder, max_bytes=QUBO_CACHE_MAX_BYTES):
+    """Removes the least recently used qubos until the cache folder holds at most max_bytes
+
+    :param cache_folder: Cache folder
+    :type cache_folder: string
+    :param max_bytes: Size bound of the cache folder
+    :type max_bytes: int
+    """
+    entries = []
+    for name in os.listdir(cache_folder):
+        if name.endswith(".npz"):
+            stat = os.stat(os.path.join(cache_folder, name))
+            entries.append((stat.st_mtime, stat.st_size, name))
+    total = sum(size for _, size, _ in entries)
+    for _, size, name in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(os.path.join(cache_folder, name))
+        except FileNotFoundError:
+            pass
+        total -= size
+        logging.info(f"Evicted cached QUBO {name}")
+
+
+def get_cached_qubo(
+    job_list,
+    M,
+    max_time,
+    p_dict,
+    builder,
+    cache_folder,
+    max_bytes=QUBO_CACHE_MAX_BYTES,
+    collapse=False,
+):
+    """If the qubo of the inputs is in the cache, it loads it. Otherwise, it builds the qubo with the builder, stores it
+    and evicts the least recently used qubos beyond max_bytes
+
+    :param job_list: List of jobs
+    :type job_list: list
+    :param M: Number of tracks to reduce
+    :type M: int
+    :param max_time: Maximum time
+    :type max_time: int
+    :param p_dict: Dictionary of penalties
+    :type p_dict: dict
+    :param builder: QUBO builder, either direct or pyqubo
+    :type builder: string
+    :param cache_folder: Cache folder
+    :type cache_folder: string
+    :param max_bytes: Size bound of the cache folder
+    :type max_bytes: int
+    :param collapse: Whether to merge the constraints of consecutive time points with the same running jobs
+    :type collapse: bool
+    :return: QUBO formulation, the offset and the variable labels
+    :rtype: dict, float, list
+    """
+    path = get_qubo_cache_path(
+        cache_folder, get_qubo_key(job_list, M, max_time, p_dict, builder, collapse)
+    )
+    cached = load_cached_qubo(path)
+    if cached is not None:
+        logging.info(f"QUBO loaded from {path}")
+        return cached
+    if builder == "pyqubo":
+        qubo, offset, model = get_qubo(job_list, M, max_time, p_dict, collapse)
+        variables = model.variables
+    else:
+        qubo, offset, variables = get_qubo_direct(
+            job_list, M, max_time, p_dict, collapse
+        )
+    store_cached_qubo(path, qubo, offset, variables)
+    evict_qubo_cache(cache_folder, max_bytes)
+    return qubo, offset, variables
@@ -0,0 +1,276 @@
+import logging
+import time
+
+import dimod
+import numpy as np
+
+from calibration import DEFAULT_PENALTY_MULTIPLIERS, get_p_dict
+from experiment import run_sampler
+from jobs import Job, JobCollector, max_weight_phrase
+from midi_writer import StreamingMidiWriter
+from phrase_identification import get_phrase_list
+from postprocess import evaluate_samples, repair_samples
+from qubo import get_qubo, get_qubo_direct
+from qubo_cache import get_cached_qubo
+from toolbox import get_table_entropies
+
+
+def get_window_jobs(notes, meas_start, meas_end, carried, next_id, longest_phrase, weights):
+    """Identifies the phrases of a window and converts them into jobs. The committed jobs running into the window come
+    first, starting at the window, and the phrases of their tracks start after them
+
+    :param notes: Note table of the whole file
+    :type notes: NoteTable
+    :param meas_start: Time point where the window starts
+    :type meas_start: int
+    :param meas_end: Last measure of the window
+    :type meas_end: int
+    :param carried: Committed jobs running into the window, with their machines
+    :type carried: list
+    :param next_id: Id of the first new job
+    :type next_id: int
+    :param longest_phrase: Longest phrase length in terms of measures
+    :type longest_phrase: int
+    :param weights: Dictionary containing the weights for the phrase generation
+    :type weights: dict
+    :return: Jobs of the window
+    :rtype: JobCollector
+    """
+    window = notes.window(meas_start + 1 if meas_start > 0 else 0, meas_end)
+    phrase_list = get_phrase_list(window, longest_phrase, weights)
+    busy = {job.track: job.end for job, _ in carried}
+    phrases = []
+    for track, value in phrase_list.items():
+        for phrase in value:
+            start = max(phrase[0], busy.get(track, phrase[0] - 1) + 1)
+            if start <= phrase[1]:
+                phrases.append((track, start, phrase[1]))
+
+    job_list = JobCollector()
+    for job, _ in carried:
+        job_list += Job(meas_start, job.end, job.weight, job.id, job.track)
+    job_list.counter = next_id
+    for (track, start, end), weight in zip(
+        phrases, get_table_entropies(notes, phrases)
+    ):
+        job_list.new_job(start - 1, end, weight, track)
+    return job_list
+
+
+def solve_window(
+    job_list,
+    M,
+    max_time,
+    fixed,
+    mode,
+    a_dict,
+    solver=None,
+    collapse=False,
+    multipliers=DEFAULT_PENALTY_MULTIPLIERS,
+    builder="direct",
+    cache_folder=None,
+):
+    """Solves the qubo of a window with the fixed jobs selected, and returns the feasible sample with the lowest
+    entropy. If no sample is feasible, the one with the lowest energy is repaired with repair_samples. The penalties
+    are the multipliers times the maximal job weight of the window, as in prepare_experiment
+
+    :param job_list: Jobs of the window
+    :type job_list: JobCollector
+    :param M: Number of tracks
+    :type M: int
+    :param max_time: Last time point of the window
+    :type max_time: int
+    :param fixed: Ids of the fixed jobs
+    :type fixed: list
+    :param mode: Simulation mode
+    :type mode: string
+    :param a_dict: Dictionary containing annealing parameters
+    :type a_dict: dictionary
+    :param solver: D-Wave solver
+    :type solver: string
+    :param collapse: Whether to merge the constraints of consecutive time points with the same running jobs
+    :type collapse: bool
+    :param multipliers: Multiplier of each penalty
+    :type multipliers: dict
+    :param builder: QUBO builder, either direct (coefficient arrays) or pyqubo (compiled expression)
+    :type builder: string
+    :param cache_folder: QUBO cache folder, if None the qubo is always built
+    :type cache_folder: string
+    :return: Selection of each job, ordered as in the job list, and number of variables of the qubo
+    :rtype: tuple(numpy.ndarray, int)
+    """
+    p_dict = get_p_dict(max_weight_phrase(job_list), multipliers)
+    if cache_folder:
+        qubo, offset, _ = get_cached_qubo(
+            job_list, M, max_time, p_dict, builder, cache_folder, collapse=collapse
+        )
+    elif builder == "pyqubo":
+        qubo, offset, _ = get_qubo(job_list, M, max_time, p_dict, collapse)
+    else:
+        qubo, offset, _ = get_qubo_direct(job_list, M, max_time, p_dict, collapse)
+    bqm = dimod.BinaryQuadraticModel.from_qubo(qubo, offset)
+    for id in fixed:
+        if f"x_{id}" in bqm.variables:
+            bqm.fix_variable(f"x_{id}", 1)
+    window_qubo, _ = bqm.to_qubo()
+    problem = {
+        "job_list": job_list,
+        "M": M,
+        "max_time": max_time,
+        "p_dict": p_dict,
+        "fixed": fixed,
+    }
+    sampleset = run_sampler(window_qubo, mode, a_dict, solver, problem)
+
+    index = {v: i for i, v in enumerate(sampleset.variables)}
+    samples = np.ones((len(sampleset), len(job_list)), dtype=np.int8)
+    for row, id in enumerate(job_list.ids):
+        column = index.get(f"x_{id}")
+        if column is not None:
+            samples[:, row] = sampleset.record.sample[:, column]
+    entropy, feasible = evaluate_samples(samples, M, max_time, job_list)[:2]
+    if feasible.any():
+        candidates = np.flatnonzero(feasible)
+        return samples[candidates[np.argmin(entropy[candidates])]], bqm.num_variables
+    fixed_mask = np.isin(job_list.ids, list(fixed))
+    best = samples[[np.argmin(sampleset.record.energy)]]
+    return repair_samples(best, M, max_time, job_list, fixed_mask)[0][0], bqm.num_variables
+
+
+def rolling_arrangement(
+    notes,
+    M,
+    window,
+    commit,
+    mode,
+    a_dict,
+    out_p,
+    solver=None,
+    longest_phrase=4,
+    weights={"p": 0.25, "i": 0.5, "r": 0.25},
+    collapse=False,
+    multipliers=DEFAULT_PENALTY_MULTIPLIERS,
+    builder="direct",
+    cache_folder=None,
+):
+    """Arranges the piece window by window. In each window of at most window measures, the phrases are identified and
+    the jobs are selected by solving the qubo of the window. The jobs starting in the first commit measures are
+    committed and assigned to machines, the earliest starting time first as in greedy_machines, and those running
+    into the next window are fixed there. As in machines_to_midi, the measures of the jobs of each machine are placed
+    one after the other, and they are written to the midi file as soon as they are committed. The notes are thus those
+    of machines_to_midi for the committed jobs. Only the notes before the position of the machine that is furthest
+    behind are written out, since that machine may still place notes there
+
+    :param notes: Note table of the music file
+    :type notes: NoteTable
+    :param M: Number of tracks
+    :type M: int
+    :param window: Number of measures of a window
+    :type window: int
+    :param commit: Number of measures committed after each window
+    :type commit: int
+    :param mode: Simulation mode
+    :type mode: string
+    :param a_dict: Dictionary containing annealing parameters
+    :type a_dict: dictionary
+    :param out_p: Path of the midi file, without extension
+    :type out_p: string
+    :param solver: D-Wave solver
+    :type solver: string
+    :param longest_phrase: Longest phrase length in terms of measures
+    :type longest_phrase: int
+    :param weights: Dictionary containing the weights for the phrase generation
+    :type weights: dict
+    :param collapse: Whether to merge the constraints of consecutive time points with the same running jobs
+    :type collapse: bool
+    :param multipliers: Multiplier of each penalty, the penalties of each window are computed from its jobs
+    :type multipliers: dict
+    :param builder: QUBO builder, either direct (coefficient arrays) or pyqubo (compiled expression)
+    :type builder: string
+    :param cache_folder: QUBO cache folder, if None the qubos are always built
+    :type cache_folder: string
+    :return: Committed jobs with their machines, and statistics of the run
+    :rtype: tuple(list, dict)
+    """
+    max_time = notes.num_measures
+    writer = StreamingMidiWriter(f"{out_p}.mid", notes.ticks_per_quarter, notes.tempos)
+    machine_end = [None] * M
+    # tick where the next measure of each machine is placed
+    machine_position = [0] * M
+    carried, committed = [], []
+    next_id = 0
+    stats = {"windows": 0, "entropy": 0.0, "max_variables": 0, "max_window_time": 0.0}
+    meas_start = 0
+    while meas_start < max_time:
+        start_time = time.perf_counter()
+        meas_end = min(meas_start + window, max_time)
+        commit_end = meas_end if meas_end == max_time else meas_start + commit
+        job_list = get_window_jobs(
+            notes, meas_start, meas_end, carried, next_id, longest_phrase, weights
+        )
+        next_id = job_list.counter
+        fixed = [job.id for job, _ in carried]
+        new_jobs = []
+        if len(job_list) > len(carried):
+            selection, num_variables = solve_window(
+                job_list,
+                M,
+                meas_end,
+                fixed,
+                mode,
+                a_dict,
+                solver,
+                collapse,
+                multipliers,
+                builder,
+                cache_folder,
+            )
+            stats["max_variables"] = max(stats["max_variables"], num_variables)
+            rows = [
+                row
+                for row in np.flatnonzero(selection)
+                if job_list.ids[row] not in fixed
+                and job_list.starts[row] < commit_end
+            ]
+            new_jobs = sorted(
+                (job_list.jobs[row] for row in rows), key=lambda job: job.start
+            )
+        for job in new_jobs:
+            machine = next(
+                m for m in range(M) if machine_end[m] is None or machine_end[m] <= job.start
+            )
+            machine_end[machine] = job.end
+            carried.append((job, machine))
+            committed.append((job, machine))
+            stats["entropy"] -= float(job.weight)
+
+        for job, machine in carried:
+            starts = notes.measure_starts[job.track]
+            first = max(meas_start, job.start) + 1
+            for number in range(first, min(job.end, commit_end) + 1):
+                row = np.searchsorted(starts[:, 0], number)
+                if row == len(starts) or starts[row, 0] != number:
+                    continue
+                shift = machine_position[machine] - int(starts[row, 1])
+                for event in notes.measure_events(job.track, number, number):
+                    writer.add_note(
+                        machine,
+                        int(event["on"]) + shift,
+                        int(event["off"]) + shift,
+                        int(event["pitch"]),
+                        int(event["velocity"]),
+                    )
+                machine_position[machine] += int(starts[row, 2])
+        # later notes of each machine start at its position at the earliest
+        writer.flush(min(machine_position) - 1)
+
+        carried = [(job, machine) for job, machine in carried if job.end > commit_end]
+        window_time = time.perf_counter() - start_time
+        stats["windows"] += 1
+        stats["max_window_time"] = max(stats["max_window_time"], window_time)
+        logging.info(
+            f"Window {meas_start + 1}-{meas_end}: {len(job_list)} jobs, {len(new_jobs)} committed up to measure {commit_end}, {window_time:.3f} s"
+        )
+        meas_start = commit_end
+    writer.close()
+    return committed, stats
@@ -0,0 +1,314 @@
+import argparse
+import json
+import logging
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from benchmarking_exp import get_grid
+from calibration import time_to_solution
+from experiment import run_sampler
+from main import prepare_experiment
+from postprocess import evaluate_samples, sampleset_to_job_matrix
+from utils import get_file_path
+
+TTS_TARGET = 0.99
+
+
+def get_problem(prep):
+    """Returns the problem dictionary of the prepared problem, as passed to run_sampler
+
+    :param prep: Prepared problem, as returned by prepare_experiment
+    :type prep: dict
+    :return: Dictionary containing the job list, M, max_time and p_dict
+    :rtype: dict
+    """
+    return {
+        "job_list": prep["job_list"],
+        "M": prep["M"],
+        "max_time": prep["num_measures"],
+        "p_dict": prep["p_dict"],
+    }
+
+
+def get_optimum(prep):
+    """Returns the optimal energy of the qubo of the prepared problem, found by the exact mode
+
+    :param prep: Prepared problem
+    :type prep: dict
+    :return: Optimal energy, without the offset
+    :rtype: float
+    """
+    sampleset = run_sampler(prep["qubo"], "exact", {}, None, get_problem(prep))
+    return float(sampleset.first.energy)
+
+
+def get_timing_fields(info):
+    """Collects the timing reported by the sampler: the entries of info["timing"] (QPU times of quantum mode, solve time
+    of exact mode) and the top-level entries ending with _time (run, charge and QPU access times of the hybrid solver)
+
+    :param info: Info of the sampleset
+    :type info: dict
+    :return: Timing fields, in the units of the sampler
+    :rtype: dict
+    """
+    fields = {}
+    for name, value in info.get("timing", {}).items():
+        if isinstance(value, (int, float, np.number)):
+            fields[f"timing.{name}"] = float(value)
+    for name, value in info.items():
+        if name.endswith("_time") and isinstance(value, (int, float, np.number)):
+            fields[f"timing.{name}"] = float(value)
+    return fields
+
+
+def benchmark_point(prep, mode, a_dict, solver, optimum, tolerance=0.0):
+    """Samples the prepared problem once with the given parameters and measures the time to solution. A read is a
+    success if its energy is optimal up to the tolerance, relative to the absolute value of the optimum
+
+    :param prep: Prepared problem
+    :type prep: dict
+    :param mode: Simulation mode
+    :type mode: string
+    :param a_dict: Dictionary containing annealing parameters
+    :type a_dict: dictionary
+    :param solver: D-Wave solver
+    :type solver: string
+    :param optimum: Optimal energy
+    :type optimum: float
+    :param tolerance: Relative tolerance of a success
+    :type tolerance: float
+    :return: Row of the benchmark
+    :rtype: dict
+    """
+    load_average = os.getloadavg()[0]
+    start_time, start_cpu = time.perf_counter(), time.process_time()
+    sampleset = run_sampler(prep["qubo"], mode, a_dict, solver, get_problem(prep))
+    wall_time = time.perf_counter() - start_time
+    cpu_time = time.process_time() - start_cpu
+
+    record = sampleset.record
+    occurrences = record.num_occurrences
+    reads = int(occurrences.sum())
+    success = record.energy <= optimum + tolerance * abs(optimum) + 1e-9
+    success_probability = float(occurrences[success].sum() / reads)
+    entropy, feasible = evaluate_samples(
+        sampleset_to_job_matrix(sampleset, prep["job_list"]),
+        prep["M"],
+        prep["num_measures"],
+        prep["job_list"],
+    )[:2]
+    time_per_read = wall_time / reads
+    row = {
+        "problem": prep["out_file_name"],
+        "mode": mode,
+        "solver": solver if mode == "quantum" else None,
+        **{f"a_dict.{name}": value for name, value in sorted(a_dict.items())},
+        "reads": reads,
+        "wall_time": wall_time,
+        "cpu_time": cpu_time,
+        "load_average": load_average,
+        "optimum": optimum,
+        "best_energy": float(record.energy.min()),
+        "best_entropy": float(entropy[feasible].min()) if feasible.any() else None,
+        "feasible_probability": float(occurrences[feasible].sum() / reads),
+        "success_probability": success_probability,
+        "time_per_read": time_per_read,
+        "tts99": time_to_solution(success_probability, time_per_read, TTS_TARGET),
+    }
+    row.update(get_timing_fields(sampleset.info))
+    if "timing.qpu_access_time" in row:
+        # QPU times are in microseconds
+        qpu_time_per_read = row["timing.qpu_access_time"] * 1e-6 / reads
+        row["tts99_qpu"] = time_to_solution(
+            success_probability, qpu_time_per_read, TTS_TARGET
+        )
+    return row
+
+
+def run_tts_benchmark(
+    prep,
+    modes,
+    solver,
+    num_reads,
+    num_sweeps,
+    annealing_times,
+    chains_str,
+    repeats=1,
+    tolerance=0.0,
+    a_extra=None,
+):
+    """Runs each point of the grid of each mode repeats times, see benchmark_point. The grids are those of
+    benchmarking_exp.get_grid, the exact mode is a single point
+
+    :param prep: Prepared problem
+    :type prep: dict
+    :param modes: Simulation modes
+    :type modes: list
+    :param solver: D-Wave solver
+    :type solver: string
+    :param num_reads: Numbers of reads
+    :type num_reads: list
+    :param num_sweeps: Numbers of sweeps
+    :type num_sweeps: list
+    :param annealing_times: Annealing times, paired with the numbers of reads in quantum mode
+    :type annealing_times: list
+    :param chains_str: Relative chain strengths
+    :type chains_str: list
+    :param repeats: Number of runs of each point
+    :type repeats: int
+    :param tolerance: Relative tolerance of a success
+    :type tolerance: float
+    :param a_extra: Annealing parameters added to each point, e.g. the seed, workers or warm start
+    :type a_extra: dict
+    :return: Rows of the benchmark
+    :rtype: list
+    """
+    a_extra = a_extra or {}
+    optimum = get_optimum(prep)
+    rows = []
+    for mode in modes:
+        for _, _, a_dict in get_grid(
+            mode, chains_str, annealing_times, num_reads, num_sweeps
+        ):
+            for repeat in range(repeats):
+                point = dict(a_dict, **a_extra)
+                if point.get("seed") is not None:
+                    point["seed"] += repeat
+                row = benchmark_point(prep, mode, point, solver, optimum, tolerance)
+                row["repeat"] = repeat
+                logging.info(f"TTS benchmark {row}")
+                print(
+                    f"{mode} {a_dict}: success {row['success_probability']:.3f}, "
+                    f"TTS99 {row['tts99']:.4f} s"
+                )
+                rows.append(row)
+    return rows
+
+
+def summarize_tts(rows):
+    """Pools the repeats of each point: the success probability is that of all their reads and the time to solution
+    uses the mean time per read
+
+    :param rows: Rows of the benchmark
+    :type rows: list
+    :return: Summary of each mode and parameter set
+    :rtype: pandas.DataFrame
+    """
+    df = pd.DataFrame(rows)
+    df["successes"] = df["success_probability"] * df["reads"]
+    keys = [
+        c
+        for c in df.columns
+        if c in ["problem", "mode", "solver"]
+        or (c.startswith("a_dict.") and c != "a_dict.seed")
+    ]
+    summary = (
+        df.groupby(keys, dropna=False)
+        .agg(
+            repeats=("repeat", "count"),
+            reads=("reads", "sum"),
+            successes=("successes", "sum"),
+            time_per_read=("time_per_read", "mean"),
+            best_energy=("best_energy", "min"),
+            optimum=("optimum", "first"),
+        )
+        .reset_index()
+    )
+    summary["success_probability"] = summary["successes"] / summary["reads"]
+    summary["tts99"] = [
+        time_to_solution(p, t, TTS_TARGET)
+        for p, t in zip(summary["success_probability"], summary["time_per_read"])
+    ]
+    return summary.drop(columns="successes")
+
+
+def store_tts_rows(rows, path):
+    """Stores the rows of the benchmark as json and csv, and their summary as csv
+
+    :param rows: Rows of the benchmark
+    :type rows: list
+    :param path: Path of the files, without extension
+    :type path: string
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(f"{path}.json", "w") as handle:
+        # infinite times to solution are written as Infinity
+        json.dump(rows, handle, indent=1)
+    pd.DataFrame(rows).to_csv(f"{path}.csv", index=False)
+    summarize_tts(rows).to_csv(f"{path}_summary.csv", index=False)
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("midi", type=str)
+    parser.add_argument("--measures", type=int, required=False, default=-1)
+    parser.add_argument("--tracks", type=int, required=False, default=2)
+    parser.add_argument(
+        "--modes",
+        type=str,
+        nargs="+",
+        required=False,
+        default=["sim"],
+        choices=["sim", "quantum", "hyb", "exact"],
+    )
+    parser.add_argument("--nr", type=int, nargs="+", required=False, default=[100])
+    parser.add_argument(
+        "--ns", type=int, nargs="+", required=False, default=[100, 1000]
+    )
+    parser.add_argument("--t", type=int, nargs="+", required=False, default=[20])
+    parser.add_argument(
+        "--rcs", type=float, nargs="+", required=False, default=[0.2]
+    )
+    parser.add_argument(
+        "--solver", type=str, required=False, default="Advantage_system4.1"
+    )
+    parser.add_argument("--repeats", type=int, required=False, default=1)
+    parser.add_argument("--tolerance", type=float, required=False, default=0.0)
+    parser.add_argument("--workers", type=int, required=False, default=1)
+    parser.add_argument("--seed", type=int, required=False, default=None)
+    parser.add_argument("--warm-start", action="store_true")
+    parser.add_argument("--collapse", action="store_true")
+    args = parser.parse_args()
+
+    folder_dict = {
+        "midi_folder": "midi",
+        "phrase_folder": "phrases",
+        "results_folder": "results",
+        "cache_folder": "qubo_cache",
+    }
+    os.makedirs("results", exist_ok=True)
+    logging.basicConfig(
+        filename=get_file_path("results", "results_benchmarking.log"),
+        level=logging.INFO,
+    )
+
+    prep = prepare_experiment(
+        args.midi, folder_dict, args.measures, args.tracks, collapse=args.collapse
+    )
+    a_extra = {"workers": args.workers, "seed": args.seed}
+    if args.warm_start:
+        a_extra["warm"] = True
+    rows = run_tts_benchmark(
+        prep,
+        args.modes,
+        args.solver,
+        args.nr,
+        args.ns,
+        args.t,
+        args.rcs,
+        args.repeats,
+        args.tolerance,
+        a_extra,
+    )
+    name = prep["out_file_name"]
+    if args.collapse:
+        name = f"{name}_col"
+    out_p = get_file_path(
+        get_file_path("results", "tts"), f"{name}_{'_'.join(args.modes)}"
+    )
+    store_tts_rows(rows, out_p)
+    print(f"Benchmark written to {out_p}.json and {out_p}.csv")
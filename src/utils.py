@@ -1,7 +1,12 @@
+import hashlib
+import json
 import os
 import pickle
+import shutil
 
 import dimod
+import numpy as np
+from dimod.serialization.utils import deserialize_ndarrays, serialize_ndarrays
 
 
 def get_file_path(folder, file_name):
@@ -17,26 +22,225 @@ def get_file_path(folder, file_name):
     return os.path.join(folder, file_name)
 
 
-def store_result(file_name: str, sampleset: dimod.SampleSet):
-    """Save samples to the file
+SAMPLESET_FORMAT_VERSION = 1
+
+
+def get_jobs_digest(job_list) -> str:
+    """Returns a digest of the ids, starts, ends, weights and tracks of the jobs, which changes with the job list, e.g.
+    when the phrases of a file change
+
+    :param job_list: list of jobs
+    :type job_list: JobCollector
+    :return: hexadecimal digest
+    :rtype: str
+    """
+    digest = hashlib.sha256()
+    for column in [
+        job_list.ids,
+        job_list.starts,
+        job_list.ends,
+        job_list.weights,
+        job_list.tracks,
+    ]:
+        digest.update(np.ascontiguousarray(column).tobytes())
+    return digest.hexdigest()
+
+
+def check_job_variables(variables, job_list):
+    """Checks that the job variables x_* of the samples are those of the job list. Samples of another job list would
+    otherwise be read with shifted ids
+
+    :param variables: variable labels of the samples
+    :type variables: list
+    :param job_list: list of jobs
+    :type job_list: JobCollector
+    :raises ValueError: if the job variables differ
+    """
+    stored = {v for v in variables if isinstance(v, str) and v.startswith("x_")}
+    expected = {f"x_{id}" for id in job_list.ids}
+    if stored != expected:
+        raise ValueError(
+            f"The samples hold {len(stored)} job variables and the job list "
+            f"{len(expected)} jobs, {len(stored ^ expected)} of them differ: "
+            "the samples were sampled from another job list"
+        )
+
+
+def check_result_jobs(file_name: str, job_list, variables: list):
+    """Checks that the samples stored in the file were sampled from the job list, with the digest of the jobs stored by
+    store_result, if any, and the job variables
 
     :param file_name: name of the file
     :type file_name: str
+    :param job_list: list of jobs
+    :type job_list: JobCollector
+    :param variables: variable labels of the samples
+    :type variables: list
+    :raises ValueError: if the samples belong to another job list
+    """
+    if os.path.isdir(file_name):
+        digest = load_result_header(file_name).get("jobs")
+        if digest is not None and digest != get_jobs_digest(job_list):
+            raise ValueError(
+                f"The samples in {file_name} were sampled from another job list"
+            )
+    check_job_variables(variables, job_list)
+
+
+def store_result(file_name: str, sampleset: dimod.SampleSet, job_list=None):
+    """Save samples to a folder in a columnar format: the samples are bit-packed into samples.npy, each other field of the
+    record (energy, num_occurrences, ...) is stored in its own array and header.json holds the variable labels, the
+    vartype and the info of the sampleset, and the digest of the job list the samples were sampled from, if given
+
+    :param file_name: name of the folder
+    :type file_name: str
     :param sampleset: samples
     :type sampleset: dimod.SampleSet
+    :param job_list: list of jobs of the samples
+    :type job_list: JobCollector
+    """
+    record = sampleset.record
+    fields = [name for name in record.dtype.names if name != "sample"]
+    header = {
+        "version": SAMPLESET_FORMAT_VERSION,
+        "variables": list(sampleset.variables),
+        "vartype": sampleset.vartype.name,
+        "sample_dtype": record.sample.dtype.str,
+        "num_rows": len(record),
+        "fields": fields,
+        "info": serialize_ndarrays(sampleset.info),
+        "jobs": None if job_list is None else get_jobs_digest(job_list),
+    }
+    # numpy scalars are stored as numbers, other objects (e.g. warning classes) as their repr
+    header = json.dumps(
+        header, default=lambda x: x.item() if isinstance(x, np.generic) else repr(x)
+    )
+    temp = f"{file_name}.{os.getpid()}.tmp"
+    os.makedirs(temp, exist_ok=True)
+    np.save(os.path.join(temp, "samples.npy"), np.packbits(record.sample > 0, axis=1))
+    for name in fields:
+        np.save(os.path.join(temp, f"{name}.npy"), record[name])
+    with open(os.path.join(temp, "header.json"), "w") as handle:
+        handle.write(header)
+    if os.path.isdir(file_name):
+        shutil.rmtree(file_name)
+    elif os.path.exists(file_name):
+        os.remove(file_name)
+    os.makedirs(os.path.dirname(file_name) or ".", exist_ok=True)
+    os.replace(temp, file_name)
+
+
+def load_result_header(file_name: str) -> dict:
+    """Load the header of samples stored by store_result
+
+    :param file_name: name of the folder
+    :type file_name: str
+    :return: header, with the variable labels restored
+    :rtype: dict
     """
-    sdf = sampleset.to_serializable()
-    with open(file_name, "wb") as handle:
-        pickle.dump(sdf, handle)
+    with open(os.path.join(file_name, "header.json")) as handle:
+        header = json.load(handle)
+    header["variables"] = [
+        tuple(v) if isinstance(v, list) else v for v in header["variables"]
+    ]
+    return header
 
 
-def load_result(file_name: str) -> dimod.SampleSet:
-    """Load samples from the file
+def load_result_field(file_name: str, name: str) -> np.ndarray:
+    """Load a single field of the record, such as the energies, memory-mapped
+
+    :param file_name: name of the folder
+    :type file_name: str
+    :param name: name of the field
+    :type name: str
+    :return: values of the field
+    :rtype: numpy.ndarray
+    """
+    return np.load(os.path.join(file_name, f"{name}.npy"), mmap_mode="r")
+
+
+def load_result_columns(file_name: str, variables: list) -> np.ndarray:
+    """Load the values of the given variables in all samples. Only the bytes holding these variables are read from the
+    memory-mapped samples
+
+    :param file_name: name of the folder
+    :type file_name: str
+    :param variables: variable labels
+    :type variables: list
+    :return: matrix of shape (number of samples, number of variables)
+    :rtype: numpy.ndarray
+    """
+    header = load_result_header(file_name)
+    index = {v: i for i, v in enumerate(header["variables"])}
+    columns = np.array([index[v] for v in variables], dtype=np.int64)
+    packed = np.load(os.path.join(file_name, "samples.npy"), mmap_mode="r")
+    bytes_used, inverse = np.unique(columns // 8, return_inverse=True)
+    bits = (packed[:, bytes_used][:, inverse] >> (7 - columns % 8)) & 1
+    bits = bits.astype(header["sample_dtype"])
+    if header["vartype"] == "SPIN":
+        return 2 * bits - 1
+    return bits
+
+
+def load_result_jobs(file_name: str, job_list) -> np.ndarray:
+    """Load the job variables of all samples, ordered as in the job list
+
+    :param file_name: name of the folder
+    :type file_name: str
+    :param job_list: list of jobs
+    :type job_list: JobCollector
+    :return: matrix of shape (number of samples, number of jobs)
+    :rtype: numpy.ndarray
+    :raises ValueError: if the samples were sampled from another job list
+    """
+    check_result_jobs(file_name, job_list, load_result_header(file_name)["variables"])
+    return load_result_columns(file_name, [f"x_{id}" for id in job_list.ids])
+
+
+def load_result(file_name: str, job_list=None) -> dimod.SampleSet:
+    """Load samples from the file, either stored by store_result or pickled in the previous format
 
     :param file_name: name of the file
     :type file_name: str
+    :param job_list: if given, the samples are checked to be sampled from this list of jobs
+    :type job_list: JobCollector
     :return: loaded samples
     :rtype: dimod.SampleSet
+    :raises ValueError: if the samples were sampled from another job list
+    """
+    if not os.path.isdir(file_name):
+        file = pickle.load(open(file_name, "rb"))
+        sampleset = dimod.SampleSet.from_serializable(file)
+        if job_list is not None:
+            check_result_jobs(file_name, job_list, sampleset.variables)
+        return sampleset
+    header = load_result_header(file_name)
+    variables = header["variables"]
+    if job_list is not None:
+        check_result_jobs(file_name, job_list, variables)
+    packed = np.load(os.path.join(file_name, "samples.npy"))
+    samples = np.unpackbits(packed, axis=1, count=len(variables))
+    samples = samples.astype(header["sample_dtype"])
+    vartype = dimod.Vartype[header["vartype"]]
+    if vartype is dimod.SPIN:
+        samples = 2 * samples - 1
+    vectors = {
+        name: np.load(os.path.join(file_name, f"{name}.npy"))
+        for name in header["fields"]
+    }
+    return dimod.SampleSet.from_samples(
+        (samples, variables),
+        vartype,
+        info=deserialize_ndarrays(header["info"]),
+        sort_labels=False,
+        **vectors,
+    )
+
+
+def convert_result(file_name: str):
+    """Convert samples pickled in the previous format to the format of store_result, in place
+
+    :param file_name: name of the file
+    :type file_name: str
     """
-    file = pickle.load(open(file_name, "rb"))
-    return dimod.SampleSet.from_serializable(file)
+    store_result(file_name, load_result(file_name))
@@ -0,0 +1,135 @@
+import re
+
+import dimod
+import neal
+import numpy as np
+
+from postprocess import get_incidence_matrix
+from qubo import encode_slack
+
+WARM_START_NOISE = 0.3
+
+WARM_START_SWEEP_FRACTION = 0.1
+
+WARM_START_BETA_FACTOR = 10
+
+REVERSE_ANNEAL_POINT = 0.45
+
+
+def greedy_selections(job_list, M, max_time, num_states, seed=None, fixed=None):
+    """Builds feasible job selections greedily, in the manner of greedy_machines: the jobs are visited in decreasing
+    order of weight per measure and each one is added if it fits into the idle tracks. Ranking by the total weight
+    instead favours the long phrases, which block many measures. The first selection follows the ranking exactly, for
+    the others the ranking is perturbed by random factors, so that the seed states differ
+
+    :param job_list: List of jobs
+    :type job_list: list
+    :param M: Number of tracks
+    :type M: int
+    :param max_time: Maximum time
+    :type max_time: int
+    :param num_states: Number of selections
+    :type num_states: int
+    :param seed: Seed of the perturbations
+    :type seed: int
+    :param fixed: Mask of the jobs that are selected first, which must not overload any time point themselves
+    :type fixed: numpy.ndarray
+    :return: Selections, ordered as in the job list, and number of jobs running at each time point, for each selection
+    :rtype: tuple(numpy.ndarray, numpy.ndarray)
+    """
+    incidence = get_incidence_matrix(job_list, max_time).astype(np.int64)
+    steps = [np.flatnonzero(row) for row in incidence]
+    weights = job_list.weights
+    density = weights / np.maximum(incidence.sum(axis=1), 1)
+    rng = np.random.default_rng(seed)
+    selected = np.zeros((num_states, len(job_list)), dtype=np.int8)
+    load = np.zeros((num_states, max_time), dtype=np.int64)
+    if fixed is not None:
+        selected[:, fixed] = 1
+        load += incidence[fixed].sum(axis=0)
+    for state in range(num_states):
+        score = density
+        if state > 0:
+            noise = rng.standard_normal(len(density))
+            score = density * np.exp(WARM_START_NOISE * noise)
+        for job in np.argsort(-score, kind="stable"):
+            if (
+                not selected[state, job]
+                and weights[job] > 0
+                and (load[state, steps[job]] < M).all()
+            ):
+                selected[state, job] = 1
+                load[state, steps[job]] += 1
+    return selected, load
+
+
+def warm_start_states(
+    variables, job_list, M, max_time, num_states, seed=None, fixed=None
+):
+    """Builds seed states of the qubo from greedy_selections. The slack variables are set to the number of idle tracks,
+    so that the at most M penalty of the seed states is zero. The exactly M penalty is not, wherever a measure has idle
+    tracks
+
+    :param variables: Variables of the qubo
+    :type variables: list
+    :param job_list: List of jobs
+    :type job_list: list
+    :param M: Number of tracks
+    :type M: int
+    :param max_time: Maximum time
+    :type max_time: int
+    :param num_states: Number of states
+    :type num_states: int
+    :param seed: Seed of the perturbations
+    :type seed: int
+    :param fixed: Mask of the jobs that are selected in all states
+    :type fixed: numpy.ndarray
+    :return: States and their variables
+    :rtype: tuple(numpy.ndarray, list)
+    """
+    variables = list(variables)
+    selected, load = greedy_selections(
+        job_list, M, max_time, num_states, seed, fixed
+    )
+    rows = {f"x_{id}": row for row, id in enumerate(job_list.ids)}
+    states = np.zeros((num_states, len(variables)), dtype=np.int8)
+    for column, v in enumerate(variables):
+        match = re.fullmatch(r"slack(\d+)\[(\d+)\]", str(v))
+        if match:
+            t, k = int(match.group(1)), int(match.group(2))
+            states[:, column] = encode_slack(np.maximum(M - load[:, t - 1], 0), M)[k]
+        elif v in rows:
+            states[:, column] = selected[:, rows[v]]
+    return states, variables
+
+
+def reverse_anneal_schedule(annealing_time, s=REVERSE_ANNEAL_POINT):
+    """Returns the schedule of reverse annealing: the anneal goes back from the seed state to s in a quarter of the
+    annealing time, pauses there for half of it, and goes forward again
+
+    :param annealing_time: Annealing time in microseconds
+    :type annealing_time: float
+    :param s: Reversal point
+    :type s: float
+    :return: Anneal schedule, as pairs of time and anneal fraction
+    :rtype: list
+    """
+    return [
+        [0.0, 1.0],
+        [annealing_time / 4, s],
+        [annealing_time * 3 / 4, s],
+        [annealing_time, 1.0],
+    ]
+
+
+def warm_beta_range(qubo):
+    """Returns the inverse temperatures of simulated annealing from seed states. The anneal starts at the final
+    temperature of the default schedule, where the seed states are not scrambled, and cools further to refine them
+
+    :param qubo: QUBO formulation for the problem
+    :type qubo: dictionary
+    :return: Initial and final inverse temperatures
+    :rtype: tuple(float, float)
+    """
+    cold = neal.default_beta_range(dimod.BinaryQuadraticModel.from_qubo(qubo))[1]
+    return cold, cold * WARM_START_BETA_FACTOR
@@ -0,0 +1,71 @@
+import functools
+import os
+import sys
+
+import numpy as np
+import pytest
+from music21 import converter
+
+SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+sys.path.insert(0, SRC)
+
+from jobs import JobCollector  # noqa: E402
+
+MIDI_FOLDER = os.path.join(SRC, "midi")
+
+MIDI_FILES = ["bach-air-score.mid", "Symphony_No._7_2nd_Movement.mid"]
+
+
+def random_job_list(rng, num_jobs, max_time, max_weight=1.0, tracks=3):
+    """Creates a random job list, with jobs starting anywhere from time 0 and ending by max_time
+
+    :param rng: Random generator
+    :type rng: numpy.random.Generator
+    :param num_jobs: Number of jobs
+    :type num_jobs: int
+    :param max_time: Maximum time
+    :type max_time: int
+    :param max_weight: Maximum weight
+    :type max_weight: float
+    :param tracks: Number of tracks the jobs are spread over
+    :type tracks: int
+    :return: List of jobs
+    :rtype: JobCollector
+    """
+    job_list = JobCollector()
+    for _ in range(num_jobs):
+        start = int(rng.integers(0, max_time))
+        end = int(rng.integers(start + 1, max_time + 1))
+        job_list.new_job(
+            start, end, float(rng.random() * max_weight), int(rng.integers(tracks))
+        )
+    return job_list
+
+
+@pytest.fixture
+def rng():
+    return np.random.default_rng(0)
+
+
+@pytest.fixture
+def make_jobs(rng):
+    """Factory of random job lists drawn from the seeded generator of the test"""
+    return lambda num_jobs, max_time, **kwargs: random_job_list(
+        rng, num_jobs, max_time, **kwargs
+    )
+
+
+@pytest.fixture(params=MIDI_FILES)
+def midi_path(request):
+    return os.path.join(MIDI_FOLDER, request.param)
+
+
+@functools.lru_cache(maxsize=None)
+def parse_score(midi_path):
+    """Parses a midi file with music21 and strips the ties, as the note table does, once per test session"""
+    return converter.parse(midi_path).stripTies()
+
+
+@pytest.fixture
+def score(midi_path):
+    return parse_score(midi_path)
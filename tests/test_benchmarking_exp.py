@@ -0,0 +1,78 @@
+import json
+
+import benchmarking_exp
+from benchmarking_exp import get_grid, get_progress_path, load_progress, run_grid
+from calibration import DEFAULT_PENALTY_MULTIPLIERS
+
+
+def tiny_prep(tmp_path, **kwargs):
+    """A prepared problem with only the entries that name the progress file"""
+    prep = {
+        "out_file_name": "bach_4_2",
+        "folder_dict": {"results_folder": str(tmp_path / "results")},
+        "multipliers": dict(DEFAULT_PENALTY_MULTIPLIERS),
+        "collapse": False,
+        "builder": "direct",
+    }
+    prep.update(kwargs)
+    return prep
+
+
+def fake_run_point(calls):
+    """Replaces run_point, recording the points it evaluates"""
+
+    def run_point(mode, a_dict, solver, load, log):
+        calls.append(a_dict)
+        return {"found": False, "num_occurrences": a_dict["nr"], "M_violate": 0}
+
+    return run_point
+
+
+def test_progress_path_follows_the_variant(tmp_path):
+    default = get_progress_path(tiny_prep(tmp_path), "sim", None)
+    assert default.endswith("bach_4_2_sim.jsonl")
+    variants = [
+        tiny_prep(tmp_path, multipliers={"exact": 1, "less": 4}),
+        tiny_prep(tmp_path, collapse=True),
+        tiny_prep(tmp_path, builder="pyqubo"),
+    ]
+    paths = {get_progress_path(prep, "sim", None) for prep in variants}
+    assert len(paths) == len(variants) and default not in paths
+
+
+def test_grid_resumes_from_the_progress_file(tmp_path, monkeypatch):
+    prep = tiny_prep(tmp_path)
+    points = get_grid("sim", [], [], [5, 10], [10, 20])
+    calls = []
+    monkeypatch.setattr(benchmarking_exp, "run_point", fake_run_point(calls))
+
+    summaries = run_grid(prep, "sim", points, None, False, False, workers=1)
+    assert calls == [a_dict for _, _, a_dict in points]
+    assert summaries[(10, 20)]["num_occurrences"] == 10
+
+    # an interruption while the last point was written
+    progress_p = get_progress_path(prep, "sim", None)
+    with open(progress_p) as handle:
+        lines = handle.readlines()
+    with open(progress_p, "w") as handle:
+        handle.writelines(lines[:-1])
+        handle.write(lines[-1][: len(lines[-1]) // 2])
+    done = load_progress(progress_p)
+    assert len(done) == len(points) - 1
+    assert all("a_dict" not in entry for entry in done.values())
+
+    calls.clear()
+    resumed = run_grid(prep, "sim", points, None, False, False, workers=1)
+    assert calls == [points[-1][2]]
+    assert resumed == summaries
+
+    calls.clear()
+    run_grid(prep, "sim", points, None, False, False, workers=1)
+    assert calls == []
+    with open(progress_p) as handle:
+        entries = [json.loads(line) for line in handle if line.endswith("\n")]
+    assert len(entries) == len(points)
+
+    # without resuming, every point runs again
+    run_grid(prep, "sim", points, None, False, False, workers=1, resume=False)
+    assert len(calls) == len(points)
@@ -0,0 +1,175 @@
+import itertools
+import math
+import os
+import shutil
+
+import numpy as np
+import pytest
+
+import calibration
+import main
+from calibration import (
+    CALIBRATION_TOLERANCE,
+    DEFAULT_PENALTY_MULTIPLIERS,
+    EXACT_MULTIPLIERS,
+    LESS_MULTIPLIERS,
+    calibrate_penalties,
+    get_calibration_path,
+    get_p_dict,
+    load_calibration,
+    probe_penalties,
+    store_calibration,
+    time_to_solution,
+)
+from conftest import MIDI_FOLDER
+from experiment import sim_anneal
+from jobs import max_weight_phrase
+from main import calibrate_experiment, prepare_experiment
+from postprocess import get_total_entropy, is_sample_feasible
+from qubo import get_qubo_direct
+
+M, MAX_TIME = 2, 6
+
+
+def reference_cost(sample, job_list, p):
+    """Reference: the entropy plus the exactly M penalty of the default multipliers at each time point with running
+    jobs"""
+    cost = get_total_entropy(sample, job_list)
+    for t in range(1, MAX_TIME + 1):
+        running = [job.id for job in job_list.jobs if job.start < t <= job.end]
+        if running:
+            idle = max(M - sum(sample[f"x_{id}"] for id in running), 0)
+            cost += get_p_dict(p, DEFAULT_PENALTY_MULTIPLIERS)["exact"] * idle**2
+    return cost
+
+
+def brute_force_optimum(job_list, p):
+    """Reference: the lowest cost of the feasible selections, over all of them"""
+    best = math.inf
+    for bits in itertools.product([0, 1], repeat=len(job_list)):
+        sample = {f"x_{id}": bit for id, bit in zip(job_list.ids, bits)}
+        if is_sample_feasible(sample, M, MAX_TIME, job_list):
+            best = min(best, reference_cost(sample, job_list, p))
+    return best
+
+
+@pytest.fixture
+def job_list(make_jobs):
+    return make_jobs(9, MAX_TIME)
+
+
+def test_time_to_solution():
+    assert time_to_solution(0.0, 2.0) == math.inf
+    assert time_to_solution(0.995, 2.0) == 2.0
+    assert time_to_solution(0.5, 2.0) == pytest.approx(2.0 * math.log2(100))
+
+
+def test_probe_rates(job_list):
+    p = max_weight_phrase(job_list)
+    optimum = brute_force_optimum(job_list, p)
+    multipliers = {"exact": 1, "less": 2}
+    reads, sweeps, seed = 40, 30, 5
+    probe = probe_penalties(
+        job_list, M, MAX_TIME, p, multipliers, optimum, reads, sweeps, seed
+    )
+    # the probe is the seeded sim_anneal run on the qubo of the multipliers
+    qubo = get_qubo_direct(job_list, M, MAX_TIME, get_p_dict(p, multipliers))[0]
+    samples = list(sim_anneal(qubo, reads, sweeps, 1, seed).samples(sorted_by=None))
+    feasible = [is_sample_feasible(s, M, MAX_TIME, job_list) for s in samples]
+    cost = [reference_cost(s, job_list, p) for s in samples]
+    bound = optimum + CALIBRATION_TOLERANCE * abs(optimum) + 1e-9
+    hits = [f and c <= bound for f, c in zip(feasible, cost)]
+    assert probe["feasible_rate"] == np.mean(feasible)
+    assert probe["hit_rate"] == np.mean(hits)
+    assert 0 < probe["hit_rate"] < 1
+    gaps = [c - optimum for f, c in zip(feasible, cost) if f]
+    assert probe["mean_gap"] == pytest.approx(np.mean(gaps))
+    assert probe["tts"] == time_to_solution(probe["hit_rate"], probe["time_per_read"])
+    assert (probe["exact"], probe["less"]) == (1, 2)
+
+
+def test_calibration_picks_the_lowest_time_to_solution(job_list):
+    best, probes = calibrate_penalties(job_list, M, MAX_TIME, 30, 30, seed=2)
+    assert [(d["exact"], d["less"]) for d in probes] == list(
+        itertools.product(EXACT_MULTIPLIERS, LESS_MULTIPLIERS)
+    )
+    assert best["tts"] == min(d["tts"] for d in probes) < math.inf
+    assert best in probes
+
+
+@pytest.mark.parametrize(
+    "table, expected",
+    [
+        # the lowest time to solution wins
+        ({(1, 2): (1e-3, 0.5, 0.0), (4, 8): (2e-4, 0.1, 3.0)}, (4, 8)),
+        # without hits, the highest feasible rate and then the lowest mean gap
+        ({(1, 2): (math.inf, 0.5, 2.0), (2, 4): (math.inf, 0.5, 1.0)}, (2, 4)),
+        ({(1, 2): (math.inf, 0.6, 2.0), (2, 4): (math.inf, 0.5, 1.0)}, (1, 2)),
+    ],
+)
+def test_calibration_ranking(monkeypatch, job_list, table, expected):
+    optima = []
+
+    def fake_probe(job_list, M, max_time, p, multipliers, optimum, *args):
+        optima.append(optimum)
+        key = (multipliers["exact"], multipliers["less"])
+        tts, feasible_rate, mean_gap = table.get(key, (math.inf, 0.0, math.inf))
+        return dict(
+            multipliers, tts=tts, feasible_rate=feasible_rate, mean_gap=mean_gap
+        )
+
+    monkeypatch.setattr(calibration, "probe_penalties", fake_probe)
+    best, probes = calibrate_penalties(job_list, M, MAX_TIME)
+    assert (best["exact"], best["less"]) == expected
+    assert len(probes) == len(EXACT_MULTIPLIERS) * len(LESS_MULTIPLIERS)
+    # the optimum comes from exact_schedule
+    p = max_weight_phrase(job_list)
+    assert optima[0] == pytest.approx(brute_force_optimum(job_list, p))
+    assert len(set(optima)) == 1
+
+
+def test_calibration_is_reused(tmp_path, monkeypatch):
+    # the note table snapshot is stored next to the midi file, so the file is copied
+    midi_folder = tmp_path / "midi"
+    midi_folder.mkdir()
+    shutil.copy(os.path.join(MIDI_FOLDER, "bach-air-score.mid"), midi_folder)
+    folder_dict = {
+        "midi_folder": str(midi_folder),
+        "phrase_folder": str(tmp_path / "phrases"),
+        "results_folder": str(tmp_path / "results"),
+    }
+    os.makedirs(folder_dict["phrase_folder"])
+    prep = prepare_experiment("bach-air-score.mid", folder_dict, 6, 2)
+    assert prep["multipliers"] == DEFAULT_PENALTY_MULTIPLIERS
+
+    rates = {"hit_rate": 0.5, "feasible_rate": 1.0, "mean_gap": 0.1}
+    best = dict(rates, exact=1, less=8, tts=1e-3)
+    probes = [best, dict(rates, exact=2, less=4, tts=2e-3)]
+    monkeypatch.setattr(
+        main, "calibrate_penalties", lambda *args, **kwargs: (best, probes)
+    )
+    calibrated = calibrate_experiment(prep, {"seed": 0})
+    multipliers = {"exact": 1, "less": 8}
+    p_dict = get_p_dict(max_weight_phrase(prep["job_list"]), multipliers)
+    assert calibrated["multipliers"] == multipliers
+    assert calibrated["p_dict"] == p_dict
+    qubo = get_qubo_direct(prep["job_list"], 2, prep["num_measures"], p_dict)[0]
+    assert calibrated["qubo"] == qubo
+    # the prepared problem given is left as it was
+    assert prep["multipliers"] == DEFAULT_PENALTY_MULTIPLIERS
+
+    path = get_calibration_path(folder_dict)
+    assert load_calibration(path)[prep["out_file_name"]] == dict(best, probes=probes)
+    reused = prepare_experiment("bach-air-score.mid", folder_dict, 6, 2)
+    assert reused["multipliers"] == multipliers
+    assert reused["qubo"] == qubo
+    # other problems keep the default multipliers
+    other = prepare_experiment("bach-air-score.mid", folder_dict, 6, 3)
+    assert other["multipliers"] == DEFAULT_PENALTY_MULTIPLIERS
+
+    # calibrating again to the stored multipliers keeps the prepared problem
+    assert calibrate_experiment(reused, {"seed": 0}) is reused
+    # a later calibration replaces the stored one
+    store_calibration(path, prep["out_file_name"], dict(best, exact=2, less=4), [])
+    reused = prepare_experiment("bach-air-score.mid", folder_dict, 6, 2)
+    assert reused["multipliers"] == DEFAULT_PENALTY_MULTIPLIERS
@@ -0,0 +1,93 @@
+import dimod
+import numpy as np
+import pytest
+
+from decomposition import decomposed_anneal, get_blocks, get_cut_points
+from exact import exact_solve
+from jobs import JobCollector
+from qubo import get_qubo_direct
+
+P_DICT = {"exact": 2.0, "less": 4.0}
+
+
+def short_job_list(rng, num_jobs, max_time, max_length=3):
+    """Jobs of at most max_length time points, so that the timeline has cut points"""
+    job_list = JobCollector()
+    for _ in range(num_jobs):
+        start = int(rng.integers(0, max_time))
+        end = min(start + int(rng.integers(1, max_length + 1)), max_time)
+        job_list.new_job(start, end, float(rng.random()), int(rng.integers(3)))
+    return job_list
+
+
+def test_cut_points_match_full_scan(rng, make_jobs):
+    for num_jobs, max_time in [(0, 5), (3, 6), (8, 20), (20, 30)]:
+        for job_list in [
+            short_job_list(rng, num_jobs, max_time),
+            make_jobs(num_jobs, max_time),
+        ]:
+            expected = [
+                c
+                for c in range(max_time + 1)
+                if not any(job.start < c < job.end for job in job_list.jobs)
+            ]
+            assert get_cut_points(job_list, max_time).tolist() == expected
+
+
+@pytest.mark.parametrize("min_measures", [1, 3, 8])
+def test_blocks_partition_the_jobs(rng, min_measures):
+    max_time = 40
+    job_list = short_job_list(rng, 25, max_time)
+    cuts = get_cut_points(job_list, max_time).tolist()
+    blocks = get_blocks(job_list, max_time, min_measures)
+    ids = [job.id for _, _, block in blocks for job in block.jobs]
+    assert sorted(ids) == sorted(job_list.ids.tolist())
+    for k, (first, last, block) in enumerate(blocks):
+        assert first in cuts and (last in cuts or last == max_time)
+        if k + 1 < len(blocks):
+            assert last - first >= min_measures
+            assert last <= blocks[k + 1][0]
+        for job in block.jobs:
+            assert first <= job.start and job.end <= last
+        # the jobs of a block keep the order of the job list
+        rows = [job_list.index[id] for id in block.ids.tolist()]
+        assert rows == sorted(rows)
+
+
+@pytest.mark.parametrize("collapse", [False, True])
+@pytest.mark.parametrize("workers", [1, 2])
+def test_exact_blocks_match_exact_solve(rng, collapse, workers):
+    M, max_time = 2, 30
+    for _ in range(5):
+        job_list = short_job_list(rng, 20, max_time)
+        qubo = get_qubo_direct(job_list, M, max_time, P_DICT, collapse)[0]
+        problem = {
+            "job_list": job_list,
+            "M": M,
+            "max_time": max_time,
+            "p_dict": P_DICT,
+        }
+        expected = exact_solve(qubo, problem)
+
+        sampleset = decomposed_anneal(
+            job_list,
+            M,
+            max_time,
+            P_DICT,
+            "exact",
+            {"workers": workers},
+            collapse=collapse,
+        )
+        assert len(get_blocks(job_list, max_time)) > 1
+        assert len(sampleset) == 1
+        assert set(sampleset.variables) == set(expected.variables)
+        # the stitched energy is the energy in the qubo of the whole problem
+        bqm = dimod.BinaryQuadraticModel.from_qubo(qubo)
+        energy = bqm.energies(sampleset)
+        assert sampleset.first.energy == pytest.approx(energy[0])
+        assert sampleset.first.energy == pytest.approx(expected.first.energy)
+        jobs = [f"x_{id}" for id in job_list.ids]
+        assert np.array_equal(
+            [sampleset.first.sample[v] for v in jobs],
+            [expected.first.sample[v] for v in jobs],
+        )
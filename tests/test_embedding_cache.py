@@ -0,0 +1,106 @@
+import json
+import os
+
+import pytest
+from dwave.embedding import is_valid_embedding
+
+import embedding_cache
+from embedding_cache import (
+    chain_statistics,
+    get_cached_embedding,
+    get_embedding_cache_path,
+    get_embedding_key,
+    get_interaction_graph,
+    get_target_graph,
+    load_embedding,
+    store_embedding,
+)
+from qubo import get_qubo_direct
+
+CHIMERA = {"type": "chimera", "shape": [4]}
+PEGASUS = {"type": "pegasus", "shape": [2]}
+
+
+@pytest.fixture
+def qubo(make_jobs):
+    job_list = make_jobs(5, 4)
+    return get_qubo_direct(job_list, 2, 4, {"exact": 2.0, "less": 4.0})[0]
+
+
+def test_key_does_not_depend_on_the_qubo_order(qubo):
+    key = get_embedding_key(get_interaction_graph(qubo), CHIMERA)
+    reversed_qubo = {(v, u): bias for (u, v), bias in reversed(qubo.items())}
+    assert get_embedding_key(get_interaction_graph(reversed_qubo), CHIMERA) == key
+    assert get_embedding_key(get_interaction_graph(qubo), PEGASUS) != key
+    quadratic = next((u, v) for u, v in qubo if u != v)
+    fewer = {term: bias for term, bias in qubo.items() if term != quadratic}
+    assert get_embedding_key(get_interaction_graph(fewer), CHIMERA) != key
+
+
+def test_chain_statistics():
+    assert chain_statistics({"a": [1, 2, 3], "b": [4], "c": [5, 6]}) == {
+        "num_chains": 3,
+        "num_qubits": 6,
+        "max_chain_length": 3,
+        "mean_chain_length": 2.0,
+    }
+    assert chain_statistics({}) == {
+        "num_chains": 0,
+        "num_qubits": 0,
+        "max_chain_length": 0,
+        "mean_chain_length": 0.0,
+    }
+
+
+def test_store_and_load(tmp_path):
+    embedding = {"x_0": [3, 7], "slack1[0]": [12]}
+    path = get_embedding_cache_path(str(tmp_path / "cache"), "key")
+    store_embedding(path, embedding, CHIMERA)
+    assert load_embedding(path) == embedding
+    with open(path) as handle:
+        entry = json.load(handle)
+    assert entry["topology"] == CHIMERA
+    assert entry["statistics"] == chain_statistics(embedding)
+    assert os.listdir(tmp_path / "cache") == ["key.json"]
+
+    assert load_embedding(str(tmp_path / "missing.json")) is None
+    # a file cut while written, and one of another layout
+    with open(path, "w") as handle:
+        handle.write('{"version": 1, "embedding": {"x_0": [3')
+    assert load_embedding(path) is None
+    with open(path, "w") as handle:
+        json.dump({"version": 1}, handle)
+    assert load_embedding(path) is None
+
+
+@pytest.mark.parametrize("topology", [CHIMERA, PEGASUS])
+def test_cached_embedding(tmp_path, monkeypatch, qubo, topology):
+    graph = get_interaction_graph(qubo)
+    target = get_target_graph(topology)
+    cache_folder = str(tmp_path / "cache")
+    embedding = get_cached_embedding(qubo, topology, cache_folder, seed=1)
+    assert is_valid_embedding(embedding, graph, target)
+    path = get_embedding_cache_path(cache_folder, get_embedding_key(graph, topology))
+    assert load_embedding(path) == embedding
+
+    # a valid cached embedding is loaded, not computed again
+    def no_embedding(*args):
+        raise AssertionError("the cached embedding was not used")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(embedding_cache, "find_embedding", no_embedding)
+        assert get_cached_embedding(qubo, topology, cache_folder) == embedding
+
+    # an embedding whose chains all share one qubit is computed again and replaced
+    store_embedding(path, {str(v): [0] for v in graph.nodes}, topology)
+    embedding = get_cached_embedding(qubo, topology, cache_folder, seed=2)
+    assert is_valid_embedding(embedding, graph, target)
+    assert load_embedding(path) == embedding
+
+    # as is one that uses a qubit missing in the working graph of the QPU
+    qubit = next(iter(embedding.values()))[0]
+    working = target.copy()
+    working.remove_node(qubit)
+    embedding = get_cached_embedding(qubo, topology, cache_folder, working, seed=3)
+    assert is_valid_embedding(embedding, graph, working)
+    assert all(qubit not in chain for chain in embedding.values())
@@ -0,0 +1,32 @@
+import numpy as np
+
+from note_table import extract_note_table
+from toolbox import get_entropy, get_table_entropies, get_table_entropy
+
+
+def random_phrases(table, rng, count, max_length=8):
+    phrases = []
+    for _ in range(count):
+        track = int(rng.integers(table.num_parts))
+        start = int(rng.integers(1, table.num_measures + 1))
+        end = int(rng.integers(start, min(start + max_length, table.num_measures) + 1))
+        phrases.append((track, start, end))
+    return phrases
+
+
+def test_table_entropy_matches_music21(score):
+    table = extract_note_table(score)
+    for track, start, end in random_phrases(table, np.random.default_rng(2), 15):
+        assert get_table_entropy(table, track, start, end) == get_entropy(
+            score, track, start, end
+        )
+
+
+def test_entropies_in_one_pass(score):
+    table = extract_note_table(score)
+    phrases = random_phrases(table, np.random.default_rng(3), 400, max_length=20)
+    # phrases outside the score and of single measures
+    phrases += [(0, table.num_measures + 1, table.num_measures + 3), (0, 1, 1)]
+    entropies = get_table_entropies(table, phrases)
+    assert entropies.tolist() == [get_table_entropy(table, *phrase) for phrase in phrases]
+    assert get_table_entropies(table, []).tolist() == []
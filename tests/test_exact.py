@@ -0,0 +1,59 @@
+import dimod
+import pytest
+
+from exact import exact_schedule, exact_solve
+from jobs import JobCollector
+from qubo import get_qubo_direct, get_running_jobs
+
+
+def solve_both(job_list, M, max_time, collapse=False):
+    p = float(job_list.weights.max())
+    p_dict = {"exact": 2 * p, "less": 4 * p}
+    qubo = get_qubo_direct(job_list, M, max_time, p_dict, collapse)[0]
+    problem = {"job_list": job_list, "M": M, "max_time": max_time, "p_dict": p_dict}
+    return exact_solve(qubo, problem), dimod.ExactSolver().sample_qubo(qubo), p_dict
+
+
+@pytest.mark.parametrize("collapse", [False, True])
+def test_exact_solve_matches_exact_solver(rng, make_jobs, collapse):
+    checked = 0
+    while checked < 40:
+        M, max_time = int(rng.integers(1, 4)), int(rng.integers(2, 8))
+        job_list = make_jobs(int(rng.integers(1, 8)), max_time)
+        p = float(job_list.weights.max())
+        labels = get_qubo_direct(
+            job_list, M, max_time, {"exact": 2 * p, "less": 4 * p}, collapse
+        )[2]
+        if len(labels) > 16:
+            continue
+        solution, reference, _ = solve_both(job_list, M, max_time, collapse)
+        assert solution.first.energy == pytest.approx(
+            reference.first.energy, abs=1e-9
+        )
+        checked += 1
+
+
+def test_exact_solve_overloads_a_measure_when_cheaper():
+    # leaving tracks idle at measures 1 to 3 costs more than a fourth job at measure 3
+    job_list = JobCollector()
+    for start, end, weight in [
+        (2, 4, 0.666),
+        (2, 4, 0.87),
+        (0, 1, 0.251),
+        (0, 3, 0.165),
+        (0, 3, 0.367),
+    ]:
+        job_list.new_job(start, end, weight)
+    M, max_time = 3, 4
+    solution, reference, p_dict = solve_both(job_list, M, max_time)
+    assert solution.first.energy == pytest.approx(reference.first.energy, abs=1e-9)
+    sample = solution.first.sample
+    run_jobs_dict = get_running_jobs(job_list, max_time)
+    assert max(sum(sample[f"x_{i}"] for i in run_jobs_dict[t]) for t in run_jobs_dict) > M
+    # the best feasible selection, with its best slack values, costs more
+    feasible = exact_schedule(job_list, M, max_time, p_dict, feasible=True)
+    bqm = dimod.BinaryQuadraticModel.from_qubo(
+        get_qubo_direct(job_list, M, max_time, p_dict)[0]
+    )
+    bqm.fix_variables({f"x_{id}": int(x) for id, x in zip(job_list.ids, feasible)})
+    assert dimod.ExactSolver().sample(bqm).first.energy > reference.first.energy + 1e-9
@@ -0,0 +1,61 @@
+import dimod
+import neal
+import numpy as np
+import pytest
+
+from experiment import sim_anneal
+from qubo import get_qubo_direct
+
+NUM_SWEEPS = 50
+
+
+@pytest.fixture
+def qubo(make_jobs):
+    job_list = make_jobs(8, 6)
+    return get_qubo_direct(job_list, 2, 6, {"exact": 2.0, "less": 4.0})[0]
+
+
+def assert_same_samples(sampleset, other):
+    assert list(sampleset.variables) == list(other.variables)
+    np.testing.assert_array_equal(sampleset.record.sample, other.record.sample)
+    np.testing.assert_allclose(sampleset.record.energy, other.record.energy)
+
+
+@pytest.mark.parametrize("workers", [1, 3])
+def test_seed_is_reproducible(qubo, workers):
+    first = sim_anneal(qubo, 10, NUM_SWEEPS, workers, seed=7)
+    second = sim_anneal(qubo, 10, NUM_SWEEPS, workers, seed=7)
+    assert_same_samples(first, second)
+    assert first.info["seeds"] == second.info["seeds"]
+    other = sim_anneal(qubo, 10, NUM_SWEEPS, workers, seed=8)
+    assert first.info["seeds"] != other.info["seeds"]
+
+
+@pytest.mark.parametrize("num_reads, workers", [(10, 1), (10, 3), (2, 4)])
+def test_shards_match_seeded_neal_runs(qubo, num_reads, workers):
+    sampleset = sim_anneal(qubo, num_reads, NUM_SWEEPS, workers, seed=7)
+    assert len(sampleset) == num_reads
+    # empty shards are dropped
+    seeds = sampleset.info["seeds"]
+    assert len(seeds) == min(num_reads, workers)
+    sizes = [num_reads // workers + (i < num_reads % workers) for i in range(workers)]
+    sampler = neal.SimulatedAnnealingSampler()
+    reference = dimod.concatenate(
+        [
+            sampler.sample_qubo(qubo, num_sweeps=NUM_SWEEPS, num_reads=size, seed=seed)
+            for size, seed in zip(sizes, seeds)
+        ]
+    )
+    assert_same_samples(sampleset, reference)
+
+
+def test_unseeded_single_worker_reads(qubo):
+    sampleset = sim_anneal(qubo, 5, NUM_SWEEPS)
+    assert len(sampleset) == 5
+    assert "seeds" not in sampleset.info
+
+
+@pytest.mark.parametrize("workers", [0, -2])
+def test_workers_below_one_are_rejected(qubo, workers):
+    with pytest.raises(AssertionError):
+        sim_anneal(qubo, 5, NUM_SWEEPS, workers, seed=7)
@@ -0,0 +1,40 @@
+import numpy as np
+
+from jobs import Job, JobCollector
+
+
+def test_columns_follow_the_jobs(make_jobs):
+    # more jobs than the initial capacity of the columns, so they grow a few times
+    job_list = make_jobs(100, 30)
+    job_list += Job(4, 9, 0.25, 1000)
+    jobs = job_list.jobs
+    assert len(job_list) == 101
+    assert job_list.starts.tolist() == [job.start for job in jobs]
+    assert job_list.ends.tolist() == [job.end for job in jobs]
+    assert job_list.weights.tolist() == [job.weight for job in jobs]
+    assert job_list.tracks.tolist() == [
+        -1 if job.track is None else job.track for job in jobs
+    ]
+    assert job_list.ids.tolist() == [job.id for job in jobs]
+    assert job_list.tracks[-1] == -1
+
+
+def test_lookup_by_id(make_jobs):
+    job_list = make_jobs(40, 10)
+    job_list += Job(1, 2, 0.5, 77, 1)
+    for job in job_list.jobs:
+        # the linear search that the index replaced
+        assert job_list[job.id] is next(j for j in job_list.jobs if j.id == job.id)
+        assert job_list.jobs[job_list.index[job.id]] is job
+    assert job_list[41] is None
+    assert job_list[-1] is None
+
+
+def test_duplicate_ids_are_ignored(capsys):
+    job_list = JobCollector()
+    first = job_list.new_job(0, 2, 0.5, 0)
+    job_list += Job(3, 4, 0.7, first.id)
+    assert "Job id already exists" in capsys.readouterr().out
+    assert len(job_list) == 1
+    assert job_list[first.id] is first
+    assert np.array_equal(job_list.starts, [0])
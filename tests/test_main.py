@@ -0,0 +1,80 @@
+import json
+import os
+import shutil
+
+from conftest import MIDI_FOLDER
+from main import get_out_paths, music_experiment, prepare_experiment
+from profiling import PROFILE_FILE
+
+FOLDER_DICT = {
+    "midi_folder": "midi",
+    "phrase_folder": "phrases",
+    "results_folder": "results",
+}
+
+A_DICT = {"ns": 4000, "nr": 100, "t": 20, "rcs": 0.2}
+
+
+def results_path(mode, multipliers=None):
+    if multipliers is None:
+        return get_out_paths(FOLDER_DICT, "bach_2", mode, A_DICT, "solver")[2]
+    return get_out_paths(FOLDER_DICT, "bach_2", mode, A_DICT, "solver", multipliers)[2]
+
+
+def test_results_path_encodes_the_multipliers():
+    sim = os.path.join("results", "sim", "bach_2_100_4000")
+    exact = os.path.join("results", "exact", "bach_2_exact")
+    # the results of the default multipliers keep their names
+    assert results_path("sim") == sim
+    assert results_path("sim", {"exact": 2, "less": 4}) == sim
+    assert results_path("sim", {"exact": 1, "less": 4}) == f"{sim}_p1_4"
+    assert results_path("sim", {"exact": 2, "less": 8}) == f"{sim}_p2_8"
+    assert results_path("exact", {"exact": 4, "less": 2}) == f"{exact}_p4_2"
+
+
+def test_results_path_encodes_the_collapse():
+    sim = os.path.join("results", "sim", "bach_2_100_4000")
+    multipliers = {"exact": 1, "less": 4}
+    paths = get_out_paths(
+        FOLDER_DICT, "bach_2", "sim", A_DICT, "solver", multipliers, collapse=True
+    )
+    assert paths[2] == f"{sim}_p1_4_col"
+
+
+def test_profile_records_the_stages_and_the_sizes(tmp_path):
+    # the note table snapshot is stored next to the midi file, so the file is copied
+    folder_dict = {
+        "midi_folder": str(tmp_path / "midi"),
+        "phrase_folder": str(tmp_path / "phrases"),
+        "results_folder": str(tmp_path / "results"),
+    }
+    for folder in folder_dict.values():
+        os.makedirs(folder)
+    shutil.copy(os.path.join(MIDI_FOLDER, "bach-air-score.mid"), tmp_path / "midi")
+    a_dict = {"nr": 10, "ns": 20, "workers": 1, "seed": 0}
+    midi = "bach-air-score.mid"
+    music_experiment(
+        midi, folder_dict, 4, 2, "sim", a_dict, None, False, False, profile=True
+    )
+    profile_p = os.path.join(folder_dict["results_folder"], PROFILE_FILE)
+    with open(profile_p) as handle:
+        (record,) = [json.loads(line) for line in handle]
+    assert record["file"] == midi and record["a_dict"] == a_dict
+    stages = [stage["stage"] for stage in record["stages"]]
+    assert stages == [
+        "note_table", "phrases", "jobs", "qubo", "anneal", "results", "midi"
+    ]
+    for stage in record["stages"]:
+        assert stage["wall_time"] >= 0 and stage["peak_memory"] >= 0
+
+    prep = prepare_experiment(midi, folder_dict, 4, 2)
+    counters = record["counters"]
+    assert counters["parts"] == prep["notes"].num_parts
+    assert counters["notes"] == len(prep["notes"].notes)
+    # the phrases of all the parts, not the parts
+    phrases = sum(len(phrases) for phrases in prep["phrase_list"].values())
+    assert counters["phrases"] == phrases > counters["parts"]
+    assert counters["jobs"] == len(prep["job_list"])
+    assert counters["variables"] == len(prep["variables"])
+    assert counters["quadratic_terms"] > 0
+    assert counters["reads"] == 10
@@ -0,0 +1,67 @@
+import shutil
+from fractions import Fraction
+
+import numpy as np
+
+from note_table import extract_note_table, load_note_table, store_note_table
+
+
+def test_notes_match_music21(score):
+    table = extract_note_table(score)
+    assert table.num_parts == len(score.parts)
+    for track, part in enumerate(score.parts):
+        rows = table.part(track)
+        elements = list(part.flat.getElementsByClass(["Note", "Chord"]))
+        assert len(rows) == len(elements)
+        for row, n in zip(rows, elements):
+            assert row["measure"] == n.measureNumber
+            offset = table.quarter_length(row["offset"])
+            # same value and same representation, Fraction or float, as music21
+            assert offset == n.offset and type(offset) is type(n.offset)
+            assert Fraction(int(row["duration"]), table.ticks_per_quarter) == Fraction(
+                n.duration.quarterLength
+            )
+            assert row["ps"] == n.pitches[-1].ps
+            assert bool(row["chord"]) == n.isChord
+        starts = table.measure_starts[track]
+        measures = list(part.getElementsByClass("Measure"))
+        assert starts[:, 0].tolist() == [m.number for m in measures]
+        assert [
+            table.quarter_length(tick) for tick in starts[:, 1]
+        ] == [m.offset for m in measures]
+
+
+def test_measures_match_music21(score):
+    table = extract_note_table(score)
+    rng = np.random.default_rng(1)
+    for _ in range(10):
+        track = int(rng.integers(table.num_parts))
+        start = int(rng.integers(1, table.num_measures))
+        end = int(rng.integers(start, min(start + 8, table.num_measures) + 1))
+        rows, base = table.measures(track, start, end)
+        excerpt = score.parts[track].measures(start, end).flat
+        offsets = [n.offset for n in excerpt.getElementsByClass(["Note", "Chord"])]
+        assert [table.quarter_length(t - base) for t in rows["offset"]] == offsets
+
+
+def test_snapshot_round_trip(tmp_path, midi_path, score):
+    midi_copy = tmp_path / "score.mid"
+    shutil.copy(midi_path, midi_copy)
+    assert load_note_table(str(midi_copy)) is None
+    table = extract_note_table(score)
+    store_note_table(str(midi_copy), table)
+    loaded = load_note_table(str(midi_copy))
+    assert loaded is not None
+    assert np.array_equal(loaded.notes, table.notes)
+    assert np.array_equal(loaded.events, table.events)
+    assert np.array_equal(loaded.measure_tempos, table.measure_tempos)
+    assert loaded.ticks_per_quarter == table.ticks_per_quarter
+    assert loaded.num_measures == table.num_measures
+    assert loaded.tempos == table.tempos
+    assert loaded.programs == table.programs
+    for a, b in zip(loaded.measure_starts, table.measure_starts):
+        assert np.array_equal(a, b)
+    # a changed midi file makes the snapshot outdated
+    with open(midi_copy, "ab") as handle:
+        handle.write(b"\0")
+    assert load_note_table(str(midi_copy)) is None
@@ -0,0 +1,107 @@
+from collections import defaultdict
+
+import numpy as np
+
+from note_table import extract_note_table
+from phrase_identification import (
+    calculate_lbsp,
+    find_peaks_v2,
+    get_lbsp_array,
+    get_measures,
+)
+
+LDICT = {"p": 0.25, "i": 0.5, "r": 0.25}
+
+
+def get_pitch_int(notes):
+    """Reference: pitch intervals of each part"""
+    pitch_int = {i: [] for i in range(notes.num_parts)}
+    for i in range(notes.num_parts):
+        pitches = notes.part(i)["ps"].tolist()
+        for p1, p2 in zip(pitches, pitches[1:]):
+            pitch_int[i].append(abs(p2 - p1) + 1)
+    return pitch_int
+
+
+def get_ioi(notes):
+    """Reference: inter onset intervals of each part, on the quarter lengths of music21"""
+    ioi = {i: [] for i in range(notes.num_parts)}
+    for i in range(notes.num_parts):
+        offsets = [notes.quarter_length(t) for t in notes.part(i)["offset"]]
+        for o1, o2 in zip(offsets, offsets[1:]):
+            ioi[i].append(o2 - o1)
+    return ioi
+
+
+def get_rests(notes):
+    """Reference: rest intervals of each part, on the quarter lengths of music21"""
+    rests = {i: [] for i in range(notes.num_parts)}
+    for i in range(notes.num_parts):
+        part = notes.part(i)
+        offsets = [notes.quarter_length(t) for t in part["offset"]]
+        durations = [notes.quarter_length(t) for t in part["duration"]]
+        for o1, o2, d1 in zip(offsets, offsets[1:], durations):
+            rests[i].append(max(0, o2 - o1 + d1) + 1)
+    return rests
+
+
+def get_doc(intervals):
+    """Reference: degree of change of the intervals of each part"""
+    rdict = defaultdict(lambda: [0])
+    for i in range(len(intervals)):
+        rdict[i] += [
+            abs(int2 - int1) / (int1 + int2)
+            for int1, int2 in zip(intervals[i], intervals[i][1:])
+        ]
+    return rdict
+
+
+def get_strength(intervals, doc):
+    """Reference: boundary strengths of each part"""
+    sdict = defaultdict(list)
+    for i in range(len(intervals)):
+        slist = [
+            intervals[i][j + 1] * (doc[i][j] + doc[i][j + 1])
+            for j in range(len(intervals[i]) - 1)
+        ]
+        s = sum(slist)
+        if s != 0:
+            slist = [r / s for r in slist]
+        sdict[i] = slist
+    return sdict
+
+
+def calculate_lbsp_lists(notes, ldict):
+    """Reference: the list pipeline, on the quarter lengths of music21, Fractions included"""
+    spitch = get_strength(get_pitch_int(notes), get_doc(get_pitch_int(notes)))
+    sioi = get_strength(get_ioi(notes), get_doc(get_ioi(notes)))
+    srests = get_strength(get_rests(notes), get_doc(get_rests(notes)))
+    lbsp = defaultdict(list)
+    for i in range(notes.num_parts):
+        lbsp[i] = [
+            ldict["p"] * pitch + ldict["i"] * ioi + ldict["r"] * rest
+            for pitch, ioi, rest in zip(spitch[i], sioi[i], srests[i])
+        ]
+    return lbsp
+
+
+def test_lbsp_matches_list_pipeline(score):
+    notes = extract_note_table(score)
+    lbsp = calculate_lbsp(notes, LDICT)
+    reference = calculate_lbsp_lists(notes, LDICT)
+    measures = get_measures(notes)
+    for i in range(notes.num_parts):
+        assert lbsp[i] == reference[i]
+        for longest_phrase in [2, 4, 6]:
+            assert find_peaks_v2(
+                notes, lbsp[i], measures[i], longest_phrase
+            ) == find_peaks_v2(notes, reference[i], measures[i], longest_phrase)
+
+
+def test_lbsp_short_parts():
+    pitches = np.array([60.0, 62.0, 59.0])
+    offsets = np.array([0, 12, 18])
+    durations = np.array([12, 6, 12])
+    assert get_lbsp_array(pitches[:0], offsets[:0], durations[:0], 12, LDICT).size == 0
+    assert get_lbsp_array(pitches[:2], offsets[:2], durations[:2], 12, LDICT).size == 0
+    assert get_lbsp_array(pitches, offsets, durations, 12, LDICT).shape == (1,)
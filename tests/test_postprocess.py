@@ -0,0 +1,241 @@
+import copy
+from collections import Counter
+
+import dimod
+import numpy as np
+import pytest
+from music21 import converter, midi
+
+from calibration import reference_costs
+from jobs import JobCollector
+from note_table import MEASURE_MARKS, extract_note_table
+from postprocess import (
+    RESULT_RANKINGS,
+    aggregate_samples,
+    countM,
+    countM_hard,
+    evaluate_samples,
+    get_total_entropy,
+    is_sample_feasible,
+    machines_to_midi,
+    machines_to_stream,
+    repair_samples,
+    repair_sampleset,
+    sampleset_to_job_matrix,
+    sampleset_to_result,
+    store_midi,
+    stream_results,
+)
+from qubo import get_qubo_direct
+
+
+def random_sampleset(rng, job_list, M, max_time, num_reads, density=0.3):
+    """Returns a sampleset of random samples over the variables of the qubo of the job list, with the qubo energies"""
+    p = float(job_list.weights.max())
+    qubo, offset, labels = get_qubo_direct(
+        job_list, M, max_time, {"exact": 2 * p, "less": 4 * p}
+    )
+    samples = (rng.random((num_reads, len(labels))) < density).astype(np.int8)
+    bqm = dimod.BinaryQuadraticModel.from_qubo(qubo, offset)
+    for v in labels:
+        bqm.add_variable(v)
+    return dimod.SampleSet.from_samples_bqm((samples, labels), bqm), qubo
+
+
+def test_evaluate_samples_matches_per_sample(rng, make_jobs):
+    for M, num_jobs, max_time in [(1, 5, 4), (2, 20, 10), (3, 50, 16)]:
+        job_list = make_jobs(num_jobs, max_time)
+        sampleset, _ = random_sampleset(rng, job_list, M, max_time, 40)
+        entropy, feasible, soft, hard = evaluate_samples(
+            sampleset_to_job_matrix(sampleset, job_list), M, max_time, job_list
+        )
+        for i, sample in enumerate(sampleset.samples(sorted_by=None)):
+            assert entropy[i] == get_total_entropy(sample, job_list)
+            assert feasible[i] == is_sample_feasible(sample, M, max_time, job_list)
+            assert soft[i] == countM(sample, M, max_time, job_list)
+            assert hard[i] == countM_hard(sample, M, max_time, job_list)
+
+
+def test_sampleset_to_result_matches_per_sample(rng, make_jobs):
+    M, max_time = 2, 12
+    job_list = make_jobs(30, max_time)
+    sampleset, _ = random_sampleset(rng, job_list, M, max_time, 60)
+    expected = []
+    for data in sampleset.data():
+        expected.append(
+            {
+                "energy": data.energy,
+                "entropy": get_total_entropy(data.sample, job_list),
+                "feasible": is_sample_feasible(data.sample, M, max_time, job_list),
+                "M_violate": countM(data.sample, M, max_time, job_list),
+                "M_violate_hard": countM_hard(data.sample, M, max_time, job_list),
+                "sample": dict(data.sample),
+            }
+        )
+    expected = sorted(expected, key=lambda d: d["entropy"])
+    results = sampleset_to_result(sampleset, M, max_time, job_list)
+    assert len(results) == len(expected)
+    for result, reference in zip(results, expected):
+        for name in ["energy", "entropy", "feasible", "M_violate", "M_violate_hard"]:
+            assert result[name] == reference[name]
+        assert {v: int(x) for v, x in result["sample"].items()} == reference["sample"]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 4096])
+def test_stream_results_matches_sampleset_to_result(rng, make_jobs, chunk_size):
+    M, max_time, k = 2, 6, 5
+    job_list = make_jobs(6, max_time)
+    # few jobs, so that many reads select the same jobs and are aggregated
+    sampleset, _ = random_sampleset(rng, job_list, M, max_time, 300, density=0.5)
+    sampleset = aggregate_samples(sampleset, job_list)
+    assert sampleset.record.num_occurrences.sum() == 300
+    assert sampleset.record.num_occurrences.max() > 1
+
+    results = sampleset_to_result(sampleset, M, max_time, job_list)
+    assert sum(result["num_occurrences"] for result in results) == 300
+    streamed = stream_results(sampleset, M, max_time, job_list, k, chunk_size)
+    assert any(result["feasible"] for result in results)
+    for name, feasible_only, keys in RESULT_RANKINGS:
+        candidates = [r for r in results if r["feasible"] or not feasible_only]
+        # sorted is stable, so ties keep the energy order of sampleset_to_result
+        expected = sorted(candidates, key=lambda r: [r[key] for key in keys])[:k]
+        assert len(streamed[name]) == len(expected)
+        for result, reference in zip(streamed[name], expected):
+            assert result.keys() == reference.keys()
+            for field in result:
+                assert result[field] == reference[field]
+    counters = streamed["counters"]
+    assert counters["reads"] == 300
+    assert counters["samples"] == len(sampleset)
+    assert counters["feasible_reads"] == sum(
+        r["num_occurrences"] for r in results if r["feasible"]
+    )
+
+
+def small_job_list():
+    # with M = 1, jobs 0 and 1 overlap at time 2
+    job_list = JobCollector()
+    for start, end, weight in [(0, 2, 0.5), (1, 3, 0.9), (3, 4, 0.2)]:
+        job_list.new_job(start, end, weight)
+    return job_list
+
+
+def test_repair_known_samples():
+    job_list = small_job_list()
+    samples = np.array([[1, 1, 1], [0, 0, 0], [1, 0, 0]], dtype=np.int8)
+    repaired, load = repair_samples(samples, 1, 4, job_list)
+    # the lighter job 0 is dropped, the empty sample is filled heaviest first, job 1 does not fit next to job 0
+    assert repaired.tolist() == [[0, 1, 1], [0, 1, 1], [1, 0, 1]]
+    assert load.tolist() == [[0, 1, 1, 1], [0, 1, 1, 1], [1, 1, 0, 1]]
+    fixed = np.array([True, False, False])
+    repaired, _ = repair_samples(samples[:1], 1, 4, job_list, fixed)
+    assert repaired.tolist() == [[1, 0, 1]]
+
+
+def test_repair_rejects_overloading_fixed_jobs():
+    job_list = small_job_list()
+    with pytest.raises(ValueError):
+        repair_samples(
+            np.array([[1, 1, 0]]), 1, 4, job_list, np.array([True, True, False])
+        )
+
+
+def test_repair_sampleset(rng, make_jobs):
+    M, max_time = 2, 10
+    job_list = make_jobs(25, max_time)
+    sampleset, qubo = random_sampleset(rng, job_list, M, max_time, 50, density=0.5)
+    jobs = sampleset_to_job_matrix(sampleset, job_list)
+    infeasible = ~evaluate_samples(jobs, M, max_time, job_list)[1]
+    assert infeasible.any()
+    repaired, rescued = repair_sampleset(sampleset, qubo, M, max_time, job_list)
+    assert rescued == infeasible.sum()
+    assert evaluate_samples(
+        sampleset_to_job_matrix(repaired, job_list), M, max_time, job_list
+    )[1].all()
+    bqm = dimod.BinaryQuadraticModel.from_qubo(qubo)
+    for data in repaired.data():
+        assert data.energy == pytest.approx(bqm.energy(data.sample))
+    # the slack variables hold the idle tracks, so only the penalty of num_machine_cons is left
+    p = float(job_list.weights.max())
+    p_dict = {"exact": 2 * p, "less": 4 * p}
+    offset = get_qubo_direct(job_list, M, max_time, p_dict)[1]
+    cost = reference_costs(
+        sampleset_to_job_matrix(repaired, job_list), M, max_time, job_list, p_dict
+    )[0]
+    assert repaired.record.energy + offset == pytest.approx(cost)
+
+
+def random_machines(rng, notes, M, max_time):
+    """Consecutive random jobs on each machine, over measures found in their parts. No machine is left without jobs,
+    as music21 cannot write an empty part"""
+    machine_dict = {}
+    for machine in range(M):
+        job_list = JobCollector()
+        start = 0
+        while start < max_time:
+            end = start + int(rng.integers(1, 4))
+            track = int(rng.integers(notes.num_parts))
+            numbers = notes.measure_starts[track][:, 0]
+            if np.isin(np.arange(start + 1, end + 1), numbers).all():
+                job_list.new_job(start, end, 1.0, track)
+            start = end + int(rng.integers(2))
+        machine_dict[machine] = job_list.jobs
+    return machine_dict
+
+
+def midi_events(path):
+    """Returns the format and the resolution of a midi file, and the events of each track with their ticks"""
+    midi_file = midi.MidiFile()
+    midi_file.open(path)
+    midi_file.read()
+    midi_file.close()
+    tracks = []
+    for track in midi_file.tracks:
+        tick, events = 0, []
+        for event in track.events:
+            if isinstance(event, midi.DeltaTime):
+                tick += event.time
+                continue
+            data = event.data
+            if data is None:
+                data = (event.parameter1, event.parameter2)
+            events.append((tick, event.type, event.channel, data))
+        tracks.append(events)
+    return midi_file.format, midi_file.ticksPerQuarterNote, tracks
+
+
+def test_direct_midi_matches_music21(tmp_path, rng, score):
+    M, max_time = 3, 16
+    notes = extract_note_table(score)
+    machine_dict = random_machines(rng, notes, M, max_time)
+    assert all(machine_dict.values())
+    # Part.measure changes the priorities of the signatures and instruments it finds in the context of a measure, so
+    # the stream is built from a copy, not to change the order of the elements of the measures in the next tests
+    excerpt = copy.deepcopy(score.measures(1, max_time + 3))
+    arrangement = machines_to_stream(machine_dict, excerpt)
+    store_midi(arrangement, str(tmp_path / "music21"))
+    machines_to_midi(machine_dict, notes, str(tmp_path / "direct"))
+
+    expected_format, expected_division, expected = midi_events(
+        str(tmp_path / "music21.mid")
+    )
+    midi_format, division, tracks = midi_events(str(tmp_path / "direct.mid"))
+    assert (midi_format, division) == (expected_format, expected_division)
+    assert len(tracks) == M + 1
+    # in music21, the order of the tempo marks and the signatures at the same tick depends on the priorities given
+    # by Part.measure
+    assert Counter(tracks[0]) == Counter(expected[0])
+    assert tracks[1:] == expected[1:]
+
+    table, reference = [
+        extract_note_table(converter.parse(str(tmp_path / name)).stripTies())
+        for name in ["direct.mid", "music21.mid"]
+    ]
+    for name in ["notes", "events"] + [name for name, _ in MEASURE_MARKS]:
+        assert np.array_equal(getattr(table, name), getattr(reference, name))
+    for starts, reference_starts in zip(table.measure_starts, reference.measure_starts):
+        assert np.array_equal(starts, reference_starts)
+    assert table.ticks_per_quarter == reference.ticks_per_quarter
+    assert table.num_measures == reference.num_measures
+    assert table.tempos == reference.tempos
+    assert table.programs == reference.programs
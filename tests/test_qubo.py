@@ -0,0 +1,83 @@
+import re
+
+import dimod
+import numpy as np
+import pytest
+
+from jobs import JobCollector
+from qubo import get_qubo, get_qubo_direct
+
+
+def split_terms(qubo):
+    """Splits a qubo into its linear terms and its quadratic terms keyed by the unordered pair of variables"""
+    linear, quadratic = {}, {}
+    for (u, v), value in qubo.items():
+        if u == v:
+            linear[u] = linear.get(u, 0) + value
+        else:
+            key = frozenset((u, v))
+            quadratic[key] = quadratic.get(key, 0) + value
+    return (
+        {k: v for k, v in linear.items() if v != 0},
+        {k: v for k, v in quadratic.items() if v != 0},
+    )
+
+
+@pytest.mark.parametrize("collapse", [False, True])
+@pytest.mark.parametrize("M", [1, 2, 3, 4, 6])
+def test_direct_builder_matches_pyqubo(make_jobs, M, collapse):
+    for num_jobs, max_time in [(1, 3), (8, 6), (25, 12), (60, 20)]:
+        job_list = make_jobs(num_jobs, max_time)
+        p = float(job_list.weights.max())
+        p_dict = {"exact": 2 * p, "less": 4 * p}
+        qubo, offset, model = get_qubo(job_list, M, max_time, p_dict, collapse)
+        qubo_d, offset_d, labels = get_qubo_direct(
+            job_list, M, max_time, p_dict, collapse
+        )
+        linear, quadratic = split_terms(qubo)
+        # get_qubo_arrays sums the terms in the order of pyqubo, so the coefficients agree exactly
+        linear_d, quadratic_d = split_terms(qubo_d)
+        assert linear_d == linear
+        assert quadratic_d == quadratic
+        assert offset_d == offset
+        assert set(labels) == set(model.variables)
+        slack = re.compile(r"slack(\d+)\[(\d+)\]$")
+        slack_labels = {v for v in labels if slack.match(v)}
+        assert slack_labels == {v for v in model.variables if slack.match(v)}
+        assert len(labels) == len(job_list) + len(slack_labels)
+
+
+def job_energies(qubo, offset, job_labels):
+    """Minimum energy of each selection of the jobs over the slack variables, by exhaustive enumeration. The
+    selections are indexed by the bits of the job variables"""
+    sampleset = dimod.ExactSolver().sample_qubo(qubo)
+    columns = [list(sampleset.variables).index(v) for v in job_labels]
+    keys = sampleset.record.sample[:, columns] @ (1 << np.arange(len(columns)))
+    energies = np.full(1 << len(columns), np.inf)
+    np.minimum.at(energies, keys, sampleset.record.energy + offset)
+    return energies
+
+
+@pytest.mark.parametrize("M", [1, 2, 3])
+def test_collapse_keeps_the_minimizers(rng, M):
+    # long jobs, so that consecutive time points often have the same running jobs
+    for num_jobs, max_time in [(3, 4), (4, 5), (5, 6), (4, 6)] * 2:
+        job_list = JobCollector()
+        for _ in range(num_jobs):
+            start = int(rng.integers(0, max_time // 2))
+            end = int(rng.integers(max_time // 2 + 1, max_time + 1))
+            job_list.new_job(start, end, float(rng.random()), int(rng.integers(3)))
+        p = float(job_list.weights.max())
+        p_dict = {"exact": 2 * p, "less": 4 * p}
+        qubo, offset, labels = get_qubo_direct(job_list, M, max_time, p_dict)
+        qubo_c, offset_c, labels_c = get_qubo_direct(
+            job_list, M, max_time, p_dict, collapse=True
+        )
+        assert len(labels_c) <= len(labels)
+        job_labels = [f"x_{id}" for id in job_list.ids]
+        energies = job_energies(qubo, offset, job_labels)
+        energies_c = job_energies(qubo_c, offset_c, job_labels)
+        # every selection of the jobs has the same energy, so do the ground states
+        np.testing.assert_allclose(energies_c, energies, rtol=1e-12, atol=1e-12)
+        assert energies_c.min() == pytest.approx(energies.min())
+        assert np.argmin(energies_c) == np.argmin(energies)
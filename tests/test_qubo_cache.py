@@ -0,0 +1,96 @@
+import os
+
+from jobs import JobCollector
+from qubo import get_qubo_direct
+from qubo_cache import (
+    get_cached_qubo,
+    get_qubo_cache_path,
+    get_qubo_key,
+    load_cached_qubo,
+)
+
+P_DICT = {"exact": 2.0, "less": 4.0}
+
+
+def copy_jobs(job_list, change=None):
+    copied = JobCollector()
+    for job in job_list.jobs:
+        values = {"start": job.start, "end": job.end, "weight": job.weight}
+        if change is not None and job.id == 0:
+            values.update(change)
+        copied.new_job(values["start"], values["end"], values["weight"], job.track)
+    return copied
+
+
+def test_key_covers_all_inputs(make_jobs):
+    job_list = make_jobs(20, 10)
+    key = get_qubo_key(job_list, 2, 10, P_DICT, "direct")
+    assert get_qubo_key(copy_jobs(job_list), 2, 10, dict(P_DICT), "direct") == key
+    first = job_list[0]
+    changed = [
+        get_qubo_key(copy_jobs(job_list, change), 2, 10, P_DICT, "direct")
+        for change in [
+            {"weight": first.weight + 1e-15},
+            {"start": first.start - 1},
+            {"end": first.end + 1},
+        ]
+    ]
+    changed += [
+        get_qubo_key(job_list, 3, 10, P_DICT, "direct"),
+        get_qubo_key(job_list, 2, 11, P_DICT, "direct"),
+        get_qubo_key(job_list, 2, 10, {"exact": 2.0, "less": 8.0}, "direct"),
+        get_qubo_key(job_list, 2, 10, P_DICT, "pyqubo"),
+        get_qubo_key(job_list, 2, 10, P_DICT, "direct", collapse=True),
+    ]
+    assert key not in changed
+    assert len(set(changed)) == len(changed)
+
+
+def test_cached_qubo_round_trip(tmp_path, make_jobs):
+    job_list = make_jobs(30, 12)
+    qubo, offset, variables = get_qubo_direct(job_list, 2, 12, P_DICT)
+    built = get_cached_qubo(job_list, 2, 12, P_DICT, "direct", str(tmp_path))
+    loaded = get_cached_qubo(job_list, 2, 12, P_DICT, "direct", str(tmp_path))
+    for result in (built, loaded):
+        # same entries in the same order, so samplers see the same qubo
+        assert list(result[0].items()) == list(qubo.items())
+        assert result[1] == offset
+        assert list(result[2]) == list(variables)
+    assert len(os.listdir(tmp_path)) == 1
+
+
+def test_unreadable_entry_is_rebuilt(tmp_path, make_jobs):
+    job_list = make_jobs(10, 6)
+    key = get_qubo_key(job_list, 2, 6, P_DICT, "direct")
+    path = get_qubo_cache_path(str(tmp_path), key)
+    with open(path, "wb") as handle:
+        handle.write(b"not a qubo")
+    assert load_cached_qubo(path) is None
+    qubo = get_cached_qubo(job_list, 2, 6, P_DICT, "direct", str(tmp_path))[0]
+    assert qubo == get_qubo_direct(job_list, 2, 6, P_DICT)[0]
+    assert load_cached_qubo(path) is not None
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path, make_jobs):
+    job_lists = [make_jobs(15, 8) for _ in range(3)]
+    for job_list in job_lists:
+        get_cached_qubo(job_list, 2, 8, P_DICT, "direct", str(tmp_path))
+    paths = [
+        get_qubo_cache_path(
+            str(tmp_path), get_qubo_key(job_list, 2, 8, P_DICT, "direct")
+        )
+        for job_list in job_lists
+    ]
+    for age, path in enumerate(paths):
+        os.utime(path, (1000 + age, 1000 + age))
+    # the oldest entry is used again, so the second one is the least recently used
+    load_cached_qubo(paths[0])
+    size = os.path.getsize(paths[1])
+    extra = make_jobs(15, 8)
+    get_cached_qubo(
+        extra, 2, 8, P_DICT, "direct", str(tmp_path), max_bytes=3 * size + size // 2
+    )
+    remaining = set(os.listdir(tmp_path))
+    assert os.path.basename(paths[1]) not in remaining
+    assert os.path.basename(paths[0]) in remaining
+    assert len(remaining) == 3
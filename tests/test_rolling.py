@@ -0,0 +1,167 @@
+import os
+from collections import defaultdict
+from fractions import Fraction
+
+import numpy as np
+import pytest
+from music21 import midi
+
+import rolling
+from conftest import MIDI_FOLDER, parse_score
+from midi_writer import MUSIC21_DIVISION, StreamingMidiWriter, midi_channel
+from note_table import extract_note_table
+from postprocess import machines_to_midi
+from rolling import rolling_arrangement, solve_window
+
+A_DICT = {"ns": 200, "nr": 20, "workers": 1, "seed": 3}
+
+
+@pytest.fixture
+def notes():
+    return extract_note_table(
+        parse_score(os.path.join(MIDI_FOLDER, "bach-air-score.mid"))
+    ).truncate(10)
+
+
+def midi_notes(path, machine_of):
+    """Returns the notes of a midi file as (machine, on, off, pitch, velocity), with the times in quarter lengths. The
+    machine of a note is given by machine_of from its track and channel"""
+    midi_file = midi.MidiFile()
+    midi_file.open(path)
+    midi_file.read()
+    midi_file.close()
+    division = midi_file.ticksPerQuarterNote
+    result = []
+    for number, track in enumerate(midi_file.tracks):
+        tick, sounding = 0, defaultdict(list)
+        for event in track.events:
+            if isinstance(event, midi.DeltaTime):
+                tick += event.time
+            elif event.isNoteOn():
+                sounding[event.channel, event.pitch].append((tick, event.velocity))
+            elif event.isNoteOff():
+                on, velocity = sounding[event.channel, event.pitch].pop(0)
+                machine = machine_of(number, event.channel - 1)
+                result.append(
+                    (
+                        machine,
+                        Fraction(on, division),
+                        Fraction(tick, division),
+                        event.pitch,
+                        velocity,
+                    )
+                )
+    return sorted(result)
+
+
+def music21_rounding(note):
+    """Rounds the times of a note to the resolution of machines_to_midi, the end being its start plus the rounded
+    duration"""
+    machine, on, off, pitch, velocity = note
+    start = round(on * MUSIC21_DIVISION)
+    end = start + round((off - on) * MUSIC21_DIVISION)
+    return (
+        machine,
+        Fraction(start, MUSIC21_DIVISION),
+        Fraction(end, MUSIC21_DIVISION),
+        pitch,
+        velocity,
+    )
+
+
+def test_streaming_writer_sorts_the_buffered_notes(tmp_path):
+    path = str(tmp_path / "stream.mid")
+    writer = StreamingMidiWriter(path, 2, [(0, 90.0)])
+    writer.add_note(1, 2, 4, 64, 80)
+    writer.add_note(0, 0, 2, 60, -1)
+    writer.flush(1)
+    # a note ending where the next starts on the same key
+    writer.add_note(0, 2, 3, 60, 70)
+    writer.add_note(10, 3, 5, 67, 60)
+    writer.close()
+    channels = [midi_channel(machine) for machine in range(11)]
+    assert midi_notes(path, lambda _, channel: channels.index(channel)) == [
+        (0, Fraction(0), Fraction(1), 60, 90),
+        (0, Fraction(1), Fraction(3, 2), 60, 70),
+        (1, Fraction(1), Fraction(2), 64, 80),
+        (10, Fraction(3, 2), Fraction(5, 2), 67, 60),
+    ]
+
+
+def test_solve_window_keeps_the_fixed_jobs(make_jobs):
+    M, max_time = 2, 8
+    job_list = make_jobs(12, max_time)
+    order = np.argsort(job_list.starts, kind="stable")
+    # two jobs that never run at the same time
+    first = order[0]
+    second = next(
+        row for row in order if job_list.starts[row] >= job_list.ends[first]
+    )
+    fixed = [int(job_list.ids[first]), int(job_list.ids[second])]
+    selection, _ = solve_window(job_list, M, max_time, fixed, "sim", A_DICT)
+    assert selection[first] == 1 and selection[second] == 1
+    times = np.arange(1, max_time + 1)
+    running = (job_list.starts[:, None] < times) & (times <= job_list.ends[:, None])
+    assert (selection @ running <= M).all()
+
+
+@pytest.mark.parametrize(
+    "window, commit, thin", [(4, 2, False), (5, 2, True), (3, 3, True)]
+)
+def test_rolling_arrangement(tmp_path, monkeypatch, notes, window, commit, thin):
+    M = 2
+    windows = []
+
+    def recording_solve_window(job_list, M, max_time, fixed, *args):
+        selection, num_variables = solve_window(job_list, M, max_time, fixed, *args)
+        if thin:
+            # dropping every other new job leaves the machines idle in some measures
+            rows = [
+                row
+                for row in np.flatnonzero(selection)
+                if job_list.ids[row] not in fixed
+            ]
+            selection = selection.copy()
+            selection[rows[::2]] = 0
+        windows.append((job_list, fixed, selection))
+        return selection, num_variables
+
+    monkeypatch.setattr(rolling, "solve_window", recording_solve_window)
+    out_p = str(tmp_path / "rolling")
+    committed, stats = rolling_arrangement(
+        notes, M, window, commit, "sim", A_DICT, out_p
+    )
+    assert stats["windows"] == len(windows) > 1
+    assert committed
+
+    # the jobs running into a window stay selected there
+    for job_list, fixed, selection in windows:
+        rows = [job_list.index[id] for id in fixed]
+        assert (selection[rows] == 1).all()
+
+    # no measure has more than M committed jobs
+    for measure in range(1, notes.num_measures + 1):
+        running = [job for job, _ in committed if job.start < measure <= job.end]
+        assert len(running) <= M
+
+    # the jobs of a machine never overlap
+    machine_dict = {machine: [] for machine in range(M)}
+    for job, machine in sorted(committed, key=lambda item: item[0].start):
+        machine_dict[machine].append(job)
+    for jobs in machine_dict.values():
+        assert all(a.end <= b.start for a, b in zip(jobs, jobs[1:]))
+    idle = [
+        jobs[0].start > 0 or any(a.end < b.start for a, b in zip(jobs, jobs[1:]))
+        for jobs in machine_dict.values()
+        if jobs
+    ]
+    assert any(idle) == thin
+
+    # the streamed notes are those of the midi file of the final assignment
+    machines_to_midi(machine_dict, notes, str(tmp_path / "direct"))
+    channels = [midi_channel(machine) for machine in range(M)]
+    streamed = midi_notes(f"{out_p}.mid", lambda _, channel: channels.index(channel))
+    # the streamed file keeps the triplets exact, machines_to_midi rounds them as music21 does
+    streamed = sorted(music21_rounding(note) for note in streamed)
+    direct = midi_notes(str(tmp_path / "direct.mid"), lambda track, _: track - 1)
+    assert streamed and streamed == direct
@@ -0,0 +1,25 @@
+from qubo import get_running_jobs
+
+
+def scan_running_jobs(job_list, max_time):
+    # reference: scan the whole job list at each time point
+    return {
+        t: [job.id for job in job_list.jobs if job.start < t <= job.end]
+        for t in range(1, max_time + 1)
+    }
+
+
+def test_interval_index_matches_scan(make_jobs):
+    for num_jobs, max_time in [(0, 5), (1, 1), (12, 8), (60, 30), (200, 50)]:
+        job_list = make_jobs(num_jobs, max_time)
+        assert get_running_jobs(job_list, max_time) == scan_running_jobs(
+            job_list, max_time
+        )
+
+
+def test_interval_index_jobs_outside_timeline(make_jobs):
+    job_list = make_jobs(30, 20)
+    job_list.new_job(-3, 2, 0.5, 0)
+    job_list.new_job(18, 25, 0.5, 1)
+    job_list.new_job(4, 4, 0.5, 2)
+    assert get_running_jobs(job_list, 20) == scan_running_jobs(job_list, 20)
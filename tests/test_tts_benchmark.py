@@ -0,0 +1,119 @@
+import dimod
+import numpy as np
+import pytest
+
+import tts_benchmark
+from calibration import time_to_solution
+from experiment import sim_anneal
+from qubo import get_qubo_direct
+from tts_benchmark import (
+    benchmark_point,
+    get_optimum,
+    get_timing_fields,
+    run_tts_benchmark,
+    summarize_tts,
+)
+
+M, MAX_TIME = 2, 3
+
+
+@pytest.fixture
+def prep(make_jobs):
+    job_list = make_jobs(5, MAX_TIME)
+    p_dict = {"exact": 2.0, "less": 4.0}
+    return {
+        "out_file_name": "tiny_2",
+        "job_list": job_list,
+        "M": M,
+        "num_measures": MAX_TIME,
+        "p_dict": p_dict,
+        "qubo": get_qubo_direct(job_list, M, MAX_TIME, p_dict)[0],
+    }
+
+
+def test_optimum_is_the_lowest_energy(prep):
+    lowest = dimod.ExactSolver().sample_qubo(prep["qubo"]).first.energy
+    assert get_optimum(prep) == pytest.approx(lowest)
+
+
+def test_sim_point_matches_the_seeded_run(prep):
+    optimum = get_optimum(prep)
+    a_dict = {"nr": 30, "ns": 5, "seed": 3}
+    row = benchmark_point(prep, "sim", a_dict, None, optimum)
+    energies = sim_anneal(prep["qubo"], 30, 5, 1, 3).record.energy
+    success = np.mean(energies <= optimum + 1e-9)
+    assert 0 < success < 1
+    assert row["success_probability"] == success
+    assert row["reads"] == 30
+    assert row["a_dict.seed"] == 3 and row["solver"] is None
+    assert row["tts99"] == time_to_solution(success, row["time_per_read"])
+
+
+def test_success_probability_counts_the_occurrences(monkeypatch, prep):
+    optimum = get_optimum(prep)
+    labels = [f"x_{id}" for id in prep["job_list"].ids]
+    samples = np.eye(3, len(labels), dtype=np.int8)
+    sampleset = dimod.SampleSet.from_samples(
+        (samples, labels),
+        dimod.BINARY,
+        energy=[optimum, optimum + 1, optimum],
+        num_occurrences=[3, 5, 2],
+        info={"timing": {"qpu_access_time": 2000.0}},
+    )
+    monkeypatch.setattr(tts_benchmark, "run_sampler", lambda *args: sampleset)
+    row = benchmark_point(prep, "quantum", {"nr": 3}, "solver", optimum)
+    assert row["reads"] == 10
+    assert row["success_probability"] == 0.5
+    assert row["best_energy"] == optimum
+    assert row["solver"] == "solver"
+    assert row["timing.qpu_access_time"] == 2000.0
+    # 2 ms of QPU access time over 10 reads
+    assert row["tts99_qpu"] == time_to_solution(0.5, 2e-4)
+    # within the tolerance, the worse reads are successes too
+    row = benchmark_point(prep, "quantum", {"nr": 3}, "solver", optimum, 2 / abs(optimum))
+    assert row["success_probability"] == 1.0
+
+
+def test_timing_fields():
+    info = {
+        "timing": {
+            "qpu_access_time": 1500,
+            "qpu_programming_time": np.float64(12.5),
+            "warnings": ["ignored"],
+        },
+        "run_time": 2000000,
+        "charge_time": 1000000,
+        "problem_id": "abc",
+        "problem_label": None,
+    }
+    assert get_timing_fields(info) == {
+        "timing.qpu_access_time": 1500.0,
+        "timing.qpu_programming_time": 12.5,
+        "timing.run_time": 2000000.0,
+        "timing.charge_time": 1000000.0,
+    }
+    assert get_timing_fields({}) == {}
+
+
+def test_repeats_are_pooled(prep):
+    rows = run_tts_benchmark(
+        prep, ["sim"], None, [20], [2, 20], [], [], repeats=3, a_extra={"seed": 4}
+    )
+    assert len(rows) == 6
+    # each repeat has its own seed
+    assert [row["a_dict.seed"] for row in rows] == [4, 5, 6, 4, 5, 6]
+    summary = summarize_tts(rows)
+    assert "a_dict.seed" not in summary.columns
+    assert summary["a_dict.ns"].tolist() == [2, 20]
+    for (_, point), start in zip(summary.iterrows(), [0, 3]):
+        repeats = rows[start : start + 3]
+        assert point["repeats"] == 3
+        assert point["reads"] == 60
+        successes = sum(row["success_probability"] * row["reads"] for row in repeats)
+        assert point["success_probability"] == pytest.approx(successes / 60)
+        time_per_read = np.mean([row["time_per_read"] for row in repeats])
+        assert point["time_per_read"] == pytest.approx(time_per_read)
+        assert point["tts99"] == time_to_solution(
+            point["success_probability"], point["time_per_read"]
+        )
+        assert point["best_energy"] == min(row["best_energy"] for row in repeats)
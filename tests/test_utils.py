@@ -0,0 +1,144 @@
+import pickle
+
+import dimod
+import numpy as np
+import pytest
+
+from convert_results import find_pickled_results
+from jobs import Job, JobCollector
+from postprocess import sampleset_to_job_matrix
+from utils import (
+    convert_result,
+    load_result,
+    load_result_columns,
+    load_result_field,
+    load_result_header,
+    load_result_jobs,
+    store_result,
+)
+
+
+def store_pickled_result(file_name, sampleset):
+    """Reference: the previous format of store_result"""
+    with open(file_name, "wb") as handle:
+        pickle.dump(sampleset.to_serializable(), handle)
+
+
+def random_sampleset(rng, vartype, num_reads=37, num_jobs=13):
+    # a number of variables that is not a multiple of 8, with mixed labels
+    variables = [f"x_{id}" for id in range(num_jobs)]
+    variables += [f"slack{t}[0]" for t in range(1, 5)] + [("aux", 1)]
+    samples = rng.integers(0, 2, size=(num_reads, len(variables)), dtype=np.int8)
+    if vartype is dimod.SPIN:
+        samples = 2 * samples - 1
+    return dimod.SampleSet.from_samples(
+        (samples, variables),
+        vartype,
+        energy=rng.normal(size=num_reads),
+        num_occurrences=rng.integers(1, 5, size=num_reads),
+        chain_break_fraction=rng.random(num_reads),
+        info={"timing": {"qpu_access_time": 1234.5}, "problem_id": "abc"},
+        sort_labels=False,
+    )
+
+
+def assert_same_sampleset(loaded, sampleset):
+    assert list(loaded.variables) == list(sampleset.variables)
+    assert loaded.vartype is sampleset.vartype
+    assert loaded.info == sampleset.info
+    assert loaded.record.dtype == sampleset.record.dtype
+    for name in sampleset.record.dtype.names:
+        np.testing.assert_array_equal(loaded.record[name], sampleset.record[name])
+
+
+@pytest.mark.parametrize("vartype", [dimod.BINARY, dimod.SPIN])
+def test_round_trip(tmp_path, rng, vartype):
+    sampleset = random_sampleset(rng, vartype)
+    file_name = str(tmp_path / "results" / "sampleset")
+    store_result(file_name, sampleset)
+    assert_same_sampleset(load_result(file_name), sampleset)
+
+    header = load_result_header(file_name)
+    assert header["variables"] == list(sampleset.variables)
+    assert header["num_rows"] == len(sampleset)
+    for name in ["energy", "num_occurrences", "chain_break_fraction"]:
+        np.testing.assert_array_equal(
+            load_result_field(file_name, name), sampleset.record[name]
+        )
+
+
+@pytest.mark.parametrize("vartype", [dimod.BINARY, dimod.SPIN])
+def test_columns_match_full_samples(tmp_path, rng, vartype):
+    sampleset = random_sampleset(rng, vartype)
+    file_name = str(tmp_path / "sampleset")
+    store_result(file_name, sampleset)
+    variables = list(sampleset.variables)
+    index = {v: i for i, v in enumerate(variables)}
+    for _ in range(20):
+        chosen = [variables[i] for i in rng.permutation(len(variables))[:5]]
+        columns = load_result_columns(file_name, chosen)
+        expected = sampleset.record.sample[:, [index[v] for v in chosen]]
+        np.testing.assert_array_equal(columns, expected)
+        assert columns.dtype == expected.dtype
+
+
+def test_jobs_follow_the_job_list(tmp_path, rng):
+    sampleset = random_sampleset(rng, dimod.BINARY)
+    file_name = str(tmp_path / "sampleset")
+    store_result(file_name, sampleset)
+    ids = [int(i) for i in rng.permutation(13)]
+    job_list = JobCollector()
+    for id in ids:
+        job_list += Job(0, 1, 1.0, id)
+    samples = sampleset.samples(sorted_by=None)
+    expected = np.array([[sample[f"x_{id}"] for id in ids] for sample in samples])
+    np.testing.assert_array_equal(load_result_jobs(file_name, job_list), expected)
+
+
+def test_samples_of_another_job_list_are_rejected(tmp_path, rng):
+    sampleset = random_sampleset(rng, dimod.BINARY)
+    job_list = JobCollector()
+    for id in range(13):
+        job_list += Job(0, 1, 1.0, id)
+    file_name = str(tmp_path / "sampleset")
+    store_result(file_name, sampleset, job_list)
+    load_result_jobs(file_name, job_list)
+    load_result(file_name, job_list)
+
+    # a job list with fewer jobs, whose ids are all stored
+    fewer = JobCollector()
+    for id in range(10):
+        fewer += Job(0, 1, 1.0, id)
+    with pytest.raises(ValueError):
+        load_result_jobs(file_name, fewer)
+    with pytest.raises(ValueError):
+        load_result(file_name, fewer)
+    with pytest.raises(ValueError):
+        sampleset_to_job_matrix(sampleset, fewer)
+
+    # the same ids, but a job has moved
+    moved = JobCollector()
+    for id in range(13):
+        moved += Job(0, 2 if id == 5 else 1, 1.0, id)
+    with pytest.raises(ValueError):
+        load_result_jobs(file_name, moved)
+    with pytest.raises(ValueError):
+        load_result(file_name, moved)
+
+    # without a stored digest, only the job variables are checked
+    store_result(file_name, sampleset)
+    load_result_jobs(file_name, moved)
+    with pytest.raises(ValueError):
+        load_result_jobs(file_name, fewer)
+
+
+def test_convert_pickled_result(tmp_path, rng):
+    sampleset = random_sampleset(rng, dimod.BINARY)
+    file_name = str(tmp_path / "sampleset")
+    store_pickled_result(file_name, sampleset)
+    assert_same_sampleset(load_result(file_name), sampleset)
+    assert find_pickled_results(str(tmp_path)) == [file_name]
+
+    convert_result(file_name)
+    assert_same_sampleset(load_result(file_name), sampleset)
+    assert find_pickled_results(str(tmp_path)) == []
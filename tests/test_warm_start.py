@@ -0,0 +1,75 @@
+import numpy as np
+import pytest
+
+from postprocess import get_incidence_matrix
+from qubo import (
+    get_constraint_groups,
+    get_qubo_direct,
+    get_running_jobs,
+    log_enc_coefficients,
+)
+from warm_start import greedy_selections, warm_start_states
+
+P_DICT = {"exact": 2.0, "less": 4.0}
+
+
+def non_overlapping_mask(job_list):
+    """Mask of jobs that never run at the same time, taken in the order of their starts"""
+    mask = np.zeros(len(job_list), dtype=bool)
+    end = -1
+    for row in np.argsort(job_list.starts, kind="stable"):
+        if job_list.starts[row] >= end:
+            mask[row] = True
+            end = job_list.ends[row]
+    return mask
+
+
+@pytest.mark.parametrize("with_fixed", [False, True])
+def test_greedy_selections_fit_into_the_tracks(make_jobs, with_fixed):
+    M, max_time, num_states = 2, 12, 6
+    job_list = make_jobs(30, max_time)
+    fixed = non_overlapping_mask(job_list) if with_fixed else None
+    selected, load = greedy_selections(
+        job_list, M, max_time, num_states, seed=1, fixed=fixed
+    )
+    incidence = get_incidence_matrix(job_list, max_time).astype(np.int64)
+    np.testing.assert_array_equal(load, selected.astype(np.int64) @ incidence)
+    assert (load <= M).all()
+    if with_fixed:
+        assert (selected[:, fixed] == 1).all()
+    # the first selection follows the ranking, the others are perturbed
+    assert len({row.tobytes() for row in selected}) > 1
+
+
+@pytest.mark.parametrize("collapse", [False, True])
+@pytest.mark.parametrize("with_fixed", [False, True])
+def test_warm_start_slacks_count_the_idle_tracks(make_jobs, collapse, with_fixed):
+    # few jobs over many time points, so that consecutive time points share their running jobs
+    M, max_time, num_states = 3, 30, 5
+    job_list = make_jobs(10, max_time)
+    fixed = non_overlapping_mask(job_list) if with_fixed else None
+    _, _, labels = get_qubo_direct(job_list, M, max_time, P_DICT, collapse)
+    states, variables = warm_start_states(
+        labels, job_list, M, max_time, num_states, seed=1, fixed=fixed
+    )
+    selected, load = greedy_selections(
+        job_list, M, max_time, num_states, seed=1, fixed=fixed
+    )
+    assert variables == list(labels)
+    np.testing.assert_array_equal(states[:, : len(job_list)], selected)
+
+    column = {v: i for i, v in enumerate(variables)}
+    coefs = np.array(log_enc_coefficients(M))
+    run_jobs = get_running_jobs(job_list, max_time)
+    groups = get_constraint_groups(run_jobs, max_time, collapse)
+    assert collapse == any(length > 1 for _, length, _ in groups)
+    idle = False
+    for j, length, _ in groups:
+        bits = states[:, [column[f"slack{j}[{k}]"] for k in range(len(coefs))]]
+        # the time points of a group have the same running jobs, hence the same load
+        group_load = load[:, j - 1 : j - 1 + length]
+        assert (group_load == group_load[:, :1]).all()
+        np.testing.assert_array_equal(bits @ coefs, M - group_load[:, 0])
+        idle |= (group_load < M).any()
+    # the seed states are not exactly M everywhere, so their exactly M penalty is not zero
+    assert idle